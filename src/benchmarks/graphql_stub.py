@@ -0,0 +1,84 @@
+import json
+import multiprocessing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from benchmarks.synthetic_library import (
+    LibraryOptions,
+    create_studio_tree,
+    iter_scene_dicts,
+)
+
+
+class GraphQLStubHandler(BaseHTTPRequestHandler):
+    "Answers the version query and the findScenes pages of the synthetic library"
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+
+        if "findScenes" in body["query"]:
+            scene_filter = body["variables"]["filter"]
+            per_page = scene_filter["per_page"]
+            page_start = (scene_filter["page"] - 1) * per_page
+
+            data = {
+                "findScenes": {
+                    "count": len(self.server.scene_dicts),
+                    "scenes": self.server.scene_dicts[
+                        page_start : page_start + per_page
+                    ],
+                }
+            }
+        else:
+            data = {"version": {"version": "benchmark"}}
+
+        response = json.dumps({"data": data}).encode()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_library(options: LibraryOptions, root_dir: str, port_queue):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), GraphQLStubHandler)
+
+    studios = create_studio_tree(options.studio_depth, options.studio_fanout)
+    server.scene_dicts = list(iter_scene_dicts(options, studios, Path(root_dir)))
+
+    port_queue.put(server.server_port)
+    server.serve_forever()
+
+
+class GraphQLStub:
+    """
+    Serves the synthetic library from another process, so the server does not compete with the client for the GIL
+    """
+
+    def __init__(self, options: LibraryOptions, root_dir: Path):
+        port_queue = multiprocessing.Queue()
+
+        self.process = multiprocessing.Process(
+            target=serve_library,
+            args=(options, str(root_dir), port_queue),
+            daemon=True,
+        )
+        self.process.start()
+
+        self.graphql_url = f"http://127.0.0.1:{port_queue.get()}/graphql"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.process.terminate()
+        self.process.join()
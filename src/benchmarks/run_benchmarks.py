@@ -0,0 +1,303 @@
+"""
+Times each stage of the renaming pipeline on synthetic libraries and saves the results as JSON
+
+Run from the src folder:
+
+    python -m benchmarks.run_benchmarks --files 10000 100000 1000000 --output results.json --baseline previous_results.json
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import platform
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+from benchmarks.graphql_stub import GraphQLStub
+from benchmarks.synthetic_library import (
+    LibraryOptions,
+    create_config,
+    create_studio_tree,
+    iter_scene_dicts,
+)
+from components.destination_index import DestinationIndex
+from components.fill_template import fill_template_file_dir, fill_template_file_name
+from components.find_matching_template import (
+    compile_template_matchers,
+    find_matching_template,
+)
+from components.plugin_paths import PLUGIN_DIR
+from components.process_scenes import create_new_file_path
+from components.stash_db import StashDB
+from components.stash_graphql import StashGraphQL
+from components.studio_helpers import StudioRegistry
+from models.compact_scene import CompactScene
+from models.config import StashApiConfig
+from test_utils.stash_db_builder import StashDBBuilder
+
+
+def time_stage(stage_results: dict, stage_name: str, item_count: int, func: Callable):
+    start = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - start
+
+    stage_results[stage_name] = {
+        "seconds": round(seconds, 6),
+        "items": item_count,
+        "items_per_second": round(item_count / seconds, 1) if seconds else None,
+    }
+
+    return result
+
+
+def benchmark_library(options: LibraryOptions, commit_batch_size: int) -> dict:
+    """
+    Stages:
+    - graphql_parse: fetch and parse every scenes page from a local GraphQL stub
+    - scene_models: build the scene models from the GraphQL JSON
+    - matching: find the file name and file dir template of each file
+    - fill_template: fill the matching templates
+    - create_new_file_path: generate the new file paths, checked against a destination index
+    - stash_db_writes: update the files of a temporary stash db with the new paths
+    """
+
+    stage_results: dict = {}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        root_dir = Path(tmp_dir)
+
+        studios = create_studio_tree(options.studio_depth, options.studio_fanout)
+        studio_registry = StudioRegistry(studios)
+        config = create_config(options, studios, root_dir)
+
+        scene_dicts = list(iter_scene_dicts(options, studios, root_dir))
+
+        with GraphQLStub(options, root_dir) as graphql_stub:
+            with StashGraphQL(graphql_stub.graphql_url) as stash_graphql:
+                time_stage(
+                    stage_results,
+                    "graphql_parse",
+                    len(scene_dicts),
+                    lambda: sum(
+                        1
+                        for _ in stash_graphql.iter_all_scenes(
+                            StashApiConfig().SCENES_PER_PAGE
+                        )
+                    ),
+                )
+
+        scenes = time_stage(
+            stage_results,
+            "scene_models",
+            len(scene_dicts),
+            lambda: [CompactScene.from_dict(scene_dict) for scene_dict in scene_dicts],
+        )
+        del scene_dicts
+
+        files = [(scene, file) for scene in scenes for file in scene.files]
+
+        def match_templates():
+            template_matchers = compile_template_matchers(config, studio_registry)
+
+            return [
+                (
+                    scene,
+                    file,
+                    find_matching_template(scene, file, template_matchers.file_name),
+                    find_matching_template(scene, file, template_matchers.file_dir),
+                )
+                for scene, file in files
+            ]
+
+        matched_files = time_stage(
+            stage_results, "matching", len(files), match_templates
+        )
+
+        def fill_templates():
+            for scene, file, file_name_template, file_dir_template in matched_files:
+                fill_template_file_name(
+                    file_name_template,
+                    scene,
+                    studio_registry,
+                    file,
+                    config.TEMPLATE_VARIABLES_CONFIG,
+                )
+                fill_template_file_dir(
+                    file_dir_template,
+                    scene,
+                    studio_registry,
+                    file,
+                    config.TEMPLATE_VARIABLES_CONFIG,
+                )
+
+        time_stage(stage_results, "fill_template", len(files), fill_templates)
+
+        def create_new_file_paths():
+            destination_index = DestinationIndex()
+            renames = []
+
+            for scene, file, file_name_template, file_dir_template in matched_files:
+                new_file_path = create_new_file_path(
+                    scene,
+                    studio_registry,
+                    file,
+                    config,
+                    file_name_template,
+                    file_dir_template,
+                    destination_index.contains,
+                )
+
+                destination_index.reserve(new_file_path)
+                destination_index.release(file.path)
+
+                renames.append((file, new_file_path))
+
+            return renames
+
+        renames = time_stage(
+            stage_results, "create_new_file_path", len(files), create_new_file_paths
+        )
+
+        stash_db_builder = StashDBBuilder(str(root_dir / "stash.db")).with_folder(
+            str(root_dir / "renamed")
+        )
+        for _, file in files:
+            stash_db_builder.with_file(int(file.id), file.path)
+        sqlite_path = stash_db_builder.build()
+
+        def write_stash_db():
+            stash_db = StashDB(
+                sqlite_path, dryrun_enabled=False, commit_batch_size=commit_batch_size
+            )
+
+            for file, new_file_path in renames:
+                stash_db.rename(file, new_file_path)
+
+            stash_db.commit()
+            stash_db.close()
+
+        time_stage(stage_results, "stash_db_writes", len(renames), write_stash_db)
+
+    return {
+        "file_count": options.file_count,
+        "studio_count": len(studios),
+        "template_count": options.template_count,
+        "stages": stage_results,
+    }
+
+
+def run_benchmarks(
+    file_counts: Iterable[int],
+    studio_depth: int = 4,
+    studio_fanout: int = 4,
+    template_count: int = 50,
+    commit_batch_size: int = 1000,
+) -> dict:
+    return {
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "git_commit": get_git_commit(),
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+        "commit_batch_size": commit_batch_size,
+        "libraries": [
+            benchmark_library(
+                LibraryOptions(
+                    file_count=file_count,
+                    studio_depth=studio_depth,
+                    studio_fanout=studio_fanout,
+                    template_count=template_count,
+                ),
+                commit_batch_size,
+            )
+            for file_count in file_counts
+        ],
+    }
+
+
+def get_git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=PLUGIN_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(results: dict, baseline_results: dict) -> list[str]:
+    "Returns a line for each stage of the libraries that are in both results, with the change in time from the baseline"
+
+    baseline_libraries = {
+        library["file_count"]: library for library in baseline_results["libraries"]
+    }
+
+    lines = []
+    for library in results["libraries"]:
+        baseline_library = baseline_libraries.get(library["file_count"])
+
+        if baseline_library is None:
+            continue
+
+        for stage_name, stage in library["stages"].items():
+            baseline_stage = baseline_library["stages"].get(stage_name)
+
+            if baseline_stage is None or not baseline_stage["seconds"]:
+                continue
+
+            change = stage["seconds"] / baseline_stage["seconds"] - 1
+
+            lines.append(
+                f"{library['file_count']:>9} files  {stage_name:<22} {baseline_stage['seconds']:>10.3f}s -> {stage['seconds']:>10.3f}s  ({change:+.1%})"
+            )
+
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, nargs="+", default=[10000])
+    parser.add_argument("--studio-depth", type=int, default=4)
+    parser.add_argument("--studio-fanout", type=int, default=4)
+    parser.add_argument("--templates", type=int, default=50)
+    parser.add_argument("--commit-batch-size", type=int, default=1000)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument(
+        "--baseline", help="results of a previous run to compare the stage times to"
+    )
+    args = parser.parse_args()
+
+    # the renamer logs every file at debug level, only the time spent in the renamer is measured
+    logging.disable(logging.INFO)
+
+    results = run_benchmarks(
+        args.files,
+        studio_depth=args.studio_depth,
+        studio_fanout=args.studio_fanout,
+        template_count=args.templates,
+        commit_batch_size=args.commit_batch_size,
+    )
+
+    Path(args.output).write_text(json.dumps(results, indent=2))
+
+    for library in results["libraries"]:
+        for stage_name, stage in library["stages"].items():
+            print(
+                f"{library['file_count']:>9} files  {stage_name:<22} {stage['seconds']:>10.3f}s  ({stage['items_per_second']} items/s)"
+            )
+
+    if args.baseline:
+        print(f"\nCompared to {args.baseline}:")
+        baseline_results = json.loads(Path(args.baseline).read_text())
+        for line in compare_results(results, baseline_results):
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import datetime
+from pathlib import Path
+from typing import Iterator, NamedTuple
+
+from models.config import Config
+from models.studio import Studio
+from test_utils.config_builder import ConfigBuilder
+from test_utils.scene_builder import SceneBuilder
+from test_utils.scene_file_builder import SceneFileBuilder
+
+PERFORMER_COUNT = 500
+TAG_NAMES = [f"Tag {tag_number}" for tag_number in range(1, 51)]
+FIRST_SCENE_DATE = datetime.date(2010, 1, 1)
+
+
+class LibraryOptions(NamedTuple):
+    file_count: int
+    # depth and number of children of each studio of the studio tree, the scenes belong to the studios at the bottom of the tree
+    studio_depth: int = 4
+    studio_fanout: int = 4
+    # number of file name templates, all but the last one have a filter
+    template_count: int = 50
+
+
+def create_studio_tree(depth: int, fanout: int) -> list[Studio]:
+    "Creates `fanout` top level studios, each with `fanout` sub studios, down to `depth` levels"
+
+    studios: list[Studio] = []
+    parents: list[Studio | None] = [None]
+
+    for _ in range(depth):
+        level: list[Studio] = []
+
+        for parent in parents:
+            for _ in range(fanout):
+                studio_id = str(len(studios) + 1)
+                studio = Studio(
+                    id=studio_id,
+                    name=f"Studio {studio_id}",
+                    parent_studio=(
+                        Studio(id=parent.id, name=parent.name)
+                        if parent is not None
+                        else None
+                    ),
+                )
+
+                studios.append(studio)
+                level.append(studio)
+
+        parents = level
+
+    return studios
+
+
+def get_leaf_studios(studios: list[Studio], options: LibraryOptions) -> list[Studio]:
+    return studios[-(options.studio_fanout**options.studio_depth) :]
+
+
+def get_top_level_studios(
+    studios: list[Studio], options: LibraryOptions
+) -> list[Studio]:
+    return studios[: options.studio_fanout]
+
+
+def iter_scene_dicts(
+    options: LibraryOptions, studios: list[Studio], root_dir: Path
+) -> Iterator[dict]:
+    """
+    Yields the GraphQL JSON of one scene per file, the same scenes are generated for the same options
+    """
+
+    leaf_studios = get_leaf_studios(studios, options)
+
+    for scene_number in range(1, options.file_count + 1):
+        studio = leaf_studios[scene_number % len(leaf_studios)]
+
+        file_dict = (
+            SceneFileBuilder(str(scene_number))
+            .with_file_path(
+                str(
+                    root_dir
+                    / "library"
+                    / f"{scene_number % 100}"
+                    / f"{scene_number}.mp4"
+                )
+            )
+            .build_dict()
+        )
+        file_dict["fingerprints"] = [
+            {"type": "oshash", "value": f"{scene_number:016x}"},
+            {"type": "phash", "value": f"{scene_number * 31:016x}"},
+        ]
+
+        yield (
+            SceneBuilder(
+                {
+                    "id": str(scene_number),
+                    "title": f"Scene {scene_number}",
+                    "date": str(
+                        FIRST_SCENE_DATE + datetime.timedelta(days=scene_number % 5000)
+                    ),
+                }
+            )
+            .with_studio({"id": studio.id, "name": studio.name})
+            .with_performers(
+                [
+                    {
+                        "id": str((scene_number + offset) % PERFORMER_COUNT + 1),
+                        "name": f"Performer {(scene_number + offset) % PERFORMER_COUNT + 1}",
+                        "gender": "FEMALE" if offset % 2 == 0 else "MALE",
+                    }
+                    for offset in range(scene_number % 4)
+                ]
+            )
+            .with_tags(
+                [
+                    TAG_NAMES[(scene_number + offset) % len(TAG_NAMES)]
+                    for offset in range(scene_number % 6)
+                ]
+            )
+            .with_files([file_dict])
+            .build_dict()
+        )
+
+
+def create_config(
+    options: LibraryOptions, studios: list[Studio], root_dir: Path
+) -> Config:
+    """
+    Creates a config with `template_count` file name templates
+
+    The templates filter on studios, parent studios and tags in turn, so most scenes are checked against every filter before matching the last template
+    """
+
+    leaf_studios = get_leaf_studios(studios, options)
+    top_level_studios = get_top_level_studios(studios, options)
+
+    file_name_templates: list[dict] = []
+
+    for template_number in range(options.template_count - 1):
+        template = f"{{studio}} {{date}} {{title}} -- {{performers}} ({{resolution}}) {template_number}"
+
+        if template_number % 3 == 0:
+            template_filter = {
+                "matches_studio": leaf_studios[template_number % len(leaf_studios)].name
+            }
+        elif template_number % 3 == 1:
+            template_filter = {
+                "matches_part_of_studio": top_level_studios[
+                    template_number % len(top_level_studios)
+                ].name,
+                "matches_organized_value": True,
+            }
+        else:
+            template_filter = {
+                "matches_all_tags": TAG_NAMES[: template_number % len(TAG_NAMES) + 2]
+            }
+
+        file_name_templates.append({**template_filter, "TEMPLATE": template})
+
+    file_name_templates.append(
+        {
+            "TEMPLATE": "[{studio_family}] {date:%Y.%m.%d} {title} -- {performers} ({resolution_name}) {oshash}"
+        }
+    )
+
+    renamed_dir = root_dir / "renamed"
+
+    file_dir_templates = [
+        {
+            "matches_part_of_studio": studio.name,
+            "TEMPLATE": str(renamed_dir / "{studio_hierarchy}"),
+        }
+        for studio in top_level_studios[:-1]
+    ] + [{"TEMPLATE": str(renamed_dir / "{studio_family}" / "{date:%Y}")}]
+
+    return (
+        ConfigBuilder()
+        .with_file_name_templates(file_name_templates)
+        .with_file_dir_templates(file_dir_templates)
+        .with_max_path_len(None)
+        .build()
+    )
@@ -0,0 +1,136 @@
+import asyncio
+import collections
+import logging
+from typing import AsyncIterator, Callable, Iterator, TypeVar
+
+import components.setup_logging
+from components.stash_graphql import StashGraphQL, parse_scenes
+from models.compact_scene import CompactScene
+from models.scene import Scene
+from models.studio import Studio
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class AsyncStashGraphQL:
+    """
+    Sends the requests of a StashGraphQL client concurrently, at most `max_concurrent_requests` at a time
+
+    The requests run on threads (with asyncio.to_thread) and share the connection pool of the client.
+    Each response is parsed on its thread as soon as it lands, so the pages and chunks are parsed while the other requests are still waiting on Stash
+    """
+
+    def __init__(self, stash_graphql: StashGraphQL, max_concurrent_requests: int):
+        self.stash_graphql = stash_graphql
+        self.max_concurrent_requests = max_concurrent_requests
+        self.semaphore = asyncio.Semaphore(max_concurrent_requests)
+
+    async def run(self, func: Callable[..., T], *args) -> T:
+        "Runs a function sending requests to Stash (eg. with the StashGraphQL client) on a thread, counted against the concurrent requests limit"
+
+        async with self.semaphore:
+            return await asyncio.to_thread(func, *args)
+
+    async def get_stash_version(self) -> str:
+        return await self.run(self.stash_graphql.get_stash_version)
+
+    async def get_all_studios(self) -> list[Studio]:
+        return await self.run(self.stash_graphql.get_all_studios)
+
+    async def get_scene_with_id(self, scene_id: int) -> Scene:
+        return await self.run(self.stash_graphql.get_scene_with_id, scene_id)
+
+    async def get_all_scenes(self, per_page: int) -> AsyncIterator[list[CompactScene]]:
+        """
+        Yields the pages of scenes sorted by id. The first page gives the number of scenes, the next pages are requested concurrently,
+        at most `max_concurrent_requests` pages ahead of the page being yielded, so only a few pages are held in memory at a time
+        """
+
+        scene_count, scene_dicts = await self.run(
+            self.stash_graphql.get_scenes_page, 1, per_page
+        )
+
+        def get_page(page: int) -> list[CompactScene]:
+            _, scene_dicts = self.stash_graphql.get_scenes_page(page, per_page)
+            return parse_scenes(scene_dicts)
+
+        page_count = max(-(-scene_count // per_page), 1)
+        next_page = 2
+
+        pending_pages: collections.deque[asyncio.Task[list[CompactScene]]] = (
+            collections.deque(
+                [asyncio.create_task(asyncio.to_thread(parse_scenes, scene_dicts))]
+            )
+        )
+
+        try:
+            while True:
+                while (
+                    next_page <= page_count
+                    and len(pending_pages) <= self.max_concurrent_requests
+                ):
+                    pending_pages.append(
+                        asyncio.create_task(self.run(get_page, next_page))
+                    )
+                    next_page += 1
+
+                if not pending_pages:
+                    return
+
+                page_scenes = await pending_pages.popleft()
+
+                # scenes were added since the first page was requested, the next pages are requested until one is not full
+                if (
+                    not pending_pages
+                    and next_page > page_count
+                    and len(page_scenes) == per_page
+                ):
+                    page_count += 1
+
+                yield page_scenes
+        finally:
+            for pending_page in pending_pages:
+                pending_page.cancel()
+
+    async def get_scenes_with_ids(
+        self, scene_ids: list[int], chunk_size: int
+    ) -> list[CompactScene]:
+        """
+        Returns the scenes with the given ids (in the same order), the chunks of `chunk_size` scenes are requested concurrently
+        """
+
+        chunks = await asyncio.gather(
+            *[
+                self.run(
+                    self.stash_graphql.get_scenes_chunk,
+                    scene_ids[chunk_start : chunk_start + chunk_size],
+                )
+                for chunk_start in range(0, len(scene_ids), chunk_size)
+            ]
+        )
+
+        return [scene for chunk_scenes in chunks for scene in chunk_scenes]
+
+
+def iter_async(async_iterator: AsyncIterator[T]) -> Iterator[T]:
+    """
+    Iterates an async iterator from synchronous code (eg. the source of the pipeline), on an event loop of its own.
+    The requests sent ahead keep running on their threads between the items
+    """
+
+    loop = asyncio.new_event_loop()
+
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(anext(async_iterator))
+            except StopAsyncIteration:
+                return
+    finally:
+        try:
+            loop.run_until_complete(async_iterator.aclose())
+            loop.run_until_complete(loop.shutdown_default_executor())
+        finally:
+            loop.close()
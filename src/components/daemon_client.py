@@ -0,0 +1,131 @@
+import json
+import logging
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+import components.setup_logging
+from components.instrumentation import get_run_metrics
+
+logger = logging.getLogger(__name__)
+
+MAIN_PATH = Path(__file__).resolve().parent.parent / "main.py"
+
+# Seconds a hook waits for a daemon it started to listen on the socket, before renaming the scenes on its own process
+DAEMON_START_TIMEOUT = 10
+
+# Seconds a hook waits for the next message of the daemon (a log line or the result of the hook), before failing
+DAEMON_REPLY_TIMEOUT = 300
+
+# Bumped when the requests or the messages sent to the hooks change, a daemon receiving a request of another version restarts
+PROTOCOL_VERSION = 1
+
+
+class RenamerDaemonError(Exception):
+    "A hook forwarded to the renamer daemon failed, the message holds the traceback from the daemon"
+
+
+def is_daemon_supported() -> bool:
+    return hasattr(socket, "AF_UNIX")
+
+
+def forward_to_daemon(socket_path: str, plugin_input: str) -> bool:
+    """
+    Sends the plugin input of a hook to the renamer daemon listening on `socket_path`, starting the daemon if it is not running.
+    The log lines of the daemon are written to stderr as if the hook was run on this process, and its run metrics are added to this run's metrics
+
+    Returns False if the hook has to be run on this process instead (eg. the daemon could not be started, or it is restarting after the config changed).
+    Once the request was sent, the daemon may run the hook at any time, so the hook fails with a `RenamerDaemonError`
+    rather than running on this process when the daemon does not reply in time or closes the connection
+    """
+
+    if not is_daemon_supported():
+        logger.warning("The renamer daemon needs Unix sockets, running the hook")
+        return False
+
+    if (conn := connect_to_daemon(socket_path)) is None:
+        start_daemon()
+
+        deadline = time.monotonic() + DAEMON_START_TIMEOUT
+        while (conn := connect_to_daemon(socket_path)) is None:
+            if time.monotonic() > deadline:
+                logger.warning("The renamer daemon did not start, running the hook")
+                return False
+
+            time.sleep(0.05)
+
+    conn.settimeout(DAEMON_REPLY_TIMEOUT)
+
+    with get_run_metrics().time("daemon.request"), conn:
+        try:
+            conn.sendall(
+                json.dumps(
+                    {"protocol_version": PROTOCOL_VERSION, "plugin_input": plugin_input}
+                ).encode()
+                + b"\n"
+            )
+        except OSError as e:
+            logger.warning(
+                "Error sending the hook to the renamer daemon (%s), running the hook", e
+            )
+            return False
+
+        try:
+            return read_daemon_reply(conn)
+        except socket.timeout:
+            raise RenamerDaemonError(
+                f"The renamer daemon did not reply for {DAEMON_REPLY_TIMEOUT} seconds"
+            ) from None
+        except OSError as e:
+            raise RenamerDaemonError(
+                f"Lost the connection to the renamer daemon: {e}"
+            ) from e
+
+
+def read_daemon_reply(conn: socket.socket) -> bool:
+    for line in conn.makefile("r", encoding="utf-8"):
+        message = json.loads(line)
+
+        if "stderr" in message:
+            sys.stderr.write(message["stderr"])
+            sys.stderr.flush()
+            continue
+
+        get_run_metrics().merge(message.get("metrics", ({}, {})))
+
+        if message["status"] == "error":
+            raise RenamerDaemonError(message["error"])
+
+        return message["status"] == "done"
+
+    raise RenamerDaemonError(
+        "The renamer daemon closed the connection before the hook finished"
+    )
+
+
+def connect_to_daemon(socket_path: str) -> Optional[socket.socket]:
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+    try:
+        conn.connect(socket_path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        conn.close()
+        return None
+
+    return conn
+
+
+def start_daemon():
+    logger.info("Starting the renamer daemon")
+
+    # in a session of its own, so the daemon outlives the hook (and Stash does not wait for it)
+    subprocess.Popen(
+        [sys.executable, str(MAIN_PATH), "--daemon"],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
@@ -0,0 +1,71 @@
+import logging
+import os
+
+import components.setup_logging
+
+logger = logging.getLogger(__name__)
+
+
+def list_file_names(dir_path: str) -> set[str]:
+    try:
+        with os.scandir(dir_path) as entries:
+            return {entry.name for entry in entries if entry.is_file()}
+    except (FileNotFoundError, NotADirectoryError):
+        return set()
+
+
+class DestinationIndex:
+    """
+    The names of the files in each destination directory
+
+    A directory is listed once, the first time one of its paths is checked, then kept up to date with the renames planned in the run:
+    the new path of a file is reserved and its old path is released, whether or not the file has been moved yet.
+    So checking a path is a set lookup, and a dry run resolves duplicate file paths the same way as a real run.
+    """
+
+    def __init__(self):
+        # normcase -> case insensitive on Windows, like the file system
+        self.file_names_by_dir: dict[str, set[str]] = {}
+        # paths released in directories that have not been listed yet
+        self.released_paths: set[str] = set()
+
+    def _split(self, path: str) -> tuple[str, str]:
+        dir_path, file_name = os.path.split(os.path.normcase(path))
+        return dir_path, file_name
+
+    def _get_file_names(self, dir_path: str) -> set[str]:
+        if (file_names := self.file_names_by_dir.get(dir_path)) is not None:
+            return file_names
+
+        logger.debug("Listing destination directory: '%s'", dir_path)
+
+        file_names = {
+            os.path.normcase(file_name) for file_name in list_file_names(dir_path)
+        }
+        file_names -= {
+            file_name
+            for file_name in file_names
+            if os.path.join(dir_path, file_name) in self.released_paths
+        }
+
+        self.file_names_by_dir[dir_path] = file_names
+
+        return file_names
+
+    def contains(self, path: str) -> bool:
+        dir_path, file_name = self._split(path)
+        return file_name in self._get_file_names(dir_path)
+
+    def reserve(self, path: str):
+        dir_path, file_name = self._split(path)
+
+        self._get_file_names(dir_path).add(file_name)
+        self.released_paths.discard(os.path.join(dir_path, file_name))
+
+    def release(self, path: str):
+        dir_path, file_name = self._split(path)
+
+        if (file_names := self.file_names_by_dir.get(dir_path)) is not None:
+            file_names.discard(file_name)
+        else:
+            self.released_paths.add(os.path.join(dir_path, file_name))
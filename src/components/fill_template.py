@@ -3,7 +3,7 @@ import functools
 import os
 import re
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Optional
 
 from components.performer_helpers import (
     apply_performers_exclude_genders,
@@ -11,10 +11,13 @@ from components.performer_helpers import (
     apply_performers_order_by,
 )
 from components.studio_helpers import (
+    StudioRegistry,
     get_parent_studio,
     get_studio_family,
     get_studio_hierarchy,
 )
+from components.template_parser import compile_template
+from models.compact_scene import CompactScene, CompactSceneFile, CompactSceneStudio
 from models.config import FileNameConfig, PerformersConfig
 from models.scene import Scene, SceneFile, ScenePerformer, SceneTag
 from models.studio import Studio
@@ -22,12 +25,16 @@ from models.template_variables_config import TemplateVariablesConfig
 
 OS_PATH_SEPARATOR = os.path.sep
 
+WHITESPACE_PATTERN = re.compile(r"\s+")
+APOSTROPHES_PATTERN = re.compile("[’‘”“]+")
+ILLEGAL_FILE_NAME_CHARACTERS_PATTERN = re.compile(r'[<>:"/\\|?*]')
+
 
 def fill_template_file_name(
     template: str,
-    scene: Scene,
-    studios: list[Studio],
-    file: SceneFile,
+    scene: Scene | CompactScene,
+    studios: StudioRegistry,
+    file: SceneFile | CompactSceneFile,
     template_variables_config: TemplateVariablesConfig,
 ):
     return fill_template(template, scene, studios, file, template_variables_config)
@@ -35,9 +42,9 @@ def fill_template_file_name(
 
 def fill_template_file_dir(
     template: str,
-    scene: Scene,
-    studios: list[Studio],
-    file: SceneFile,
+    scene: Scene | CompactScene,
+    studios: StudioRegistry,
+    file: SceneFile | CompactSceneFile,
     template_variables_config: TemplateVariablesConfig,
 ):
     return fill_template(template, scene, studios, file, template_variables_config)
@@ -45,63 +52,42 @@ def fill_template_file_dir(
 
 def fill_template(
     template: str,
-    scene: Scene,
-    studios: list[Studio],
-    file: SceneFile,
+    scene: Scene | CompactScene,
+    studios: StudioRegistry,
+    file: SceneFile | CompactSceneFile,
     template_variables_config: TemplateVariablesConfig,
 ) -> str:
     """Fill the template with the scene and studio data"""
 
-    replacers = {
-        "{title}": create_title_replacer(scene.title),
-        "{studio}": create_studio_replacer(scene.studio),
-        "{parent_studio}": create_parent_studio_replacer(scene.studio, studios),
-        "{studio_family}": create_studio_family_replacer(scene.studio, studios),
-        "{performers}": create_performers_replacer(
-            scene.performers,
-            template_variables_config.PERFORMERS_CONFIG or PerformersConfig(),
-        ),
-        r"({date}|{date(?:\:.+?)})": create_date_replacer(scene.date),
-        "{resolution}": create_resolution_replacer(file.resolution),
-        "{resolution_name}": create_resolution_name_replacer(file.resolution_name),
-        r"({duration}|{duration(?:\:.+?)})": create_duration_replacer(file.duration),
-        "{bit_rate_mbps}": create_bit_rate_mbps_replacer(file.bit_rate_mbps),
-        "{tags}": create_tags_replacer(scene.tags),
-        "{video_codec}": create_video_codec_replacer(file.video_codec),
-        "{audio_codec}": create_audio_codec_replacer(file.audio_codec),
-        "{movie_scene_number}": create_movie_scene_number_replacer(
-            scene.movie_scene_number
-        ),
-        "{movie_name}": create_movie_name_replacer(scene.movie_name),
-        r"({movie_date}|{movie_date(?:\:.+?)})": create_movie_date_replacer(
-            scene.movie_date
-        ),
-        "{scene_stash_id}": create_scene_stash_id_replacer(scene.stash_id),
-        "{performers_stash_ids}": create_performers_stash_ids_replacer(
-            scene.performers,
-            template_variables_config.PERFORMERS_CONFIG or PerformersConfig(),
-        ),
-        "{studio_code}": create_studio_code_replacer(scene.studio_code),
-        "{oshash}": create_oshash_replacer(file.oshash),
-        "{phash}": create_phash_replacer(file.phash),
-        "{src}": create_src_replacer(file.path),
-        "{rating}": create_rating_replacer(scene.rating),
-        "{studio_hierarchy}": create_studio_hierarchy_replacer(scene.studio, studios),
-    }
-
-    for template_var, replacer in replacers.items():
-        template = re.sub(
-            template_var,
-            lambda match: replacer(match.group()),
-            template,
-        )
+    compiled_template = compile_template(template)
+
+    # only the template variables used in the template are evaluated, once per variable
+    replacers: dict[str, Callable[[Optional[str]], str]] = {}
+
+    filled_template_parts = []
+    for node in compiled_template.nodes:
+        if isinstance(node, str):
+            filled_template_parts.append(node)
+            continue
+
+        replacer = replacers.get(node.name)
+
+        if replacer is None:
+            replacer = REPLACER_FACTORIES[node.name](
+                scene, studios, file, template_variables_config
+            )
+            replacers[node.name] = replacer
+
+        filled_template_parts.append(replacer(node.format_spec))
+
+    filled_template = "".join(filled_template_parts)
 
     # replace multiple white spaces with a single space
-    template = re.sub(r"\s+", " ", template)
+    filled_template = WHITESPACE_PATTERN.sub(" ", filled_template)
     # remove leading and trailing white spaces
-    template = template.strip()
+    filled_template = filled_template.strip()
 
-    return template
+    return filled_template
 
 
 def sanitize_file_name(func):
@@ -110,25 +96,25 @@ def sanitize_file_name(func):
         text = func(*args, **kwargs)
 
         # use typewriter for Apostrophe
-        text = re.sub("[’‘”“]+", "'", text)
+        text = APOSTROPHES_PATTERN.sub("'", text)
 
         # remove illegal characters for Windows file names
-        return re.sub(r'[<>:"/\\|?*]', "", text)
+        return ILLEGAL_FILE_NAME_CHARACTERS_PATTERN.sub("", text)
 
     return wrapper
 
 
 def create_title_replacer(scene_title: Optional[str]):
     @sanitize_file_name
-    def title_replacer(match_group: str):
+    def title_replacer(format_spec: Optional[str]):
         return scene_title or ""
 
     return title_replacer
 
 
-def create_studio_replacer(scene_studio: Optional[Studio]):
+def create_studio_replacer(scene_studio: Optional[Studio | CompactSceneStudio]):
     @sanitize_file_name
-    def studio_replacer(match_group: str):
+    def studio_replacer(format_spec: Optional[str]):
         if scene_studio is None:
             return ""
         return scene_studio.name
@@ -138,7 +124,7 @@ def create_studio_replacer(scene_studio: Optional[Studio]):
 
 def create_resolution_replacer(file_resolution: Optional[str]):
     @sanitize_file_name
-    def resolution_replacer(match_group: str):
+    def resolution_replacer(format_spec: Optional[str]):
         return file_resolution or ""
 
     return resolution_replacer
@@ -146,7 +132,7 @@ def create_resolution_replacer(file_resolution: Optional[str]):
 
 def create_resolution_name_replacer(file_resolution_name: Optional[str]):
     @sanitize_file_name
-    def resolution_name_replacer(match_group: str):
+    def resolution_name_replacer(format_spec: Optional[str]):
         return file_resolution_name or ""
 
     return resolution_name_replacer
@@ -156,7 +142,7 @@ def create_performers_replacer(
     performers: Optional[list[ScenePerformer]], performers_config: PerformersConfig
 ):
     @sanitize_file_name
-    def performers_replacer(match_group: str):
+    def performers_replacer(format_spec: Optional[str]):
         if performers is None or len(performers) == 0:
             return performers_config.NO_PERFORMER_NAME or ""
 
@@ -180,25 +166,21 @@ def create_performers_replacer(
 
 def create_date_replacer(scene_date: Optional[datetime.date]):
     @sanitize_file_name
-    def date_replacer(match_group: str):
+    def date_replacer(format_spec: Optional[str]):
         if scene_date is None:
             return ""
 
-        if re.match(r"{date}", match_group):
+        if format_spec is None:
             return scene_date.isoformat()
 
-        if match := re.match(r"{date:(.+?)}", match_group):
-            date_format = match.group(1)
-            return scene_date.strftime(date_format)
-
-        return ""
+        return scene_date.strftime(format_spec)
 
     return date_replacer
 
 
 def create_oshash_replacer(file_oshash: Optional[str]):
     @sanitize_file_name
-    def oshash_replacer(match_group: str):
+    def oshash_replacer(format_spec: Optional[str]):
         return file_oshash or ""
 
     return oshash_replacer
@@ -206,7 +188,7 @@ def create_oshash_replacer(file_oshash: Optional[str]):
 
 def create_phash_replacer(file_phash: Optional[str]):
     @sanitize_file_name
-    def phash_replacer(match_group: str):
+    def phash_replacer(format_spec: Optional[str]):
         return file_phash or ""
 
     return phash_replacer
@@ -214,33 +196,31 @@ def create_phash_replacer(file_phash: Optional[str]):
 
 def create_duration_replacer(file_duration: Optional[datetime.time]):
     @sanitize_file_name
-    def duration_replacer(match_group: str):
+    def duration_replacer(format_spec: Optional[str]):
         if file_duration is None:
             return ""
 
-        if re.match(r"{duration}", match_group):
+        if format_spec is None:
             return file_duration.strftime("%H.%M.%S")
 
-        if match := re.match(r"{duration:(.+?)}", match_group):
-            duration_format = match.group(1)
-            return file_duration.strftime(duration_format)
-
-        return ""
+        return file_duration.strftime(format_spec)
 
     return duration_replacer
 
 
 def create_bit_rate_mbps_replacer(file_bit_rate_mbps: Optional[str]):
     @sanitize_file_name
-    def bit_rate_mbps_replacer(match_group: str):
+    def bit_rate_mbps_replacer(format_spec: Optional[str]):
         return file_bit_rate_mbps or ""
 
     return bit_rate_mbps_replacer
 
 
-def create_parent_studio_replacer(studio: Optional[Studio], studios: list[Studio]):
+def create_parent_studio_replacer(
+    studio: Optional[Studio | CompactSceneStudio], studios: StudioRegistry
+):
     @sanitize_file_name
-    def parent_studio_replacer(match_group: str):
+    def parent_studio_replacer(format_spec: Optional[str]):
         if studio is None:
             return ""
         return get_parent_studio(studio, studios).name
@@ -248,9 +228,11 @@ def create_parent_studio_replacer(studio: Optional[Studio], studios: list[Studio
     return parent_studio_replacer
 
 
-def create_studio_family_replacer(studio: Optional[Studio], studios: list[Studio]):
+def create_studio_family_replacer(
+    studio: Optional[Studio | CompactSceneStudio], studios: StudioRegistry
+):
     @sanitize_file_name
-    def studio_family_replacer(match_group: str):
+    def studio_family_replacer(format_spec: Optional[str]):
         if studio is None:
             return ""
         return get_studio_family(studio, studios).name
@@ -260,7 +242,7 @@ def create_studio_family_replacer(studio: Optional[Studio], studios: list[Studio
 
 def create_rating_replacer(scene_rating: Optional[int]):
     @sanitize_file_name
-    def rating_replacer(match_group: str):
+    def rating_replacer(format_spec: Optional[str]):
         return str(scene_rating) or ""
 
     return rating_replacer
@@ -268,18 +250,21 @@ def create_rating_replacer(scene_rating: Optional[int]):
 
 def create_tags_replacer(scene_tags: Optional[list[SceneTag]]):
     @sanitize_file_name
-    def tags_replacer(match_group: str):
+    def tags_replacer(format_spec: Optional[str]):
         if scene_tags is None:
             return ""
 
-        return ", ".join([tag.name for tag in scene_tags])
+        # ordered by id like the performers, so the file name does not depend on the order the tags were read in (GraphQL API or stash db)
+        return ", ".join(
+            [tag.name for tag in sorted(scene_tags, key=lambda tag: tag.id)]
+        )
 
     return tags_replacer
 
 
 def create_video_codec_replacer(file_video_codec: Optional[str]):
     @sanitize_file_name
-    def video_codec_replacer(match_group: str):
+    def video_codec_replacer(format_spec: Optional[str]):
         return file_video_codec or ""
 
     return video_codec_replacer
@@ -287,7 +272,7 @@ def create_video_codec_replacer(file_video_codec: Optional[str]):
 
 def create_audio_codec_replacer(file_audio_codec: Optional[str]):
     @sanitize_file_name
-    def audio_codec_replacer(match_group: str):
+    def audio_codec_replacer(format_spec: Optional[str]):
         return file_audio_codec or ""
 
     return audio_codec_replacer
@@ -295,7 +280,7 @@ def create_audio_codec_replacer(file_audio_codec: Optional[str]):
 
 def create_movie_name_replacer(movie_name: Optional[str]):
     @sanitize_file_name
-    def movie_name_replacer(match_group: str):
+    def movie_name_replacer(format_spec: Optional[str]):
         return movie_name or ""
 
     return movie_name_replacer
@@ -303,25 +288,21 @@ def create_movie_name_replacer(movie_name: Optional[str]):
 
 def create_movie_date_replacer(movie_date: Optional[datetime.date]):
     @sanitize_file_name
-    def movie_date_replacer(match_group: str):
+    def movie_date_replacer(format_spec: Optional[str]):
         if movie_date is None:
             return ""
 
-        if re.match(r"{movie_date}", match_group):
+        if format_spec is None:
             return movie_date.isoformat()
 
-        if match := re.match(r"{movie_date:(.+?)}", match_group):
-            date_format = match.group(1)
-            return movie_date.strftime(date_format)
-
-        return ""
+        return movie_date.strftime(format_spec)
 
     return movie_date_replacer
 
 
 def create_movie_scene_number_replacer(movie_scene_number: Optional[int]):
     @sanitize_file_name
-    def movie_scene_number_replacer(match_group: str):
+    def movie_scene_number_replacer(format_spec: Optional[str]):
         return str(movie_scene_number) or ""
 
     return movie_scene_number_replacer
@@ -329,7 +310,7 @@ def create_movie_scene_number_replacer(movie_scene_number: Optional[int]):
 
 def create_scene_stash_id_replacer(scene_stash_id: Optional[str]):
     @sanitize_file_name
-    def scene_stash_id_replacer(match_group: str):
+    def scene_stash_id_replacer(format_spec: Optional[str]):
         return scene_stash_id or ""
 
     return scene_stash_id_replacer
@@ -337,7 +318,7 @@ def create_scene_stash_id_replacer(scene_stash_id: Optional[str]):
 
 def create_studio_code_replacer(studio_code: Optional[str]):
     @sanitize_file_name
-    def studio_code_replacer(match_group: str):
+    def studio_code_replacer(format_spec: Optional[str]):
         return studio_code or ""
 
     return studio_code_replacer
@@ -347,7 +328,7 @@ def create_performers_stash_ids_replacer(
     performers: Optional[list[ScenePerformer]], performers_config: PerformersConfig
 ):
     @sanitize_file_name
-    def performers_stash_ids_replacer(match_group: str):
+    def performers_stash_ids_replacer(format_spec: Optional[str]):
         if performers is None or len(performers) == 0:
             return performers_config.NO_PERFORMER_NAME or ""
 
@@ -370,7 +351,7 @@ def create_performers_stash_ids_replacer(
 
 
 def create_src_replacer(src: Optional[str]):
-    def src_replacer(match_group: str):
+    def src_replacer(format_spec: Optional[str]):
         if not src:
             return ""
 
@@ -379,8 +360,10 @@ def create_src_replacer(src: Optional[str]):
     return src_replacer
 
 
-def create_studio_hierarchy_replacer(studio: Optional[Studio], studios: list[Studio]):
-    def studio_hierarchy_replacer(match_group: str):
+def create_studio_hierarchy_replacer(
+    studio: Optional[Studio | CompactSceneStudio], studios: StudioRegistry
+):
+    def studio_hierarchy_replacer(format_spec: Optional[str]):
         if studio is None:
             return ""
 
@@ -396,3 +379,75 @@ def create_studio_hierarchy_replacer(studio: Optional[Studio], studios: list[Stu
         )
 
     return studio_hierarchy_replacer
+
+
+# Creates the replacer of each template variable from the scene, studios, file and template variables config
+REPLACER_FACTORIES: dict[
+    str,
+    Callable[
+        [
+            Scene | CompactScene,
+            StudioRegistry,
+            SceneFile | CompactSceneFile,
+            TemplateVariablesConfig,
+        ],
+        Callable[[Optional[str]], str],
+    ],
+] = {
+    "title": lambda scene, studios, file, config: create_title_replacer(scene.title),
+    "studio": lambda scene, studios, file, config: create_studio_replacer(scene.studio),
+    "parent_studio": lambda scene, studios, file, config: create_parent_studio_replacer(
+        scene.studio, studios
+    ),
+    "studio_family": lambda scene, studios, file, config: create_studio_family_replacer(
+        scene.studio, studios
+    ),
+    "performers": lambda scene, studios, file, config: create_performers_replacer(
+        scene.performers, config.PERFORMERS_CONFIG or PerformersConfig()
+    ),
+    "date": lambda scene, studios, file, config: create_date_replacer(scene.date),
+    "resolution": lambda scene, studios, file, config: create_resolution_replacer(
+        file.resolution
+    ),
+    "resolution_name": lambda scene, studios, file, config: create_resolution_name_replacer(
+        file.resolution_name
+    ),
+    "duration": lambda scene, studios, file, config: create_duration_replacer(
+        file.duration
+    ),
+    "bit_rate_mbps": lambda scene, studios, file, config: create_bit_rate_mbps_replacer(
+        file.bit_rate_mbps
+    ),
+    "tags": lambda scene, studios, file, config: create_tags_replacer(scene.tags),
+    "video_codec": lambda scene, studios, file, config: create_video_codec_replacer(
+        file.video_codec
+    ),
+    "audio_codec": lambda scene, studios, file, config: create_audio_codec_replacer(
+        file.audio_codec
+    ),
+    "movie_scene_number": lambda scene, studios, file, config: create_movie_scene_number_replacer(
+        scene.movie_scene_number
+    ),
+    "movie_name": lambda scene, studios, file, config: create_movie_name_replacer(
+        scene.movie_name
+    ),
+    "movie_date": lambda scene, studios, file, config: create_movie_date_replacer(
+        scene.movie_date
+    ),
+    "scene_stash_id": lambda scene, studios, file, config: create_scene_stash_id_replacer(
+        scene.stash_id
+    ),
+    "performers_stash_ids": lambda scene, studios, file, config: create_performers_stash_ids_replacer(
+        scene.performers, config.PERFORMERS_CONFIG or PerformersConfig()
+    ),
+    "studio_code": lambda scene, studios, file, config: create_studio_code_replacer(
+        scene.studio_code
+    ),
+    "oshash": lambda scene, studios, file, config: create_oshash_replacer(file.oshash),
+    "phash": lambda scene, studios, file, config: create_phash_replacer(file.phash),
+    "src": lambda scene, studios, file, config: create_src_replacer(file.path),
+    "rating": lambda scene, studios, file, config: create_rating_replacer(scene.rating),
+    "studio_hierarchy": lambda scene, studios, file, config: create_studio_hierarchy_replacer(
+        scene.studio, studios
+    ),
+}
@@ -1,216 +1,238 @@
 import logging
 from pathlib import Path
-from typing import Optional
+from typing import NamedTuple, Optional
 
 import components.setup_logging
-from components.studio_helpers import contains_studio, find_studio_with_name
-from models.config import FileDirTemplateConfig, FileNameTemplateConfig
+from components.studio_helpers import StudioRegistry
+from models.compact_scene import CompactScene, CompactSceneFile
+from models.config import Config, FileDirTemplateConfig, FileNameTemplateConfig
 from models.scene import Scene, SceneFile
 from models.studio import Studio
 
 logger = logging.getLogger(__name__)
 
 
-def find_matching_template(
-    scene: Scene,
-    studios: list[Studio],
-    file: SceneFile,
-    template_configs: list[FileNameTemplateConfig] | list[FileDirTemplateConfig],
-):
-    for idx, template_config in enumerate(template_configs, 1):
-        logger.debug("Checking TEMPLATE %d: '%s'", idx, template_config.TEMPLATE)
-        if matches_template_config(
-            scene=scene,
-            studios=studios,
-            file=file,
-            template_config=template_config,
-        ):
-            return template_config.TEMPLATE
-
-    return None
+class TemplateMatcher:
+    """
+    A template config compiled once per run: the studio names of the filters are resolved against the studios and the tag names are put in sets
 
+    Only the filters that are set in the template config are checked, in the same order as before (studio, part of studio, all tags, any tags, organized, no performers, src)
+    """
 
-def matches_template_config(
-    scene: Scene,
-    studios: list[Studio],
-    file: SceneFile,
-    template_config: FileNameTemplateConfig | FileDirTemplateConfig,
-):
-    filter_funcs = [
-        create_matches_studio_filter(template_config.matches_studio),
-        create_matches_part_of_studio_filter(template_config.matches_part_of_studio),
-        create_matches_all_tags_filter(template_config.matches_all_tags),
-        create_matches_any_tags_filter(template_config.matches_any_tags),
-        create_matches_organized_value_filter(template_config.matches_organized_value),
-        create_matches_scene_with_no_performers_filter(
+    def __init__(
+        self,
+        template_config: FileNameTemplateConfig | FileDirTemplateConfig,
+        studios: StudioRegistry,
+    ):
+        self.template = template_config.TEMPLATE
+        self.studios = studios
+
+        self.matches_studio = template_config.matches_studio
+        self.matches_part_of_studio = template_config.matches_part_of_studio
+        self.matches_all_tags = template_config.matches_all_tags
+        self.matches_any_tags = template_config.matches_any_tags
+        self.matches_organized_value = template_config.matches_organized_value
+        self.matches_scene_with_no_performers = (
             template_config.matches_scene_with_no_performers
-        ),
-    ]
-
-    filter_descriptions = [
-        f'{{"matches_studio": "{template_config.matches_studio}"}}',
-        f'{{"matches_part_of_studio": "{template_config.matches_part_of_studio}"}}',
-        f'{{"matches_all_tags": "{template_config.matches_all_tags}"}}',
-        f'{{"matches_any_tags": "{template_config.matches_any_tags}"}}',
-        f'{{"matches_organized_value": "{template_config.matches_organized_value}"}}',
-        f'{{"matches_scene_with_no_performers": "{template_config.matches_scene_with_no_performers}"}}',
-    ]
-
-    if type(template_config) == FileDirTemplateConfig:
-        filter_funcs.append(
-            create_matches_src_filter(template_config.matches_src),
         )
-        filter_descriptions.append(
-            f'{{"matches_src": "{template_config.matches_src}"}}'
+        self.matches_src = (
+            template_config.matches_src
+            if type(template_config) == FileDirTemplateConfig
+            else None
         )
 
-    for idx, filter_func in enumerate(filter_funcs):
-        if not filter_func(scene=scene, studios=studios, file=file):
-            logger.debug(
-                f"Template Does Not Match. Failed Filter: %s", filter_descriptions[idx]
-            )
-            return False
+        # Get the full studio objects of the filter values (aka studio names)
+        self.match_studio = (
+            studios.find_with_name(self.matches_studio)
+            if self.matches_studio is not None
+            else None
+        )
+        self.match_part_of_studio = (
+            studios.find_with_name(self.matches_part_of_studio)
+            if self.matches_part_of_studio is not None
+            else None
+        )
 
-    return True
+        self.match_all_tag_names = frozenset(
+            tag_name.strip() for tag_name in self.matches_all_tags or []
+        )
+        self.match_any_tag_names = frozenset(
+            tag_name.strip() for tag_name in self.matches_any_tags or []
+        )
 
+        self.match_src_path = (
+            Path(self.matches_src) if self.matches_src is not None else None
+        )
 
-def create_matches_studio_filter(filter_value: Optional[str]):
-    def matches_studio_filter(scene: Scene, studios: list[Studio], file: SceneFile):
-        if filter_value is None:
-            return True
+        # (filter name, filter check) of the filters that are set
+        self.filters = [
+            (filter_name, filter_check)
+            for filter_name, filter_check in [
+                ("matches_studio", self._matches_studio_filter),
+                ("matches_part_of_studio", self._matches_part_of_studio_filter),
+                ("matches_all_tags", self._matches_all_tags_filter),
+                ("matches_any_tags", self._matches_any_tags_filter),
+                ("matches_organized_value", self._matches_organized_value_filter),
+                (
+                    "matches_scene_with_no_performers",
+                    self._matches_scene_with_no_performers_filter,
+                ),
+                ("matches_src", self._matches_src_filter),
+            ]
+            if getattr(self, filter_name) is not None
+        ]
+
+    def matches(
+        self,
+        scene: Scene | CompactScene,
+        file: SceneFile | CompactSceneFile,
+        scene_tag_names: frozenset[str],
+    ) -> bool:
+        for filter_name, filter_check in self.filters:
+            if not filter_check(scene, file, scene_tag_names):
+                # the filter description is only formatted if debug logging is enabled
+                logger.debug(
+                    'Template Does Not Match. Failed Filter: {"%s": "%s"}',
+                    filter_name,
+                    getattr(self, filter_name),
+                )
+                return False
 
+        return True
+
+    def _matches_studio_filter(
+        self,
+        scene: Scene | CompactScene,
+        file: SceneFile | CompactSceneFile,
+        scene_tag_names: frozenset[str],
+    ):
         # A scene with no studio will never match a studio filter
         if scene.studio is None:
             return False
 
-        # Get the full studio object of the filter value (aka studio name)
-        match_studio = find_studio_with_name(studio_name=filter_value, studios=studios)
-
-        if match_studio is None:
+        if self.match_studio is None:
             raise ValueError(
-                f"Unknown studio name in matches_studio filter: {filter_value}"
+                f"Unknown studio name in matches_studio filter: {self.matches_studio}"
             )
 
-        return match_studio.id == scene.studio.id
-
-    return matches_studio_filter
-
+        return self.match_studio.id == scene.studio.id
 
-def create_matches_part_of_studio_filter(filter_value: Optional[str]):
-    def matches_part_of_studio_filter(
-        scene: Scene, studios: list[Studio], file: SceneFile
+    def _matches_part_of_studio_filter(
+        self,
+        scene: Scene | CompactScene,
+        file: SceneFile | CompactSceneFile,
+        scene_tag_names: frozenset[str],
     ):
-        if filter_value is None:
-            return True
+        assert self.matches_part_of_studio is not None
 
         # A scene with no studio will never match a studio filter
         if scene.studio is None:
             return False
 
         # If the filter value is empty, raise an error
-        if not filter_value.strip():
+        if not self.matches_part_of_studio.strip():
             raise ValueError(
-                f"Empty filter value in matches_part_of_studio filter: {filter_value}"
+                f"Empty filter value in matches_part_of_studio filter: {self.matches_part_of_studio}"
             )
 
-        # Get the full studio object of the filter value (aka studio name)
-        match_studio = find_studio_with_name(studio_name=filter_value, studios=studios)
-
-        if match_studio is None:
+        if self.match_part_of_studio is None:
             raise ValueError(
-                f"Unknown studio name in matches_studio filter: {filter_value}"
+                f"Unknown studio name in matches_studio filter: {self.matches_part_of_studio}"
             )
 
-        return contains_studio(
-            studio=scene.studio,
-            target_studio_family=match_studio,
-            studios=studios,
-        )
-
-    return matches_part_of_studio_filter
-
-
-def create_matches_all_tags_filter(filter_value: Optional[list[str]]):
-    def matches_all_tags_filter(scene: Scene, studios: list[Studio], file: SceneFile):
-        if filter_value is None:
-            return True
+        return self.studios.contains(scene.studio, self.match_part_of_studio)
 
+    def _matches_all_tags_filter(
+        self,
+        scene: Scene | CompactScene,
+        file: SceneFile | CompactSceneFile,
+        scene_tag_names: frozenset[str],
+    ):
         # If there are no tags to filter, it's always a match
-        if len(filter_value) == 0:
+        if not self.match_all_tag_names:
             return True
 
         # If the filter value is empty, it's never a match
-        for filter_tag_name in filter_value:
-            if not filter_tag_name.strip():
-                raise ValueError(f"Empty tag name in matches_all_tags filter")
-
-        scene_tag_names = [tag.name for tag in scene.tags]
-
-        for filter_tag_name in filter_value:
-            if filter_tag_name.strip() not in scene_tag_names:
-                return False
-
-        return True
-
-    return matches_all_tags_filter
-
+        if "" in self.match_all_tag_names:
+            raise ValueError(f"Empty tag name in matches_all_tags filter")
 
-def create_matches_any_tags_filter(filter_value: Optional[list[str]]):
-    def matches_any_tags_filter(scene: Scene, studios: list[Studio], file: SceneFile):
-        if filter_value is None:
-            return True
+        return self.match_all_tag_names <= scene_tag_names
 
+    def _matches_any_tags_filter(
+        self,
+        scene: Scene | CompactScene,
+        file: SceneFile | CompactSceneFile,
+        scene_tag_names: frozenset[str],
+    ):
         # If there are no tags to filter, it's always a match
-        if len(filter_value) == 0:
+        if not self.match_any_tag_names:
             return True
 
         # If the filter value is empty, it's never a match
-        for filter_tag_name in filter_value:
-            if not filter_tag_name.strip():
-                raise ValueError(f"Empty tag name in matches_all_tags filter")
-
-        scene_tag_names = [tag.name for tag in scene.tags]
+        if "" in self.match_any_tag_names:
+            raise ValueError(f"Empty tag name in matches_all_tags filter")
 
-        for filter_tag_name in filter_value:
-            if filter_tag_name.strip() in scene_tag_names:
-                return True
-
-        return False
-
-    return matches_any_tags_filter
+        return not self.match_any_tag_names.isdisjoint(scene_tag_names)
 
+    def _matches_organized_value_filter(
+        self,
+        scene: Scene | CompactScene,
+        file: SceneFile | CompactSceneFile,
+        scene_tag_names: frozenset[str],
+    ):
+        return scene.organized == self.matches_organized_value
 
-def create_matches_organized_value_filter(filter_value: Optional[bool]):
-    def matches_organized_value_filter(
-        scene: Scene, studios: list[Studio], file: SceneFile
+    def _matches_scene_with_no_performers_filter(
+        self,
+        scene: Scene | CompactScene,
+        file: SceneFile | CompactSceneFile,
+        scene_tag_names: frozenset[str],
     ):
-        if filter_value is None:
-            return True
+        scene_has_no_performers = len(scene.performers) == 0
 
-        return scene.organized == filter_value
+        return scene_has_no_performers == self.matches_scene_with_no_performers
 
-    return matches_organized_value_filter
+    def _matches_src_filter(
+        self,
+        scene: Scene | CompactScene,
+        file: SceneFile | CompactSceneFile,
+        scene_tag_names: frozenset[str],
+    ):
+        assert self.match_src_path is not None
 
+        return Path(file.path).is_relative_to(self.match_src_path)
 
-def create_matches_scene_with_no_performers_filter(filter_value: Optional[bool]):
-    def matches_scene_with_no_performers_filter(
-        scene: Scene, studios: list[Studio], file: SceneFile
-    ):
-        if filter_value is None:
-            return True
 
-        scene_has_no_performers = len(scene.performers) == 0
+class TemplateMatchers(NamedTuple):
+    file_name: list[TemplateMatcher]
+    file_dir: list[TemplateMatcher]
 
-        return scene_has_no_performers == filter_value
 
-    return matches_scene_with_no_performers_filter
+def compile_template_matchers(
+    config: Config, studios: StudioRegistry
+) -> TemplateMatchers:
+    return TemplateMatchers(
+        file_name=[
+            TemplateMatcher(template_config, studios)
+            for template_config in config.FILE_NAME_CONFIG.FILE_NAME_TEMPLATES
+        ],
+        file_dir=[
+            TemplateMatcher(template_config, studios)
+            for template_config in config.FILE_DIR_CONFIG.FILE_DIR_TEMPLATES
+        ],
+    )
 
 
-def create_matches_src_filter(filter_value: Optional[str]):
-    def matches_src_filter(scene: Scene, studios: list[Studio], file: SceneFile):
-        if filter_value is None:
-            return True
+def find_matching_template(
+    scene: Scene | CompactScene,
+    file: SceneFile | CompactSceneFile,
+    template_matchers: list[TemplateMatcher],
+) -> Optional[str]:
+    scene_tag_names = frozenset(tag.name for tag in scene.tags)
 
-        return Path(file.path).is_relative_to(Path(filter_value))
+    for idx, template_matcher in enumerate(template_matchers, 1):
+        logger.debug("Checking TEMPLATE %d: '%s'", idx, template_matcher.template)
+        if template_matcher.matches(scene, file, scene_tag_names):
+            return template_matcher.template
 
-    return matches_src_filter
+    return None
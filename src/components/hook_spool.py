@@ -0,0 +1,145 @@
+import contextlib
+import logging
+import sqlite3
+import time
+from typing import Callable, Iterator, NamedTuple, Optional
+
+import components.setup_logging
+from components.instrumentation import get_run_metrics
+
+logger = logging.getLogger(__name__)
+
+
+class SpooledScene(NamedTuple):
+    scene_id: int
+    # incremented each time a hook spools the scene again, so a scene spooled again while it was being renamed stays in the spool
+    version: int
+
+
+class HookSpool:
+    """
+    The scenes updated by the hooks, waiting to be renamed in a batch by the leading hook (see `rename_spooled_scenes`)
+
+    A scene spooled by several hooks is only renamed once
+    """
+
+    def __init__(self, sqlite_path: str, busy_timeout: float = 30):
+        self.conn = sqlite3.connect(sqlite_path, timeout=busy_timeout)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS spooled_scenes (scene_id INTEGER PRIMARY KEY, spooled_at REAL NOT NULL, version INTEGER NOT NULL)"
+        )
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def add(self, scene_ids: list[int]):
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO spooled_scenes (scene_id, spooled_at, version) VALUES (?, ?, 1) ON CONFLICT (scene_id) DO UPDATE SET version = version + 1",
+                [(scene_id, time.time()) for scene_id in scene_ids],
+            )
+
+        get_run_metrics().count("hooks.spooled_scenes", len(scene_ids))
+
+    def get_spooled_scenes(self) -> list[SpooledScene]:
+        return [
+            SpooledScene(scene_id, version)
+            for scene_id, version in self.conn.execute(
+                "SELECT scene_id, version FROM spooled_scenes ORDER BY spooled_at, scene_id"
+            )
+        ]
+
+    def get_oldest_spooled_at(self) -> Optional[float]:
+        return self.conn.execute(
+            "SELECT MIN(spooled_at) FROM spooled_scenes"
+        ).fetchone()[0]
+
+    def remove(self, spooled_scenes: list[SpooledScene]):
+        """
+        Removes the renamed scenes. The scenes spooled again while they were being renamed stay in the spool,
+        and wait a whole window again, like the scenes spooled after the batch
+        """
+
+        with self.conn:
+            self.conn.executemany(
+                "DELETE FROM spooled_scenes WHERE scene_id = ? AND version = ?",
+                spooled_scenes,
+            )
+            self.conn.executemany(
+                "UPDATE spooled_scenes SET spooled_at = ? WHERE scene_id = ?",
+                [
+                    (time.time(), spooled_scene.scene_id)
+                    for spooled_scene in spooled_scenes
+                ],
+            )
+
+
+@contextlib.contextmanager
+def leader_lock(lock_path: str) -> Iterator[bool]:
+    """
+    Yields True if this hook got the leader lock, False if another hook holds it.
+    The lock is an exclusive transaction on a database of its own, released when the leader closes it or its process ends
+    """
+
+    conn = sqlite3.connect(lock_path, timeout=0, isolation_level=None)
+
+    try:
+        try:
+            conn.execute("BEGIN EXCLUSIVE")
+        except sqlite3.OperationalError:
+            yield False
+            return
+
+        yield True
+    finally:
+        conn.close()
+
+
+def rename_spooled_scenes(
+    spool: HookSpool,
+    lock_path: str,
+    coalesce_window: float,
+    rename_batch: Callable[[list[int]], None],
+):
+    """
+    Renames the spooled scenes in batches while this hook is the leader, returns right away if another hook is the leader
+
+    The leader waits until `coalesce_window` seconds passed since the oldest scene was spooled,
+    so the scenes spooled by the hooks fired in the meantime are renamed in the same batch
+    """
+
+    while True:
+        with leader_lock(lock_path) as is_leader:
+            if not is_leader:
+                logger.info("Another hook is renaming the spooled scenes")
+                return
+
+            while (oldest_spooled_at := spool.get_oldest_spooled_at()) is not None:
+                time.sleep(max(oldest_spooled_at + coalesce_window - time.time(), 0))
+
+                spooled_scenes = spool.get_spooled_scenes()
+                logger.info(
+                    "Renaming a batch of %d spooled scenes", len(spooled_scenes)
+                )
+                get_run_metrics().count("hooks.batches")
+
+                try:
+                    with get_run_metrics().time("hooks.batch"):
+                        rename_batch(
+                            [spooled_scene.scene_id for spooled_scene in spooled_scenes]
+                        )
+                finally:
+                    # a failed batch is not renamed again by the next hook, like a failed hook before batches
+                    spool.remove(spooled_scenes)
+
+        # a hook that spooled a scene after the last batch gave up, since this hook was still the leader
+        if spool.get_oldest_spooled_at() is None:
+            return
@@ -0,0 +1,122 @@
+import hashlib
+import json
+import logging
+import os
+from typing import NamedTuple, Optional
+
+import components.setup_logging
+from components.plugin_paths import PLUGIN_DIR
+
+logger = logging.getLogger(__name__)
+
+# Path of the file caching the hook startup settings (relative to the plugin folder)
+HOOK_STARTUP_CACHE_PATH = "hook_startup_cache.json"
+
+# The source tree the hook startup settings are derived from (the user config, its defaults, how the templates map to the hook input fields),
+# which also holds the code run by the renamer daemon. The cached settings and a running daemon are only used while none of its files changed
+SOURCE_DIR = PLUGIN_DIR / "src"
+
+
+class HookStartupSettings(NamedTuple):
+    """
+    The settings a hook needs to skip an updated scene, cached so that the hook does not validate the config (and import most of the renamer) to skip it
+    """
+
+    skip_unchanged_scenes: bool
+    # fields of the Scene.Update hook input that can change the new file path of a scene
+    file_path_input_fields: frozenset[str]
+    scene_fingerprints_path: str
+    config_hash: str
+    # the scene fingerprints are read from the stash db
+    stash_db_path: str
+    # with the {mode} placeholder of PROCESSING_CONFIG.RUN_METRICS_PATH
+    run_metrics_path: Optional[str]
+    # None if the hooks are not forwarded to the renamer daemon
+    daemon_socket_path: Optional[str]
+    # None if the hooks are not coalesced
+    hook_spool_path: Optional[str]
+
+
+def hash_source_files() -> str:
+    """
+    Hashes the path, size and modification time of each Python file of the source tree, which only takes a stat call per file
+    """
+
+    source_hash = hashlib.sha256()
+
+    for dir_path, dir_names, file_names in os.walk(SOURCE_DIR):
+        # walked in the same order on every call
+        dir_names[:] = sorted(
+            dir_name for dir_name in dir_names if dir_name != "__pycache__"
+        )
+
+        for file_name in sorted(file_names):
+            if not file_name.endswith(".py"):
+                continue
+
+            file_path = os.path.join(dir_path, file_name)
+
+            try:
+                file_stat = os.stat(file_path)
+            except FileNotFoundError:
+                continue
+
+            source_hash.update(
+                f"{file_path}\0{file_stat.st_size}\0{file_stat.st_mtime_ns}\n".encode(
+                    "utf-8"
+                )
+            )
+
+    return source_hash.hexdigest()
+
+
+def load_hook_startup_settings(cache_path: str) -> Optional[HookStartupSettings]:
+    """
+    Returns the cached settings, or None if they are not cached or were cached before one of the source files changed
+    """
+
+    try:
+        with open(cache_path, encoding="utf-8") as cache_file:
+            cache = json.load(cache_file)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError):
+        logger.warning("Ignoring invalid hook startup cache %s", cache_path)
+        return None
+
+    if cache.get("source_hash") != hash_source_files():
+        return None
+
+    try:
+        settings = cache["settings"]
+
+        return HookStartupSettings(
+            skip_unchanged_scenes=settings["skip_unchanged_scenes"],
+            file_path_input_fields=frozenset(settings["file_path_input_fields"]),
+            scene_fingerprints_path=settings["scene_fingerprints_path"],
+            config_hash=settings["config_hash"],
+            stash_db_path=settings["stash_db_path"],
+            run_metrics_path=settings["run_metrics_path"],
+            daemon_socket_path=settings["daemon_socket_path"],
+            hook_spool_path=settings["hook_spool_path"],
+        )
+    except (KeyError, TypeError):
+        logger.warning("Ignoring invalid hook startup cache %s", cache_path)
+        return None
+
+
+def save_hook_startup_settings(cache_path: str, settings: HookStartupSettings):
+    cache = {
+        "source_hash": hash_source_files(),
+        "settings": {
+            **settings._asdict(),
+            "file_path_input_fields": sorted(settings.file_path_input_fields),
+        },
+    }
+
+    tmp_path = f"{cache_path}.tmp"
+
+    with open(tmp_path, "w", encoding="utf-8") as cache_file:
+        json.dump(cache, cache_file, indent=2)
+
+    os.replace(tmp_path, cache_path)
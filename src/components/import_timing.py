@@ -0,0 +1,45 @@
+import builtins
+import os
+import sys
+import time
+
+# Set to 1 to record the time spent importing each module, reported with the run metrics (as "import.<module>" timers)
+IMPORT_TIMING_ENV_VAR = "RENAMER_IMPORT_TIMING"
+
+_import_durations: dict[str, float] = {}
+_builtin_import = builtins.__import__
+
+
+def is_import_timing_enabled() -> bool:
+    return os.environ.get(IMPORT_TIMING_ENV_VAR, "") not in ("", "0")
+
+
+def enable_import_timing():
+    builtins.__import__ = _timed_import
+
+
+def drain_import_durations() -> dict[str, list[float]]:
+    """
+    Returns the time spent on the first import of each module, including the modules it imports, and starts recording from scratch
+    """
+
+    durations = {
+        f"import.{module_name}": [seconds]
+        for module_name, seconds in _import_durations.items()
+    }
+    _import_durations.clear()
+
+    return durations
+
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    # only the first import of a module loads it, the relative imports are resolved (and timed) by the import of the package
+    if level or name in sys.modules:
+        return _builtin_import(name, globals, locals, fromlist, level)
+
+    start = time.perf_counter()
+
+    try:
+        return _builtin_import(name, globals, locals, fromlist, level)
+    finally:
+        _import_durations.setdefault(name, time.perf_counter() - start)
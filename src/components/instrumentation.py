@@ -0,0 +1,292 @@
+from __future__ import annotations
+
+import contextlib
+import json
+import logging
+import math
+import os
+import random
+import threading
+import time
+from typing import Iterator, Optional
+
+import components.setup_logging
+
+logger = logging.getLogger(__name__)
+
+# Number of durations sampled per timer to estimate its percentiles
+RESERVOIR_SIZE = 1024
+
+# (count, total seconds, max seconds, sampled durations) of a timer
+TimerRecord = tuple[int, float, float, list[float]]
+
+# (record of each timer, value of each counter), sent from the planner processes and the renamer daemon
+RunMetricsRecords = tuple[dict[str, TimerRecord], dict[str, int]]
+
+
+class TimerStats:
+    """
+    The count, total and max of the durations of a timer, along with a uniform sample of at most RESERVOIR_SIZE durations
+    (reservoir sampling) to estimate the p50 and p99, so a timer takes the same memory however many times it is called
+    """
+
+    __slots__ = ("count", "total", "max", "samples")
+
+    def __init__(
+        self,
+        count: int = 0,
+        total: float = 0,
+        max: float = 0,
+        samples: Optional[list[float]] = None,
+    ):
+        self.count = count
+        self.total = total
+        self.max = max
+        self.samples = samples if samples is not None else []
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+
+        if seconds > self.max:
+            self.max = seconds
+
+        if len(self.samples) < RESERVOIR_SIZE:
+            self.samples.append(seconds)
+        elif (index := random.randrange(self.count)) < RESERVOIR_SIZE:
+            self.samples[index] = seconds
+
+    def merge(self, other: TimerStats):
+        count = self.count + other.count
+
+        if len(self.samples) + len(other.samples) > RESERVOIR_SIZE:
+            # each sample stands for count / len(samples) durations, so the samples are kept in proportion to the counts
+            self_sample_size = min(
+                round(RESERVOIR_SIZE * self.count / count), len(self.samples)
+            )
+            other_sample_size = min(
+                RESERVOIR_SIZE - self_sample_size, len(other.samples)
+            )
+
+            self.samples = random.sample(self.samples, self_sample_size) + (
+                random.sample(other.samples, other_sample_size)
+            )
+        else:
+            self.samples = self.samples + other.samples
+
+        self.count = count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def to_record(self) -> TimerRecord:
+        return (self.count, self.total, self.max, self.samples)
+
+    @classmethod
+    def from_record(cls, record: TimerRecord) -> TimerStats:
+        # the records sent as JSON (eg. by the renamer daemon) are lists
+        count, total, max, samples = record
+
+        return cls(count, total, max, list(samples))
+
+    def summary(self) -> dict:
+        sorted_samples = sorted(self.samples)
+
+        return {
+            "count": self.count,
+            "total_seconds": round(self.total, 6),
+            "p50_seconds": round(percentile(sorted_samples, 50), 6),
+            "p99_seconds": round(percentile(sorted_samples, 99), 6),
+            "max_seconds": round(self.max, 6),
+        }
+
+
+class RunMetricsShard:
+    "The timers and counters recorded by one thread, only locked against the rare reads from the other threads"
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timers: dict[str, TimerStats] = {}
+        self.counters: dict[str, int] = {}
+
+
+class RunMetrics:
+    """
+    Timers and counters of a run, recorded from the pipeline threads
+
+    - timers keep the count, total and max of their durations, and a bounded sample of them to report the p50 and p99 (eg. the time spent planning each file)
+    - counters are incremented by any amount (eg. bytes fetched from the GraphQL API, rows written to the stash db)
+
+    Each thread records to a shard of its own, so the threads do not wait for each other. The shards are combined when the metrics are read
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+
+        self._local = threading.local()
+        self._shards_lock = threading.Lock()
+        self._shards: list[RunMetricsShard] = []
+
+    def _get_shard(self) -> RunMetricsShard:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = RunMetricsShard()
+
+            with self._shards_lock:
+                self._shards.append(shard)
+
+            return shard
+
+    @contextlib.contextmanager
+    def time(self, timer_name: str) -> Iterator[None]:
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.record(timer_name, time.perf_counter() - start)
+
+    def record(self, timer_name: str, seconds: float):
+        shard = self._get_shard()
+
+        with shard.lock:
+            if (timer := shard.timers.get(timer_name)) is None:
+                timer = shard.timers[timer_name] = TimerStats()
+
+            timer.add(seconds)
+
+    def count(self, counter_name: str, amount: int = 1):
+        shard = self._get_shard()
+
+        with shard.lock:
+            shard.counters[counter_name] = shard.counters.get(counter_name, 0) + amount
+
+    def _combine_shards(
+        self, clear: bool
+    ) -> tuple[dict[str, TimerStats], dict[str, int]]:
+        timers: dict[str, TimerStats] = {}
+        counters: dict[str, int] = {}
+
+        with self._shards_lock:
+            for shard in self._shards:
+                with shard.lock:
+                    for timer_name, timer in shard.timers.items():
+                        if timer_name in timers:
+                            timers[timer_name].merge(timer)
+                        else:
+                            timers[timer_name] = TimerStats.from_record(
+                                timer.to_record()
+                            )
+
+                    for counter_name, amount in shard.counters.items():
+                        counters[counter_name] = counters.get(counter_name, 0) + amount
+
+                    if clear:
+                        shard.timers = {}
+                        shard.counters = {}
+
+        return timers, counters
+
+    def drain(self) -> RunMetricsRecords:
+        "Returns the recorded timers and counters, and starts recording from scratch"
+
+        timers, counters = self._combine_shards(clear=True)
+
+        return (
+            {timer_name: timer.to_record() for timer_name, timer in timers.items()},
+            counters,
+        )
+
+    def merge(self, records: RunMetricsRecords):
+        "Adds the timers and counters recorded elsewhere (eg. by a planner process)"
+
+        timers, counters = records
+        shard = self._get_shard()
+
+        with shard.lock:
+            for timer_name, timer_record in timers.items():
+                timer = TimerStats.from_record(timer_record)
+
+                if timer_name in shard.timers:
+                    shard.timers[timer_name].merge(timer)
+                else:
+                    shard.timers[timer_name] = timer
+
+            for counter_name, amount in counters.items():
+                shard.counters[counter_name] = (
+                    shard.counters.get(counter_name, 0) + amount
+                )
+
+    def summary(self) -> dict:
+        timers, counters = self._combine_shards(clear=False)
+
+        return {
+            "started_at": self.started_at,
+            "duration_seconds": round(time.perf_counter() - self._start, 6),
+            "timers": {
+                timer_name: timer.summary() for timer_name, timer in timers.items()
+            },
+            "counters": counters,
+        }
+
+
+def percentile(sorted_values: list[float], percent: float) -> float:
+    "Nearest-rank percentile of the sorted values"
+
+    if not sorted_values:
+        return 0
+
+    rank = math.ceil(percent / 100 * len(sorted_values))
+
+    return sorted_values[max(rank, 1) - 1]
+
+
+_run_metrics = RunMetrics()
+
+
+def get_run_metrics() -> RunMetrics:
+    return _run_metrics
+
+
+def reset_run_metrics() -> RunMetrics:
+    "Starts recording the metrics of a new run"
+
+    global _run_metrics
+    _run_metrics = RunMetrics()
+
+    return _run_metrics
+
+
+def report_run_metrics(metrics_path: Optional[str] = None) -> dict:
+    """
+    Logs a summary of the run metrics, and writes them as JSON to `metrics_path` if it is set
+    """
+
+    summary = get_run_metrics().summary()
+
+    logger.info("Run finished in %.3fs", summary["duration_seconds"])
+
+    for timer_name, timer in sorted(summary["timers"].items()):
+        logger.info(
+            "[METRICS] %s: %d calls, %.3fs total, p50 %.6fs, p99 %.6fs, max %.6fs",
+            timer_name,
+            timer["count"],
+            timer["total_seconds"],
+            timer["p50_seconds"],
+            timer["p99_seconds"],
+            timer["max_seconds"],
+        )
+
+    for counter_name, value in sorted(summary["counters"].items()):
+        logger.info("[METRICS] %s: %d", counter_name, value)
+
+    if metrics_path is not None:
+        tmp_path = f"{metrics_path}.tmp"
+
+        with open(tmp_path, "w", encoding="utf-8") as metrics_file:
+            json.dump(summary, metrics_file, indent=2)
+
+        os.replace(tmp_path, metrics_path)
+
+    return summary
@@ -21,9 +21,9 @@ def apply_performers_order_by(
     performers: list[ScenePerformer], order_by: Optional[str]
 ):
     if not order_by:
-        return sorted(performers, key=lambda performer: performer.dict()["id"])
+        return sorted(performers, key=lambda performer: performer.id)
 
-    return sorted(performers, key=lambda performer: performer.dict()[order_by])
+    return sorted(performers, key=lambda performer: getattr(performer, order_by))
 
 
 def apply_performers_limit(performers: list[ScenePerformer], limit: Optional[int]):
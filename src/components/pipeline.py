@@ -0,0 +1,115 @@
+import logging
+import queue
+import threading
+from typing import Any, Callable, Iterable
+
+import components.setup_logging
+
+logger = logging.getLogger(__name__)
+
+# A stage takes one item from the previous stage and returns the items (zero or more) to pass on to the next stage
+Stage = Callable[[Any], Iterable[Any]]
+
+_END_OF_STREAM = object()
+
+
+class _ConsumerStopped(Exception):
+    "Raised when putting an item into a queue whose consumer has stopped"
+
+
+def run_serially(source: Iterable[Any], stages: list[Stage]):
+    """
+    Runs every item of the source through all the stages, one item at a time, on the current thread
+    """
+
+    def run_stage(idx: int, item: Any):
+        for output in stages[idx](item):
+            if idx + 1 < len(stages):
+                run_stage(idx + 1, output)
+
+    for item in source:
+        run_stage(0, item)
+
+
+def run_pipeline(source: Iterable[Any], stages: list[Stage], queue_size: int):
+    """
+    Runs the source and each stage on its own thread, connected by bounded queues, so the stages overlap
+
+    - Items are processed by every stage in the same order as they come out of the source
+    - If a stage fails, the upstream stages are stopped, while the downstream stages finish the items they were already given
+    - The first error raised by the source or a stage is re-raised once all threads have finished
+    """
+
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+    consumer_stopped = [threading.Event() for _ in stages]
+    errors: list[BaseException] = []
+
+    def put(idx: int, item: Any):
+        while True:
+            if consumer_stopped[idx].is_set():
+                raise _ConsumerStopped
+
+            try:
+                queues[idx].put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def end_stream(idx: int):
+        try:
+            put(idx, _END_OF_STREAM)
+        except _ConsumerStopped:
+            pass
+
+    def produce():
+        try:
+            for item in source:
+                put(0, item)
+        except _ConsumerStopped:
+            pass
+        except BaseException as error:
+            logger.error("Pipeline source failed", exc_info=True)
+            errors.append(error)
+        finally:
+            end_stream(0)
+
+    def consume(idx: int):
+        has_next_stage = idx + 1 < len(stages)
+
+        try:
+            while True:
+                item = queues[idx].get()
+
+                if item is _END_OF_STREAM:
+                    break
+
+                for output in stages[idx](item):
+                    if has_next_stage:
+                        put(idx + 1, output)
+        except _ConsumerStopped:
+            pass
+        except BaseException as error:
+            logger.error("Pipeline stage %d failed", idx, exc_info=True)
+            errors.append(error)
+        finally:
+            consumer_stopped[idx].set()
+
+            if has_next_stage:
+                end_stream(idx + 1)
+
+    threads = [threading.Thread(target=produce, name="pipeline-source", daemon=True)]
+    threads += [
+        threading.Thread(
+            target=consume, args=(idx,), name=f"pipeline-stage-{idx}", daemon=True
+        )
+        for idx in range(len(stages))
+    ]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0]
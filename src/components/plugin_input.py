@@ -0,0 +1,242 @@
+import json
+from typing import Optional, TextIO
+
+# The values dropped while reading the plugin input, by path: the renamer does not use them,
+# and a cover image is a base64 data URL of several MB
+SKIPPED_PATHS = frozenset(
+    [
+        ("args", "hookContext", "input", "cover_image"),
+        ("args", "hookContext", "input", "details"),
+    ]
+)
+
+CHUNK_SIZE = 64 * 1024
+
+WHITESPACE = " \t\n\r"
+LITERAL_END = WHITESPACE + ",]}"
+
+
+def read_plugin_input(stream: TextIO, chunk_size: int = CHUNK_SIZE) -> str:
+    """
+    Reads the plugin input JSON from the stream chunk by chunk, and returns it without the values in SKIPPED_PATHS.
+    The skipped values are never held in memory as a whole, nor parsed
+
+    Returns an empty string if the stream only holds whitespace (the "Run" task without arguments)
+    """
+
+    return PluginInputScanner(stream, chunk_size).scan()
+
+
+class PluginInputScanner:
+    """
+    Copies the JSON tokens of the stream as they are, except the skipped values: the result is parsed by `json.loads`,
+    so the scanner only finds where the values end, and decodes the keys to know the path of the values
+    """
+
+    def __init__(self, stream: TextIO, chunk_size: int):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        # position of the buffer in the stream, for the error messages
+        self.offset = 0
+
+    def scan(self) -> str:
+        if not self._skip_whitespace():
+            return ""
+
+        plugin_input = self._scan_value((), keep=True)
+
+        if self._skip_whitespace():
+            self._fail("Extra data")
+
+        assert plugin_input is not None
+        return plugin_input
+
+    def _read_chunk(self) -> bool:
+        "Reads the next chunk, dropping what was scanned. Returns False at the end of the stream"
+
+        chunk = self.stream.read(self.chunk_size)
+
+        if not chunk:
+            return False
+
+        self.offset += self.pos
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+
+        return True
+
+    def _fail(self, message: str):
+        raise ValueError(
+            f"Invalid plugin input: {message} at position {self.offset + self.pos}"
+        )
+
+    def _skip_whitespace(self) -> bool:
+        "Returns False at the end of the stream"
+
+        while True:
+            while self.pos < len(self.buffer):
+                if self.buffer[self.pos] not in WHITESPACE:
+                    return True
+                self.pos += 1
+
+            if not self._read_chunk():
+                return False
+
+    def _next_char(self) -> str:
+        if not self._skip_whitespace():
+            self._fail("Unexpected end of input")
+
+        return self.buffer[self.pos]
+
+    def _expect(self, char: str):
+        if self._next_char() != char:
+            self._fail(f"Expecting '{char}'")
+
+        self.pos += 1
+
+    def _scan_value(self, path: tuple[str, ...], keep: bool) -> Optional[str]:
+        char = self._next_char()
+
+        if char == "{":
+            return self._scan_object(path, keep)
+        if char == "[":
+            return self._scan_array(path, keep)
+        if char == '"':
+            return self._scan_string(keep)
+
+        return self._scan_literal(keep)
+
+    def _scan_object(self, path: tuple[str, ...], keep: bool) -> Optional[str]:
+        self.pos += 1
+        members: list[str] = []
+
+        if self._next_char() == "}":
+            self.pos += 1
+            return "{}" if keep else None
+
+        while True:
+            if self._next_char() != '"':
+                self._fail("Expecting property name enclosed in double quotes")
+
+            key = self._scan_string(keep=True)
+            assert key is not None
+            self._expect(":")
+
+            # the keys are decoded like json.loads would, eg. with escaped characters
+            member_path = (*path, json.loads(key))
+            keep_member = keep and member_path not in SKIPPED_PATHS
+            value = self._scan_value(member_path, keep_member)
+
+            if keep_member:
+                members.append(f"{key}:{value}")
+
+            char = self._next_char()
+            self.pos += 1
+
+            if char == "}":
+                break
+            if char != ",":
+                self.pos -= 1
+                self._fail("Expecting ',' delimiter")
+
+        return "{" + ",".join(members) + "}" if keep else None
+
+    def _scan_array(self, path: tuple[str, ...], keep: bool) -> Optional[str]:
+        self.pos += 1
+        items: list[str] = []
+
+        if self._next_char() == "]":
+            self.pos += 1
+            return "[]" if keep else None
+
+        while True:
+            value = self._scan_value(path, keep)
+
+            if keep:
+                assert value is not None
+                items.append(value)
+
+            char = self._next_char()
+            self.pos += 1
+
+            if char == "]":
+                break
+            if char != ",":
+                self.pos -= 1
+                self._fail("Expecting ',' delimiter")
+
+        return "[" + ",".join(items) + "]" if keep else None
+
+    def _scan_string(self, keep: bool) -> Optional[str]:
+        pieces: list[str] = []
+        start = self.pos
+        # where to look for the closing quote: after the opening quote, then after an escaped quote
+        search_pos = self.pos + 1
+        # the backslashes before a quote are counted back to this position: what was dropped before is not a backslash
+        escape_pos = search_pos
+
+        while True:
+            end = self.buffer.find('"', search_pos)
+
+            if end == -1:
+                # the backslashes at the end of the buffer may escape a quote of the next chunk, so they are kept in the buffer
+                cut = len(self.buffer)
+                while cut > escape_pos and self.buffer[cut - 1] == "\\":
+                    cut -= 1
+
+                if keep:
+                    pieces.append(self.buffer[start:cut])
+
+                self.pos = cut
+                if not self._read_chunk():
+                    self._fail("Unterminated string")
+
+                start = search_pos = escape_pos = 0
+                continue
+
+            backslashes = 0
+            while (
+                end - backslashes > escape_pos
+                and self.buffer[end - backslashes - 1] == "\\"
+            ):
+                backslashes += 1
+
+            if backslashes % 2 == 1:
+                search_pos = end + 1
+                continue
+
+            self.pos = end + 1
+
+            if not keep:
+                return None
+
+            pieces.append(self.buffer[start : self.pos])
+            return "".join(pieces)
+
+    def _scan_literal(self, keep: bool) -> Optional[str]:
+        "Scans a number, true, false or null (validated by json.loads)"
+
+        pieces: list[str] = []
+
+        while True:
+            start = self.pos
+
+            while (
+                self.pos < len(self.buffer) and self.buffer[self.pos] not in LITERAL_END
+            ):
+                self.pos += 1
+
+            pieces.append(self.buffer[start : self.pos])
+
+            # the literal ends with the buffer, or goes on in the next chunk
+            if self.pos < len(self.buffer) or not self._read_chunk():
+                break
+
+        literal = "".join(pieces)
+
+        if not literal:
+            self._fail("Expecting value")
+
+        return literal if keep else None
@@ -0,0 +1,9 @@
+from pathlib import Path
+
+PLUGIN_DIR = Path(__file__).resolve().parent.parent.parent
+
+
+def resolve_plugin_path(path: str) -> str:
+    "Relative paths in the config are relative to the plugin folder"
+
+    return str(PLUGIN_DIR / path)
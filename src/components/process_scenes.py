@@ -1,18 +1,41 @@
+import collections
 import datetime
 import json
 import logging
+import multiprocessing
 import os
 import re
+import sqlite3
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Iterable, Iterator, NamedTuple, Optional
 
 import pathvalidate
 
+from components.destination_index import DestinationIndex
 from components.fill_template import fill_template_file_dir, fill_template_file_name
-from components.find_matching_template import find_matching_template
-from components.stash_db import StashDB
+from components.find_matching_template import (
+    TemplateMatchers,
+    compile_template_matchers,
+    find_matching_template,
+)
+from components.instrumentation import RunMetricsRecords, get_run_metrics
+from components.pipeline import Stage, run_pipeline, run_serially
+from components.rename_plan import RenamePlanWriter, read_rename_plan
+from components.stash_db import StashDB, StashDBCommitError
 from components.stash_logger import StashLogger, get_stash_logger
-from models.config import Config, FileNameConfig, PerformersConfig, get_config
+from components.studio_helpers import StudioRegistry, as_studio_registry
+from models.compact_scene import CompactScene, CompactSceneFile, as_compact_scene
+from models.config import (
+    Config,
+    FileNameConfig,
+    PerformersConfig,
+    ProcessingConfig,
+    StashDBConfig,
+    get_config,
+)
+from models.rename_plan import PlannedRename
 from models.scene import Scene, SceneFile, ScenePerformer
 from models.studio import Studio
 
@@ -22,115 +45,630 @@ stash_logger = get_stash_logger()
 OS_PATH_SEPARATOR = os.path.sep
 
 
-def process_scenes(scenes: list[Scene], studios: list[Studio]):
+def process_scenes(
+    scenes: Iterable[Scene | CompactScene],
+    studios: list[Studio] | StudioRegistry,
+    scene_count: Optional[int] = None,
+    plan_path: Optional[str] = None,
+    template_matchers: Optional[TemplateMatchers] = None,
+    single_transaction: bool = False,
+) -> set[str]:
     """
-    Renames files based on the scene, studio and config information
+    Renames files based on the scene, studio and config information. Returns the ids of the scenes whose files were all renamed
+    (or did not need to be renamed), none when writing a plan
+
+    `scenes` can be a lazy iterable (eg. pages streamed from the GraphQL API), in which case `scene_count` is used to report progress
+
+    Each file goes through 3 stages: plan (match templates and generate the new path), move (rename on disk) and commit (update the stash db).
+    With PROCESSING_CONFIG.PIPELINE_ENABLED, the stages run concurrently on their own threads connected by bounded queues.
+    With PROCESSING_CONFIG.PLANNER_WORKERS > 1, the new file paths are planned ahead on a pool of processes.
+
+    If `plan_path` is set, the files are only planned and the renames are written to a rename plan file, to be executed later by `apply_rename_plan`
+
+    `template_matchers` are the templates compiled for the same studios, eg. kept between hooks by the renamer daemon
+
+    With `single_transaction`, all the renames are committed to the stash db in one transaction, whatever STASH_DB_CONFIG.COMMIT_BATCH_SIZE is
     """
 
     config = get_config()
+    processing_config = config.PROCESSING_CONFIG or ProcessingConfig()
+
+    # index the studios and compile the template filters once for the whole run
+    studios = as_studio_registry(studios)
+    if template_matchers is None:
+        template_matchers = compile_template_matchers(config, studios)
+
+    if scene_count is None:
+        scene_count = len(scenes)
 
-    stash_db = StashDB(config.STASH_SQLITE_DATABASE_PATH, config.DRYRUN_ENABLED)
+    # the scenes from the GraphQL API are already compact, the pydantic scenes are converted once so that the derived fields are computed once per scene
+    scenes = map(as_compact_scene, scenes)
 
     stash_logger.progress(0)
 
-    for idx, scene in enumerate(scenes):
-        stash_logger.progress((idx + 1) / len(scenes))
+    plan_writer = RenamePlanWriter(plan_path) if plan_path is not None else None
+
+    # Files are moved on another thread in the pipeline (or not at all in a dry run or when writing a plan), so a file planned earlier in the run may not be at its new path yet.
+    # The index treats the planned paths as taken and the old paths as free, so that two files are never planned to the same path
+    destination_index = DestinationIndex()
+
+    processed_scene_count = 0
+
+    # the scenes that were planned, and the scenes with a file that failed to be moved or committed (by file id)
+    processed_scene_ids: set[str] = set()
+    failed_scene_ids: set[str] = set()
+    scene_ids_by_file_id: dict[str, str] = {}
+
+    def report_progress(scene: CompactScene):
+        nonlocal processed_scene_count
+        processed_scene_count += 1
+        processed_scene_ids.add(scene.id)
+        get_run_metrics().count("scenes.processed")
+
+        # scenes added while streaming can push the count past the initial total
+        stash_logger.progress(min(processed_scene_count / max(scene_count, 1), 1))
+
+    # when each planned file started being processed, to record the time it took to go through all the stages
+    file_started_at: dict[str, float] = {}
+
+    def planned_rename(
+        scene: CompactScene,
+        file: CompactSceneFile,
+        new_file_path: str,
+        started_at: float,
+    ) -> list[tuple[CompactSceneFile, str]]:
+        destination_index.reserve(new_file_path)
+        destination_index.release(file.path)
+
+        get_run_metrics().count("files.planned")
+
+        if plan_writer is None:
+            file_started_at[file.id] = started_at
+            scene_ids_by_file_id[file.id] = scene.id
+            return [(file, new_file_path)]
+
+        plan_writer.write(
+            PlannedRename(
+                scene_id=scene.id,
+                file_id=file.id,
+                parent_folder_id=file.parent_folder_id,
+                src=file.path,
+                dst=new_file_path,
+            )
+        )
+        get_run_metrics().record("file.total", time.perf_counter() - started_at)
+        return []
+
+    def plan_stage(scene: CompactScene):
+        started_at = time.perf_counter()
+        report_progress(scene)
+
+        for file, new_file_path in plan_scene_renames(
+            scene,
+            studios,
+            config,
+            template_matchers,
+            destination_index.contains,
+        ):
+            yield from planned_rename(scene, file, new_file_path, started_at)
+
+    # The planner processes only check the files on disk, they do not know about the renames planned earlier in the run.
+    # Files whose checked paths were changed by an earlier rename are planned again, so the new paths are the same as when planning on one process
+    renamed_paths: set[str] = set()
+
+    def parallel_plan_stage(planned_scene: tuple[CompactScene, list[PlannedFile]]):
+        scene, planned_files = planned_scene
+        started_at = time.perf_counter()
+        report_progress(scene)
+
+        for file, new_file_path, probed_paths in planned_files:
+            if not renamed_paths.isdisjoint(probed_paths):
+                logger.debug("Planning file again: '%s'", file.path)
+                get_run_metrics().count("plan.replanned_files")
+
+                with get_run_metrics().time("plan.file"):
+                    new_file_path = plan_file_rename(
+                        scene,
+                        file,
+                        studios,
+                        config,
+                        template_matchers,
+                        destination_index.contains,
+                    )
 
-        logger.info(f"--- Processing scene: (scene_id={scene.id}) {scene.title} ---")
-        stash_logger.info(
-            f"Change Processing scene: (scene_id={scene.id}) {scene.title}"
+            if new_file_path is None:
+                continue
+
+            renamed_paths.update((file.path, new_file_path))
+
+            yield from planned_rename(scene, file, new_file_path, started_at)
+
+    stages: list[Stage] = [plan_stage]
+    source: Iterable = scenes
+
+    if processing_config.PLANNER_WORKERS > 1:
+        stages[0] = parallel_plan_stage
+        source = plan_scenes_in_parallel(
+            scenes,
+            studios,
+            config,
+            workers=processing_config.PLANNER_WORKERS,
+            chunk_size=processing_config.PLANNER_CHUNK_SIZE,
         )
 
-        # Filter scenes without files
-        if not scene.files:
-            logger.info(f"[Skipping Scene] No files found for scene")
-            stash_logger.info("[Skipping Scene] No files found for scene")
-            continue
+    if plan_writer is not None:
+        try:
+            run_stages(source, stages, processing_config)
+        except BaseException:
+            plan_writer.discard()
+            raise
 
-        for file in scene.files:
-            logger.info("Processing src file: '%s'", file.path)
-            stash_logger.info(
-                f"Processing src file: '{file.path}'",
-            )
+        plan_writer.close()
+        return set()
 
-            # Filter scenes without a matching file name template
-            logger.debug("File Name Template - Searching for match...")
-            file_name_template = find_matching_template(
-                scene=scene,
-                studios=studios,
-                file=file,
-                template_configs=config.FILE_NAME_CONFIG.FILE_NAME_TEMPLATES,
-            )
+    stash_db = create_stash_db(config, single_transaction)
 
-            if file_name_template:
-                logger.debug(
-                    "File Name Template Found: '%s'",
-                    file_name_template,
-                )
-            else:
-                logger.info(f"[Skipping File] File Name Template Not Found")
-                stash_logger.info(f"[Skipping File] File Name Template Not Found")
-                continue
+    def move_stage(planned_rename: tuple[CompactSceneFile, str]):
+        moved_renames = move_file(planned_rename)
 
-            # Filter scenes without a matching file dir template
-            logger.debug("File Dir Template - Searching for match...")
-            file_dir_template = find_matching_template(
-                scene=scene,
-                studios=studios,
-                file=file,
-                template_configs=config.FILE_DIR_CONFIG.FILE_DIR_TEMPLATES,
+        if not moved_renames:
+            file, _ = planned_rename
+            failed_scene_ids.add(scene_ids_by_file_id[file.id])
+
+        return moved_renames
+
+    def commit_stage(planned_rename: tuple[CompactSceneFile, str]):
+        committed_renames = commit_file_rename(planned_rename, stash_db, config)
+
+        file, _ = planned_rename
+        started_at = file_started_at.pop(file.id, None)
+
+        if not committed_renames:
+            failed_scene_ids.add(scene_ids_by_file_id[file.id])
+        elif started_at is not None:
+            get_run_metrics().record("file.total", time.perf_counter() - started_at)
+
+        return committed_renames
+
+    stages += [move_stage, commit_stage]
+
+    try:
+        run_stages(source, stages, processing_config)
+    finally:
+        close_stash_db(stash_db)
+
+    # the files renamed in a rolled back transaction were moved back
+    for file, _ in stash_db.rolled_back_renames:
+        failed_scene_ids.add(scene_ids_by_file_id[file.id])
+
+    return processed_scene_ids - failed_scene_ids
+
+
+def apply_rename_plan(plan_path: str):
+    """
+    Moves the files and updates the stash db as planned in a rename plan file, without matching or filling any template
+
+    Files that are no longer at their planned source path, or whose planned destination is taken, are skipped
+    """
+
+    config = get_config()
+    processing_config = config.PROCESSING_CONFIG or ProcessingConfig()
+
+    planned_renames = list(read_rename_plan(plan_path))
+    logger.info(
+        "Applying %d planned renames from '%s'", len(planned_renames), plan_path
+    )
+
+    stash_logger.progress(0)
+
+    applied_rename_count = 0
+
+    def move_stage(planned_rename: PlannedRename):
+        nonlocal applied_rename_count
+        applied_rename_count += 1
+
+        stash_logger.progress(applied_rename_count / max(len(planned_renames), 1))
+
+        return move_file((planned_rename, planned_rename.dst))
+
+    stash_db = create_stash_db(config)
+
+    def commit_stage(planned_rename: tuple[PlannedRename, str]):
+        return commit_file_rename(planned_rename, stash_db, config)
+
+    try:
+        run_stages(planned_renames, [move_stage, commit_stage], processing_config)
+    finally:
+        close_stash_db(stash_db)
+
+
+def run_stages(
+    source: Iterable, stages: list[Stage], processing_config: ProcessingConfig
+):
+    if processing_config.PIPELINE_ENABLED:
+        # the items are pulled from the source (eg. the paginated GraphQL API) on a thread of their own
+        run_pipeline(source, stages, queue_size=processing_config.PIPELINE_QUEUE_SIZE)
+    else:
+        run_serially(source, stages)
+
+
+def create_stash_db(config: Config, single_transaction: bool = False) -> StashDB:
+    stash_db_config = config.STASH_DB_CONFIG or StashDBConfig()
+
+    return StashDB(
+        config.STASH_SQLITE_DATABASE_PATH,
+        config.DRYRUN_ENABLED,
+        commit_batch_size=(
+            None if single_transaction else stash_db_config.COMMIT_BATCH_SIZE
+        ),
+        busy_timeout=stash_db_config.BUSY_TIMEOUT,
+        preload_folders=stash_db_config.PRELOAD_FOLDERS,
+    )
+
+
+def close_stash_db(stash_db: StashDB):
+    # commit the last transaction, even if the run was stopped by an error, since its files have already been moved
+    try:
+        stash_db.commit()
+    except StashDBCommitError as error:
+        rollback_file_renames(error.renames)
+    finally:
+        stash_db.close()
+
+
+def plan_scene_renames(
+    scene: CompactScene,
+    studios: StudioRegistry,
+    config: Config,
+    template_matchers: TemplateMatchers,
+    path_exists: Optional[Callable[[str], bool]] = None,
+) -> Iterator[tuple[CompactSceneFile, str]]:
+    """
+    Yields the scene's files that need to be renamed, along with their new file path
+    """
+
+    if not log_processing_scene(scene):
+        return
+
+    for file in scene.files:
+        with get_run_metrics().time("plan.file"):
+            new_file_path = plan_file_rename(
+                scene, file, studios, config, template_matchers, path_exists
             )
 
-            if file_dir_template:
-                logger.debug("File Dir Template Found: '%s'", file_dir_template)
-            else:
-                logger.info(f"[Skipping File] File Dir Template Not Found")
-                stash_logger.info(f"[Skipping File] File Dir Template Not Found")
-                continue
+        if new_file_path is not None:
+            yield file, new_file_path
 
-            try:
-                new_file_path = create_new_file_path(
-                    scene, studios, file, config, file_name_template, file_dir_template
-                )
-            except FileExistsError as error:
-                logger.info("[Skipping File] No changes to file path (in Stash DB)")
-                stash_logger.info(
-                    "[Skipping File] No changes to file path (in Stash DB)"
-                )
-                continue
-            except FilePathTooLongError as error:
-                logger.error(
-                    "[Skipping File] New file path generated from templates is too long and could not be shortened: %s",
-                    error.path,
-                )
-                stash_logger.error(
-                    f"[Skipping File] New file path generated from templates is too long and could not be shortened: {error.path}",
-                )
-                continue
 
-            try:
-                rename(file.path, new_file_path)
-            except Exception as error:
-                logger.error("Failed to rename file: %s", file.path, exc_info=True)
-                stash_logger.error(f'Failed to rename file: "{file.path}"')
+def log_processing_scene(scene: CompactScene) -> bool:
+    """
+    Returns False if the scene has no files to process
+    """
+
+    logger.info(f"--- Processing scene: (scene_id={scene.id}) {scene.title} ---")
+    stash_logger.info(f"Change Processing scene: (scene_id={scene.id}) {scene.title}")
+
+    # Filter scenes without files
+    if not scene.files:
+        logger.info(f"[Skipping Scene] No files found for scene")
+        stash_logger.info("[Skipping Scene] No files found for scene")
+        return False
+
+    return True
+
+
+def plan_file_rename(
+    scene: CompactScene,
+    file: CompactSceneFile,
+    studios: StudioRegistry,
+    config: Config,
+    template_matchers: TemplateMatchers,
+    path_exists: Optional[Callable[[str], bool]] = None,
+) -> Optional[str]:
+    """
+    Returns the new file path of the file, or None if the file should not be renamed
+    """
+
+    logger.info("Processing src file: '%s'", file.path)
+    stash_logger.info(
+        f"Processing src file: '{file.path}'",
+    )
+
+    # Filter scenes without a matching file name template
+    logger.debug("File Name Template - Searching for match...")
+    with get_run_metrics().time("plan.match_file_name_template"):
+        file_name_template = find_matching_template(
+            scene=scene,
+            file=file,
+            template_matchers=template_matchers.file_name,
+        )
+
+    if file_name_template:
+        logger.debug(
+            "File Name Template Found: '%s'",
+            file_name_template,
+        )
+    else:
+        logger.info(f"[Skipping File] File Name Template Not Found")
+        stash_logger.info(f"[Skipping File] File Name Template Not Found")
+        return None
+
+    # Filter scenes without a matching file dir template
+    logger.debug("File Dir Template - Searching for match...")
+    with get_run_metrics().time("plan.match_file_dir_template"):
+        file_dir_template = find_matching_template(
+            scene=scene,
+            file=file,
+            template_matchers=template_matchers.file_dir,
+        )
+
+    if file_dir_template:
+        logger.debug("File Dir Template Found: '%s'", file_dir_template)
+    else:
+        logger.info(f"[Skipping File] File Dir Template Not Found")
+        stash_logger.info(f"[Skipping File] File Dir Template Not Found")
+        return None
+
+    try:
+        return create_new_file_path(
+            scene,
+            studios,
+            file,
+            config,
+            file_name_template,
+            file_dir_template,
+            path_exists,
+        )
+    except FileExistsError as error:
+        logger.info("[Skipping File] No changes to file path (in Stash DB)")
+        stash_logger.info("[Skipping File] No changes to file path (in Stash DB)")
+        return None
+    except FilePathTooLongError as error:
+        logger.error(
+            "[Skipping File] New file path generated from templates is too long and could not be shortened: %s",
+            error.path,
+        )
+        stash_logger.error(
+            f"[Skipping File] New file path generated from templates is too long and could not be shortened: {error.path}",
+        )
+        return None
+
+
+class PlannedFile(NamedTuple):
+    file: CompactSceneFile
+    # None if the file should not be renamed
+    new_file_path: Optional[str]
+    # the paths that were checked for an existing file while planning the new file path
+    probed_paths: frozenset[str]
+
+
+def plan_scene_files(
+    scene: CompactScene,
+    studios: StudioRegistry,
+    config: Config,
+    template_matchers: TemplateMatchers,
+    destination_index: DestinationIndex,
+) -> list[PlannedFile]:
+    """
+    Plans the new file path of each of the scene's files against the files in `destination_index`, recording the paths that were checked
+    """
+
+    if not log_processing_scene(scene):
+        return []
+
+    planned_files = []
+
+    for file in scene.files:
+        probed_paths: set[str] = set()
+
+        def path_exists(path: str):
+            probed_paths.add(path)
+            return destination_index.contains(path)
+
+        new_file_path = plan_file_rename(
+            scene, file, studios, config, template_matchers, path_exists
+        )
+
+        planned_files.append(PlannedFile(file, new_file_path, frozenset(probed_paths)))
+
+    return planned_files
+
+
+# set in each planner process by init_planner_process, so the config and studios are sent to a process only once
+_planner_process_state: Optional[
+    tuple[Config, StudioRegistry, TemplateMatchers, DestinationIndex]
+] = None
+
+
+def init_planner_process(config: Config, studios: StudioRegistry):
+    global _planner_process_state
+
+    _planner_process_state = (
+        config,
+        studios,
+        compile_template_matchers(config, studios),
+        # the files on disk, the renames planned in the run are only known by the current process
+        DestinationIndex(),
+    )
+
+
+def plan_scene_chunk(
+    scenes: list[CompactScene],
+) -> tuple[list[list[PlannedFile]], RunMetricsRecords]:
+    """
+    Returns the planned files of each scene, along with the metrics recorded while planning them (to be merged into the run metrics of the main process)
+    """
+
+    assert _planner_process_state is not None
+
+    config, studios, template_matchers, destination_index = _planner_process_state
+
+    planned_scenes = [
+        plan_scene_files(scene, studios, config, template_matchers, destination_index)
+        for scene in scenes
+    ]
+
+    return planned_scenes, get_run_metrics().drain()
+
+
+def plan_scenes_in_parallel(
+    scenes: Iterable[CompactScene],
+    studios: StudioRegistry,
+    config: Config,
+    workers: int,
+    chunk_size: int,
+) -> Iterator[tuple[CompactScene, list[PlannedFile]]]:
+    """
+    Plans the scenes in chunks on a pool of processes, yields the planned scenes in the same order as the scenes
+
+    At most 2 chunks per process are planned ahead of the scene that is yielded
+    """
+
+    # The pool is started while the other pipeline stages are running on their threads: a forked process could inherit a lock
+    # held by one of them (eg. a logging handler or the run metrics), so the planner processes are spawned instead
+    executor = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_planner_process,
+        initargs=(config, studios),
+    )
+
+    pending_chunks: collections.deque[
+        tuple[
+            list[CompactScene],
+            Future[tuple[list[list[PlannedFile]], RunMetricsRecords]],
+        ]
+    ] = collections.deque()
+
+    def submit_chunk(chunk: list[CompactScene]):
+        pending_chunks.append((chunk, executor.submit(plan_scene_chunk, chunk)))
+
+    def completed_chunk():
+        chunk, future = pending_chunks.popleft()
+
+        with get_run_metrics().time("plan.wait_for_planner"):
+            planned_scenes, planner_metrics = future.result()
+
+        get_run_metrics().merge(planner_metrics)
+
+        return zip(chunk, planned_scenes)
+
+    try:
+        chunk: list[CompactScene] = []
+
+        for scene in scenes:
+            chunk.append(scene)
+
+            if len(chunk) < chunk_size:
                 continue
 
-            if not config.DRYRUN_ENABLED:
-                try:
-                    stash_db.rename(file, new_file_path)
-                except Exception as error:
-                    logger.error(
-                        "Failed to rename file in stash database: %s",
-                        file.path,
-                        exc_info=True,
-                    )
-                    stash_logger.error(
-                        f'Failed to rename file in stash database: "{file.path}"'
-                    )
+            submit_chunk(chunk)
+            chunk = []
+
+            if len(pending_chunks) >= workers * 2:
+                yield from completed_chunk()
 
-                    logger.warn("Rolling back file rename")
-                    stash_logger.warn("Rolling back file rename")
-                    rename(new_file_path, file.path)
+        if chunk:
+            submit_chunk(chunk)
+
+        while pending_chunks:
+            yield from completed_chunk()
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def move_file(
+    planned_rename: tuple[CompactSceneFile | PlannedRename, str],
+) -> list[tuple[CompactSceneFile | PlannedRename, str]]:
+    """
+    Moves the file on disk, returns the rename if it should be committed to the stash db
+    """
+
+    file, new_file_path = planned_rename
+
+    try:
+        with get_run_metrics().time("move.rename"):
+            rename(file.path, new_file_path)
+    except Exception as error:
+        logger.error("Failed to rename file: %s", file.path, exc_info=True)
+        stash_logger.error(f'Failed to rename file: "{file.path}"')
+        get_run_metrics().count("move.failed_files")
+        return []
+
+    return [planned_rename]
+
+
+def commit_file_rename(
+    planned_rename: tuple[CompactSceneFile | PlannedRename, str],
+    stash_db: StashDB,
+    config: Config,
+) -> list[tuple[CompactSceneFile | PlannedRename, str]]:
+    """
+    Updates the file path in the stash db, moves the file back if the stash db could not be updated
+    """
+
+    if config.DRYRUN_ENABLED:
+        return [planned_rename]
+
+    file, new_file_path = planned_rename
+
+    try:
+        stash_db.rename(file, new_file_path)
+    except StashDBCommitError as error:
+        # the whole transaction was rolled back, including the renames of the previous files in the transaction
+        rollback_file_renames(error.renames)
+        return []
+    except sqlite3.Error as error:
+        logger.error(
+            "Failed to rename file in stash database: %s",
+            file.path,
+            exc_info=True,
+        )
+        stash_logger.error(f'Failed to rename file in stash database: "{file.path}"')
+
+        # SQLite may have rolled back the transaction on its own (eg. SQLITE_FULL or SQLITE_IOERR), so the whole transaction is rolled back:
+        # the folders it inserted, and the renames of the previous files in the transaction along with this one
+        rollback_file_renames([*stash_db.rollback(), planned_rename])
+        return []
+    except Exception as error:
+        logger.error(
+            "Failed to rename file in stash database: %s",
+            file.path,
+            exc_info=True,
+        )
+        stash_logger.error(f'Failed to rename file in stash database: "{file.path}"')
+
+        logger.warning("Rolling back file rename")
+        stash_logger.warn("Rolling back file rename")
+        get_run_metrics().count("commit.rolled_back_files")
+        rename(new_file_path, file.path)
+        return []
+
+    return [planned_rename]
+
+
+def rollback_file_renames(renames: list[tuple[CompactSceneFile | PlannedRename, str]]):
+    """
+    Moves the files of a rolled back stash db transaction back to their original path, the last renamed file first
+    """
+
+    logger.warning("Rolling back %d file renames", len(renames))
+    stash_logger.warn(f"Rolling back {len(renames)} file renames")
+    get_run_metrics().count("commit.rolled_back_files", len(renames))
+
+    for file, new_file_path in reversed(renames):
+        try:
+            rename(new_file_path, file.path)
+        except Exception as error:
+            logger.error(
+                "Failed to roll back file rename: %s --> %s",
+                new_file_path,
+                file.path,
+                exc_info=True,
+            )
+            stash_logger.error(
+                f'Failed to roll back file rename: "{new_file_path}" --> "{file.path}"'
+            )
 
 
 class FilePathTooLongError(Exception):
@@ -144,13 +682,19 @@ class FilePathTooLongError(Exception):
 
 
 def create_new_file_path(
-    scene: Scene,
-    studios: list[Studio],
-    file: SceneFile,
+    scene: Scene | CompactScene,
+    studios: StudioRegistry,
+    file: SceneFile | CompactSceneFile,
     config: Config,
     file_name_template: str,
     file_dir_template: str,
+    path_exists: Optional[Callable[[str], bool]] = None,
 ):
+    if path_exists is None:
+        path_exists = file_exists
+
+    metrics = get_run_metrics()
+
     template_var_removal_order_iter = iter(
         config.PATH_CONFIG.TEMPLATE_VARIABLE_REMOVAL_ORDER
     )
@@ -158,21 +702,22 @@ def create_new_file_path(
     while True:
         # Part 1: Fill templates
 
-        file_name = fill_template_file_name(
-            template=file_name_template,
-            scene=scene,
-            studios=studios,
-            file=file,
-            template_variables_config=config.TEMPLATE_VARIABLES_CONFIG,
-        )
+        with metrics.time("plan.fill_template"):
+            file_name = fill_template_file_name(
+                template=file_name_template,
+                scene=scene,
+                studios=studios,
+                file=file,
+                template_variables_config=config.TEMPLATE_VARIABLES_CONFIG,
+            )
 
-        file_dir = fill_template_file_dir(
-            template=file_dir_template,
-            scene=scene,
-            studios=studios,
-            file=file,
-            template_variables_config=config.TEMPLATE_VARIABLES_CONFIG,
-        )
+            file_dir = fill_template_file_dir(
+                template=file_dir_template,
+                scene=scene,
+                studios=studios,
+                file=file,
+                template_variables_config=config.TEMPLATE_VARIABLES_CONFIG,
+            )
 
         new_file_path = str(
             (Path(file_dir) / Path(f"{file_name}.{file.extension}")).resolve()
@@ -195,17 +740,19 @@ def create_new_file_path(
             new_file_path, config.PATH_CONFIG.DUPLICATE_SUFFIX_TEMPLATE
         )
 
-        while file_exists(new_file_path):
-            logger.debug(
-                "A file already exists at generated path, adding duplicate suffix..."
-            )
+        with metrics.time("plan.probe_destination"):
+            while path_exists(new_file_path):
+                logger.debug(
+                    "A file already exists at generated path, adding duplicate suffix..."
+                )
+                metrics.count("plan.duplicate_suffixes")
 
-            new_file_path = next(generate_file_path_with_suffix)
+                new_file_path = next(generate_file_path_with_suffix)
 
-            logger.debug("Generated new file path: '%s'", new_file_path)
+                logger.debug("Generated new file path: '%s'", new_file_path)
 
-            if Path(file.path) == Path(new_file_path):
-                raise FileExistsError(f"No changes to file path: {file.path}")
+                if Path(file.path) == Path(new_file_path):
+                    raise FileExistsError(f"No changes to file path: {file.path}")
 
         # Part 3:
         # a) Check if the new file path is too long
@@ -219,6 +766,7 @@ def create_new_file_path(
             logger.debug("File path too long %s", new_file_path)
             try:
                 template_var_to_remove = next(template_var_removal_order_iter)
+                metrics.count("plan.template_variable_removals")
 
             except StopIteration:
                 raise FilePathTooLongError(new_file_path)
@@ -0,0 +1,49 @@
+import logging
+import os
+from pathlib import Path
+from typing import Iterator
+
+import components.setup_logging
+from models.rename_plan import PlannedRename
+
+logger = logging.getLogger(__name__)
+
+
+class RenamePlanWriter:
+    """
+    Writes the planned renames to a JSON Lines file, one rename per line
+
+    The renames are written to a temporary file that replaces the plan file on `close()`, so an interrupted run never leaves a partial plan behind
+    """
+
+    def __init__(self, plan_path: str):
+        self.plan_path = plan_path
+        self.tmp_plan_path = f"{plan_path}.tmp"
+        self.rename_count = 0
+
+        Path(plan_path).parent.mkdir(parents=True, exist_ok=True)
+        self.file = open(self.tmp_plan_path, "w", encoding="utf-8")
+
+    def write(self, planned_rename: PlannedRename):
+        self.file.write(planned_rename.json())
+        self.file.write("\n")
+        self.rename_count += 1
+
+    def close(self):
+        self.file.close()
+        os.replace(self.tmp_plan_path, self.plan_path)
+
+        logger.info(
+            "Wrote %d planned renames to '%s'", self.rename_count, self.plan_path
+        )
+
+    def discard(self):
+        self.file.close()
+        os.remove(self.tmp_plan_path)
+
+
+def read_rename_plan(plan_path: str) -> Iterator[PlannedRename]:
+    with open(plan_path, "r", encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                yield PlannedRename.parse_raw(line)
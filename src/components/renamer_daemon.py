@@ -0,0 +1,149 @@
+import contextlib
+import fcntl
+import json
+import logging
+import os
+import socketserver
+import threading
+import traceback
+from typing import Callable, Iterator, Optional
+
+import components.setup_logging
+from components.daemon_client import PROTOCOL_VERSION
+from components.hook_startup_cache import hash_source_files
+from components.instrumentation import get_run_metrics, reset_run_metrics
+
+logger = logging.getLogger(__name__)
+
+
+class SocketWriter:
+    "Sends what is written to it to the hook as stderr messages, from any thread"
+
+    def __init__(self, wfile, lock: threading.Lock):
+        self.wfile = wfile
+        self.lock = lock
+
+    def write(self, text: str) -> int:
+        if text:
+            send_message(self.wfile, self.lock, {"stderr": text})
+
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def send_message(wfile, lock: threading.Lock, message: dict):
+    with lock:
+        wfile.write(json.dumps(message).encode() + b"\n")
+        wfile.flush()
+
+
+@contextlib.contextmanager
+def daemon_socket_lock(socket_path: str) -> Iterator[None]:
+    """
+    Holds an exclusive lock on a file next to the socket while a daemon checks that no other daemon listens on it and binds it,
+    or unlinks it when stopping, so a daemon never unlinks the socket another daemon just bound.
+    The lock is released when the file is closed, or when the process ends
+    """
+
+    with open(f"{socket_path}.lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+
+class RenamerDaemon(socketserver.UnixStreamServer):
+    """
+    Runs the hooks forwarded by `forward_to_daemon` one at a time, with the renamer already imported and the config already validated
+
+    The daemon is created while holding `daemon_socket_lock`, which the daemon takes again to unlink its socket when stopping.
+    It stops after `idle_timeout` seconds without a hook, and as soon as the config or the code of the renamer changed
+    (or a hook sent a request of another protocol version), in which case the hook is run on its own process, and the next hook starts a new daemon
+    """
+
+    def __init__(
+        self,
+        socket_path: str,
+        handle_plugin_input: Callable[[str], None],
+        idle_timeout: Optional[float],
+    ):
+        self.handle_plugin_input = handle_plugin_input
+        self.source_hash = hash_source_files()
+        self.stopped = False
+        self.timeout = idle_timeout
+
+        # a socket file left behind by a daemon that did not stop cleanly
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(socket_path)
+
+        super().__init__(socket_path, RenamerDaemonRequestHandler)
+
+    def serve_until_stopped(self):
+        logger.info("Renamer daemon listening on '%s'", self.server_address)
+
+        try:
+            while not self.stopped:
+                self.handle_request()
+        finally:
+            with daemon_socket_lock(self.server_address):
+                self.server_close()
+
+                with contextlib.suppress(FileNotFoundError):
+                    os.unlink(self.server_address)
+
+        logger.info("Renamer daemon stopped")
+
+    def handle_timeout(self):
+        logger.info("No hook for %s seconds, stopping the renamer daemon", self.timeout)
+        self.stopped = True
+
+
+class RenamerDaemonRequestHandler(socketserver.StreamRequestHandler):
+    server: RenamerDaemon
+
+    def handle(self):
+        # the hook closed the connection without sending its input
+        if not (request_line := self.rfile.readline()):
+            return
+
+        request = json.loads(request_line)
+        lock = threading.Lock()
+
+        if request.get("protocol_version") != PROTOCOL_VERSION:
+            logger.info(
+                "The hook sent a request of protocol version %s, stopping the renamer daemon",
+                request.get("protocol_version"),
+            )
+            self.server.stopped = True
+            send_message(self.wfile, lock, {"status": "restart"})
+            return
+
+        if hash_source_files() != self.server.source_hash:
+            logger.info("The renamer changed, stopping the renamer daemon")
+            self.server.stopped = True
+            send_message(self.wfile, lock, {"status": "restart"})
+            return
+
+        reset_run_metrics()
+
+        try:
+            with contextlib.redirect_stderr(SocketWriter(self.wfile, lock)):
+                self.server.handle_plugin_input(request["plugin_input"])
+        except Exception:
+            logger.error("Hook failed", exc_info=True)
+            send_message(
+                self.wfile,
+                lock,
+                {
+                    "status": "error",
+                    "error": traceback.format_exc(),
+                    "metrics": get_run_metrics().drain(),
+                },
+            )
+            return
+
+        send_message(
+            self.wfile,
+            lock,
+            {"status": "done", "metrics": get_run_metrics().drain()},
+        )
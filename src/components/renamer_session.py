@@ -0,0 +1,74 @@
+import logging
+import threading
+from typing import Optional
+
+import components.setup_logging
+from components.find_matching_template import (
+    TemplateMatchers,
+    compile_template_matchers,
+)
+from components.stash_graphql import StashGraphQL
+from components.studio_cache import get_versioned_studios
+from components.studio_helpers import StudioRegistry
+from models.config import Config, StashApiConfig
+from models.studio import StudiosVersion
+
+logger = logging.getLogger(__name__)
+
+
+class RenamerSession:
+    """
+    The Stash GraphQL client, the studios and the compiled templates used to rename scenes by id
+
+    A hook run on its own process uses a session once, the renamer daemon keeps it between hooks:
+    the connections to Stash stay open, and the studios (and the templates compiled for them) are only fetched again when a studio changed
+    """
+
+    def __init__(self, config: Config, studio_cache_path: Optional[str]):
+        self.config = config
+        self.stash_api_config = config.STASH_API_CONFIG or StashApiConfig()
+        self.studio_cache_path = studio_cache_path
+
+        # the first request fails just the same if Stash cannot be reached, without waiting for the version first
+        self.stash_graphql = StashGraphQL(
+            config.STASH_API_GRAPHQL_URL, self.stash_api_config, test_connection=False
+        )
+
+        # the studios are fetched on a thread while the scenes are being fetched
+        self._lock = threading.Lock()
+        self._studios_version: Optional[StudiosVersion] = None
+        self._studios: Optional[StudioRegistry] = None
+        self._template_matchers: Optional[TemplateMatchers] = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.stash_graphql.close()
+
+    def get_studios(self) -> StudioRegistry:
+        with self._lock:
+            if self._studios is not None and self._studios_version is not None:
+                if self.stash_graphql.get_studios_version() == self._studios_version:
+                    logger.debug("Using %d studios kept in memory", len(self._studios))
+                    return self._studios
+
+            self._studios_version, studios = get_versioned_studios(
+                self.stash_graphql, self.studio_cache_path
+            )
+            self._studios = StudioRegistry(studios)
+            self._template_matchers = None
+
+            return self._studios
+
+    def get_template_matchers(self, studios: StudioRegistry) -> TemplateMatchers:
+        with self._lock:
+            if self._template_matchers is None or studios is not self._studios:
+                self._template_matchers = compile_template_matchers(
+                    self.config, studios
+                )
+
+            return self._template_matchers
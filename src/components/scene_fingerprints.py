@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import sqlite3
+from typing import TYPE_CHECKING, Iterable, Optional
+
+import components.setup_logging
+
+# the hooks check the scene fingerprints without loading the config
+if TYPE_CHECKING:
+    from components.stash_db_reader import StashDBReader
+    from models.config import Config
+
+logger = logging.getLogger(__name__)
+
+# The key of the scene JSON read from the stash db (see `StashDBReader.get_scene_dicts_after`) holding the resolved value of each hook input field
+INPUT_FIELD_SCENE_KEYS = {
+    "title": "title",
+    "code": "code",
+    "date": "date",
+    "rating100": "rating100",
+    "rating": "rating100",
+    "organized": "organized",
+    "studio_id": "studio",
+    "performer_ids": "performers",
+    "tag_ids": "tags",
+    "primary_file_id": "files",
+    "movies": "movies",
+    "groups": "movies",
+    "stash_ids": "stash_ids",
+}
+
+# The file attributes that change without changing the file path (eg. when Stash scans the renamed file)
+VOLATILE_FILE_KEYS = frozenset(["mod_time", "created_at", "updated_at"])
+
+# Bumped when the fingerprints are computed differently, the fingerprints of the previous versions are dropped
+SCHEMA_VERSION = 3
+
+
+def hash_config(config: Config) -> str:
+    return hashlib.sha256(config.json().encode("utf-8")).hexdigest()
+
+
+def read_scene_fingerprints(
+    stash_db_reader: StashDBReader,
+    scene_ids: Iterable[int],
+    input_fields: frozenset[str],
+) -> dict[int, str]:
+    """
+    Returns, for each scene, a hash of the values of the `input_fields` resolved in the stash db: the names of the studio
+    (and of its ancestors), performers and tags rather than their ids, the attributes of the files rather than the primary file id...
+    The current paths of the files are always part of the fingerprint, so a scene whose files were moved outside of the renamer is renamed again.
+    The scenes missing from the stash db have no fingerprint
+    """
+
+    scene_keys = sorted(
+        {
+            INPUT_FIELD_SCENE_KEYS[input_field]
+            for input_field in input_fields
+            if input_field in INPUT_FIELD_SCENE_KEYS
+        }
+    )
+    fingerprints: dict[int, str] = {}
+
+    for scene_id in scene_ids:
+        scene_dicts = stash_db_reader.get_scene_dicts_after(scene_id - 1, 1)
+
+        if not scene_dicts or scene_dicts[0]["id"] != str(scene_id):
+            continue
+
+        values = {scene_key: scene_dicts[0][scene_key] for scene_key in scene_keys}
+        values["file_paths"] = [
+            file_dict["path"] for file_dict in scene_dicts[0]["files"]
+        ]
+
+        if values.get("files"):
+            values["files"] = [
+                {
+                    file_key: file_value
+                    for file_key, file_value in file_dict.items()
+                    if file_key not in VOLATILE_FILE_KEYS
+                }
+                for file_dict in values["files"]
+            ]
+
+        # the templates and filters use the whole hierarchy of the studio (eg. studio_family, matches_part_of_studio)
+        if values.get("studio") is not None:
+            values["studio"] = stash_db_reader.get_studio_hierarchy(
+                int(values["studio"]["id"])
+            )
+
+        fingerprints[scene_id] = hashlib.sha256(
+            json.dumps(values, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+
+    return fingerprints
+
+
+def is_scene_unchanged(
+    sqlite_path: str,
+    config_hash: str,
+    stash_db_path: str,
+    scene_id: int,
+    input_fields: frozenset[str],
+) -> bool:
+    """
+    Returns True if the values the file path of the scene is made of are the same in the stash db as when the scene was last renamed
+    """
+
+    from components.stash_db_reader import StashDBReader
+
+    try:
+        with StashDBReader(stash_db_path) as stash_db_reader:
+            fingerprint = read_scene_fingerprints(
+                stash_db_reader, [scene_id], input_fields
+            ).get(scene_id)
+    except (ConnectionError, sqlite3.Error) as e:
+        logger.warning("Error reading the fingerprint of scene %s: %s", scene_id, e)
+        return False
+
+    scene_fingerprints = SceneFingerprintStore(sqlite_path, config_hash)
+
+    try:
+        return scene_fingerprints.is_unchanged(scene_id, fingerprint)
+    finally:
+        scene_fingerprints.close()
+
+
+def record_scene_fingerprints(
+    sqlite_path: str,
+    config_hash: str,
+    stash_db_path: str,
+    scene_ids: list[int],
+    input_fields: frozenset[str],
+):
+    """
+    Records the fingerprints of the renamed scenes, read from the stash db once their files were renamed
+    """
+
+    from components.stash_db_reader import StashDBReader
+
+    try:
+        with StashDBReader(stash_db_path) as stash_db_reader:
+            fingerprints = read_scene_fingerprints(
+                stash_db_reader, scene_ids, input_fields
+            )
+    except (ConnectionError, sqlite3.Error) as e:
+        logger.warning("Error reading the fingerprints of scenes %s: %s", scene_ids, e)
+        return
+
+    scene_fingerprints = SceneFingerprintStore(sqlite_path, config_hash)
+
+    try:
+        scene_fingerprints.update(fingerprints)
+    finally:
+        scene_fingerprints.close()
+
+
+class SceneFingerprintStore:
+    """
+    Remembers, for each scene renamed by the hooks, a hash of the values its file path was made of once it was renamed (see `read_scene_fingerprints`)
+
+    The fingerprints are only valid for the config they were recorded with, a config change invalidates all of them
+    """
+
+    def __init__(self, sqlite_path: str, config_hash: str):
+        self.config_hash = config_hash
+
+        self.conn = sqlite3.connect(sqlite_path)
+
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self.conn.execute("DROP TABLE IF EXISTS scene_fingerprints")
+            self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS scene_fingerprints (scene_id INTEGER PRIMARY KEY, config_hash TEXT NOT NULL, fingerprint TEXT NOT NULL)"
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def is_unchanged(self, scene_id: int, fingerprint: Optional[str]) -> bool:
+        if fingerprint is None:
+            return False
+
+        return (
+            self.conn.execute(
+                "SELECT 1 FROM scene_fingerprints WHERE scene_id = ? AND config_hash = ? AND fingerprint = ?",
+                (scene_id, self.config_hash, fingerprint),
+            ).fetchone()
+            is not None
+        )
+
+    def update(self, fingerprints: dict[int, str]):
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO scene_fingerprints (scene_id, config_hash, fingerprint) VALUES (?, ?, ?)",
+                [
+                    (scene_id, self.config_hash, fingerprint)
+                    for scene_id, fingerprint in fingerprints.items()
+                ],
+            )
+
+    def delete(self, scene_ids: list[int]):
+        with self.conn:
+            self.conn.executemany(
+                "DELETE FROM scene_fingerprints WHERE scene_id = ?",
+                [(scene_id,) for scene_id in scene_ids],
+            )
+
+    def clear(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM scene_fingerprints")
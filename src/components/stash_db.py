@@ -2,8 +2,12 @@ import datetime
 import logging
 import sqlite3
 from pathlib import Path
+from typing import Optional
 
 import components.setup_logging
+from components.instrumentation import get_run_metrics
+from models.compact_scene import CompactSceneFile
+from models.rename_plan import PlannedRename
 from models.scene import Scene, SceneFile
 from models.stash_db.db_file import DBFile
 from models.stash_db.db_folder import DBFolder
@@ -15,29 +19,161 @@ def get_curr_time():
     return datetime.datetime.now().astimezone().isoformat("T", "seconds")
 
 
+class StashDBCommitError(Exception):
+    "Raised when a transaction could not be committed to the stash db, the transaction has been rolled back"
+
+    def __init__(
+        self,
+        renames: list[tuple[SceneFile | CompactSceneFile | PlannedRename, str]],
+        message="Failed to commit the file renames to the stash db",
+    ):
+        # the (file, new file path) renames of the rolled back transaction, in the order they were made
+        self.renames = renames
+        self.message = message
+        super().__init__(self.message)
+
+
 class StashDB:
-    def __init__(self, sqlite_path: str, dryrun_enabled: bool = True):
+    """
+    Updates the paths of renamed files in the stash db
+
+    The renames are committed in transactions of `commit_batch_size` files (None -> a single transaction, committed by `commit()`).
+    `commit()` must be called once all the files have been renamed, to commit the last transaction.
+
+    The folders are cached by path as they are looked up (or all at once when connecting, with `preload_folders`)
+    """
+
+    def __init__(
+        self,
+        sqlite_path: str,
+        dryrun_enabled: bool = True,
+        commit_batch_size: Optional[int] = 1,
+        busy_timeout: float = 30,
+        preload_folders: bool = False,
+    ):
         self.dryrun_enabled = dryrun_enabled
+        self.commit_batch_size = commit_batch_size
+
+        # renames made in the current (not yet committed) transaction
+        self.uncommitted_renames: list[
+            tuple[SceneFile | CompactSceneFile | PlannedRename, str]
+        ] = []
+
+        self.folders_by_path: dict[str, DBFolder] = {}
+        # paths of the folders inserted in the current transaction, removed from the cache if the transaction is rolled back
+        self.uncommitted_folder_paths: list[str] = []
+
+        # renames of all the transactions rolled back since connecting, eg. to report the scenes whose files were not renamed
+        self.rolled_back_renames: list[
+            tuple[SceneFile | CompactSceneFile | PlannedRename, str]
+        ] = []
 
         if self.dryrun_enabled:
             return
 
-        self._connect(sqlite_path)
+        self._connect(sqlite_path, busy_timeout)
+
+        if preload_folders:
+            self._load_db_folders()
 
-    def _connect(self, sqlite_path: str):
+    def _connect(self, sqlite_path: str, busy_timeout: float = 30):
         if self.dryrun_enabled:
             raise ValueError("Cannot connect to database when dryrun is enabled")
 
         try:
-            self.conn = sqlite3.connect(sqlite_path)
+            # the connection is created here but used by the commit stage thread when processing scenes in a pipeline
+            self.conn = sqlite3.connect(
+                sqlite_path, timeout=busy_timeout, check_same_thread=False
+            )
             self.cursor = self.conn.cursor()
 
+            # Stash runs its database in WAL mode, where synchronous=NORMAL is safe and only syncs at checkpoints instead of on every commit
+            journal_mode = self.cursor.execute("PRAGMA journal_mode").fetchone()[0]
+            if journal_mode.lower() == "wal":
+                self.cursor.execute("PRAGMA synchronous = NORMAL")
+
         except sqlite3.Error as e:
             raise ConnectionError(
                 f"Error connecting to database. Path: {sqlite_path}, {e}"
             )
 
-    def rename(self, file: SceneFile, new_file_path: str):
+    def commit(self):
+        """
+        Commits the current transaction
+
+        If the commit fails, the transaction is rolled back and a StashDBCommitError with the renames of the transaction is raised
+        """
+
+        if self.dryrun_enabled or not (
+            self.uncommitted_renames or self.uncommitted_folder_paths
+        ):
+            return
+
+        try:
+            with get_run_metrics().time("stash_db.commit"):
+                self.conn.commit()
+        except sqlite3.Error as error:
+            logger.error(
+                "[STASH-DB] Failed to commit %d file renames, rolling back",
+                len(self.uncommitted_renames),
+                exc_info=True,
+            )
+            raise StashDBCommitError(self.rollback()) from error
+
+        renames = self.uncommitted_renames
+        self.uncommitted_renames = []
+
+        folder_paths = self.uncommitted_folder_paths
+        self.uncommitted_folder_paths = []
+
+        logger.debug("[STASH-DB] Committed %d file renames", len(renames))
+
+        metrics = get_run_metrics()
+        metrics.count("stash_db.commits")
+        # one updated file row per rename, one inserted row per new folder
+        metrics.count("stash_db.rows_written", len(renames) + len(folder_paths))
+
+    def rollback(
+        self,
+    ) -> list[tuple[SceneFile | CompactSceneFile | PlannedRename, str]]:
+        """
+        Rolls back the current transaction, returns its renames (whose files have to be moved back), in the order they were made
+        """
+
+        renames = self.uncommitted_renames
+        self.uncommitted_renames = []
+
+        folder_paths = self.uncommitted_folder_paths
+        self.uncommitted_folder_paths = []
+
+        # the folders inserted in the transaction no longer exist
+        for folder_path in folder_paths:
+            self.folders_by_path.pop(folder_path, None)
+
+        self.rolled_back_renames += renames
+
+        if self.dryrun_enabled:
+            return renames
+
+        try:
+            self.conn.rollback()
+        except sqlite3.Error:
+            # eg. the transaction was already rolled back by SQLite
+            logger.error("[STASH-DB] Failed to roll back", exc_info=True)
+
+        get_run_metrics().count("stash_db.rollbacks")
+
+        return renames
+
+    def close(self):
+        if self.dryrun_enabled:
+            return
+
+        self.conn.close()
+
+    def rename(
+        self, file: SceneFile | CompactSceneFile | PlannedRename, new_file_path: str
+    ):
         if self.dryrun_enabled:
             logger.debug(
                 f"[DRYRUN] [STASH-DB] Renaming file: '{file.path}' --> '{new_file_path}'"
@@ -46,14 +182,23 @@ class StashDB:
 
         logger.debug(f"[STASH-DB] Renaming file: '{file.path}' --> '{new_file_path}'")
 
-        # new file folder is the parent folder of the new file path
-        parent_folder_path = str(Path(new_file_path).resolve().parent)
+        with get_run_metrics().time("stash_db.update_file"):
+            # new file folder is the parent folder of the new file path
+            parent_folder_path = str(Path(new_file_path).resolve().parent)
 
-        parent_folder_id = self._get_or_create_db_folder(parent_folder_path).id
+            parent_folder_id = self._get_or_create_db_folder(parent_folder_path).id
 
-        new_file_basename = Path(new_file_path).name
+            new_file_basename = Path(new_file_path).name
 
-        self._update_db_file_path(file, new_file_basename, parent_folder_id)
+            self._update_db_file_path(file, new_file_basename, parent_folder_id)
+
+        self.uncommitted_renames.append((file, new_file_path))
+
+        if (
+            self.commit_batch_size is not None
+            and len(self.uncommitted_renames) >= self.commit_batch_size
+        ):
+            self.commit()
 
     def _get_or_create_db_folder(self, folder_path: str):
         if self.dryrun_enabled:
@@ -101,13 +246,32 @@ class StashDB:
     def _find_db_folder_with_path(self, path: str):
         if self.dryrun_enabled:
             raise ValueError("Cannot perform database operation when dryrun is enabled")
+
+        if (db_folder := self.folders_by_path.get(path)) is not None:
+            return db_folder
+
+        # not cached yet, or created by Stash after the folders were loaded
+        get_run_metrics().count("stash_db.folder_queries")
         result = self.cursor.execute("SELECT * FROM folders WHERE path = ?", (path,))
         row = result.fetchone()
 
         if row is None:
             return None
 
-        return DBFolder.from_db_row(row)
+        db_folder = DBFolder.from_db_row(row)
+        self.folders_by_path[db_folder.path] = db_folder
+
+        return db_folder
+
+    def _load_db_folders(self):
+        if self.dryrun_enabled:
+            raise ValueError("Cannot perform database operation when dryrun is enabled")
+
+        for row in self.cursor.execute("SELECT * FROM folders"):
+            db_folder = DBFolder.from_db_row(row)
+            self.folders_by_path[db_folder.path] = db_folder
+
+        logger.debug("[STASH-DB] Loaded %d folders", len(self.folders_by_path))
 
     def _find_db_folder_with_id(self, id: int):
         if self.dryrun_enabled:
@@ -147,34 +311,46 @@ class StashDB:
 
         logger.debug(f"[Stash-DB] Creating folder: '{path}'")
 
+        curr_time = get_curr_time()
+
         result = self.cursor.execute(
             "INSERT INTO folders (path, parent_folder_id, mod_time, created_at, updated_at, zip_file_id) VALUES (?, ?, ?, ?, ?, ?)",
             (
                 path,
                 parent_folder_id,
-                get_curr_time(),
-                get_curr_time(),
-                get_curr_time(),
+                curr_time,
+                curr_time,
+                curr_time,
                 None,
             ),
         )
 
-        self.conn.commit()
-
         assert result.lastrowid is not None
 
         logger.debug(
             f"[Stash-DB] Created folder: (folder_id={result.lastrowid}) (parent_folder_id={parent_folder_id}) '{path}'"
         )
 
-        inserted_folder = self._find_db_folder_with_id(result.lastrowid)
+        inserted_folder = DBFolder(
+            id=result.lastrowid,
+            path=path,
+            parent_folder_id=parent_folder_id,
+            mod_time=curr_time,
+            created_at=curr_time,
+            updated_at=curr_time,
+            zip_file_id=None,
+        )
 
-        assert inserted_folder is not None
+        self.folders_by_path[path] = inserted_folder
+        self.uncommitted_folder_paths.append(path)
 
         return inserted_folder
 
     def _update_db_file_path(
-        self, file: SceneFile, new_file_basename: str, parent_folder_id: int
+        self,
+        file: SceneFile | CompactSceneFile | PlannedRename,
+        new_file_basename: str,
+        parent_folder_id: int,
     ):
         if self.dryrun_enabled:
             raise ValueError("Cannot perform database operation when dryrun is enabled")
@@ -187,6 +363,4 @@ class StashDB:
             (new_file_basename, parent_folder_id, get_curr_time(), file.id),
         )
 
-        self.conn.commit()
-
         logger.debug(f"[Stash-DB] File updated")
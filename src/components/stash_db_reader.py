@@ -0,0 +1,316 @@
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterator
+
+import components.setup_logging
+from components.instrumentation import get_run_metrics
+
+# the hooks read the scene fingerprints without loading the models
+if TYPE_CHECKING:
+    from models.compact_scene import CompactScene
+
+logger = logging.getLogger(__name__)
+
+
+class StashDBReader:
+    """
+    Reads the scenes straight from the stash sqlite database, opened read-only
+
+    The scenes are read in pages sorted by id, with one query per table for the whole page.
+    Each page is turned into the same JSON as the Scene_Data GraphQL fragment, so the scenes are parsed (and validated) the same way as the scenes from the GraphQL API
+    """
+
+    def __init__(self, sqlite_path: str, busy_timeout: float = 30):
+        try:
+            self.conn = sqlite3.connect(
+                f"{Path(sqlite_path).resolve().as_uri()}?mode=ro",
+                uri=True,
+                timeout=busy_timeout,
+                check_same_thread=False,
+            )
+            self.conn.execute("PRAGMA query_only = ON")
+        except sqlite3.Error as e:
+            raise ConnectionError(
+                f"Error connecting to database. Path: {sqlite_path}, {e}"
+            )
+
+        table_names = {
+            row[0]
+            for row in self.conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+            )
+        }
+
+        # movies were renamed to groups in Stash v0.27
+        if "groups_scenes" in table_names:
+            self.movies_query = "SELECT gs.scene_id, g.id, g.name, g.date, gs.scene_index FROM groups_scenes gs JOIN groups g ON g.id = gs.group_id WHERE gs.scene_id > ? AND gs.scene_id <= ? ORDER BY gs.scene_id, g.id"
+        else:
+            self.movies_query = "SELECT ms.scene_id, m.id, m.name, m.date, ms.scene_index FROM movies_scenes ms JOIN movies m ON m.id = ms.movie_id WHERE ms.scene_id > ? AND ms.scene_id <= ? ORDER BY ms.scene_id, m.id"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def get_scene_count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM scenes").fetchone()[0]
+
+    def iter_all_scenes(self, per_page: int) -> Iterator[CompactScene]:
+        """
+        Yields every scene sorted by id, reading `per_page` scenes at a time
+        """
+
+        from components.stash_graphql import parse_scenes
+
+        last_scene_id = 0
+
+        while True:
+            with get_run_metrics().time("stash_db_reader.page"):
+                scene_dicts = self.get_scene_dicts_after(last_scene_id, per_page)
+
+            if not scene_dicts:
+                return
+
+            logger.debug(
+                "Read scenes %s to %s from the stash db",
+                scene_dicts[0]["id"],
+                scene_dicts[-1]["id"],
+            )
+
+            yield from parse_scenes(scene_dicts)
+
+            if len(scene_dicts) < per_page:
+                return
+
+            last_scene_id = int(scene_dicts[-1]["id"])
+
+    def get_scene_dicts_after(self, last_scene_id: int, limit: int) -> list[dict]:
+        """
+        Returns the Scene_Data JSON of the first `limit` scenes with an id greater than `last_scene_id`
+        """
+
+        scene_dicts_by_id: dict[int, dict] = {}
+
+        for row in self.conn.execute(
+            "SELECT s.id, s.title, s.date, s.rating, s.organized, s.code, st.id, st.name, pst.id, pst.name FROM scenes s LEFT JOIN studios st ON st.id = s.studio_id LEFT JOIN studios pst ON pst.id = st.parent_id WHERE s.id > ? ORDER BY s.id LIMIT ?",
+            (last_scene_id, limit),
+        ):
+            (
+                scene_id,
+                title,
+                date,
+                rating100,
+                organized,
+                code,
+                studio_id,
+                studio_name,
+                parent_studio_id,
+                parent_studio_name,
+            ) = row
+
+            scene_dicts_by_id[scene_id] = {
+                "id": str(scene_id),
+                "title": title,
+                "date": date or None,
+                "rating100": rating100,
+                "stash_ids": [],
+                "organized": bool(organized),
+                "code": code,
+                "files": [],
+                "studio": (
+                    {
+                        "id": str(studio_id),
+                        "name": studio_name,
+                        "parent_studio": (
+                            {"id": str(parent_studio_id), "name": parent_studio_name}
+                            if parent_studio_id is not None
+                            else None
+                        ),
+                    }
+                    if studio_id is not None
+                    else None
+                ),
+                "tags": [],
+                "performers": [],
+                "movies": [],
+            }
+
+        if not scene_dicts_by_id:
+            return []
+
+        # the page holds every scene with an id in (last_scene_id, max scene id], so the other tables are read with a range instead of a list of ids
+        scene_id_range = (last_scene_id, max(scene_dicts_by_id))
+
+        self._read_scene_stash_ids(scene_dicts_by_id, scene_id_range)
+        self._read_files(scene_dicts_by_id, scene_id_range)
+        self._read_performers(scene_dicts_by_id, scene_id_range)
+        self._read_tags(scene_dicts_by_id, scene_id_range)
+        self._read_movies(scene_dicts_by_id, scene_id_range)
+
+        return list(scene_dicts_by_id.values())
+
+    def get_studio_hierarchy(self, studio_id: int) -> list[dict]:
+        """
+        Returns the id and the name of the studio and of its ancestors, from the studio to the top-level studio
+        """
+
+        return [
+            {"id": str(hierarchy_studio_id), "name": name}
+            for hierarchy_studio_id, name in self.conn.execute(
+                "WITH RECURSIVE hierarchy (id, name, parent_id, depth) AS (SELECT id, name, parent_id, 0 FROM studios WHERE id = ? UNION ALL SELECT st.id, st.name, st.parent_id, h.depth + 1 FROM studios st JOIN hierarchy h ON st.id = h.parent_id WHERE h.depth < 100) SELECT id, name FROM hierarchy ORDER BY depth",
+                (studio_id,),
+            )
+        ]
+
+    def _read_scene_stash_ids(
+        self, scene_dicts_by_id: dict[int, dict], scene_id_range: tuple[int, int]
+    ):
+        for scene_id, endpoint, stash_id in self.conn.execute(
+            "SELECT scene_id, endpoint, stash_id FROM scene_stash_ids WHERE scene_id > ? AND scene_id <= ? ORDER BY scene_id",
+            scene_id_range,
+        ):
+            scene_dicts_by_id[scene_id]["stash_ids"].append(
+                {"endpoint": endpoint, "stash_id": stash_id}
+            )
+
+    def _read_files(
+        self, scene_dicts_by_id: dict[int, dict], scene_id_range: tuple[int, int]
+    ):
+        file_dicts_by_id: dict[int, dict] = {}
+
+        # the primary file first, like the files of a scene in the GraphQL API
+        for row in self.conn.execute(
+            'SELECT sf.scene_id, f.id, f.basename, fo.path, f.parent_folder_id, f.mod_time, f.created_at, f.updated_at, vf.duration, vf.video_codec, vf.audio_codec, vf.width, vf.height, vf.frame_rate, vf.bit_rate FROM scenes_files sf JOIN files f ON f.id = sf.file_id JOIN folders fo ON fo.id = f.parent_folder_id JOIN video_files vf ON vf.file_id = f.id WHERE sf.scene_id > ? AND sf.scene_id <= ? ORDER BY sf.scene_id, sf."primary" DESC, f.id',
+            scene_id_range,
+        ):
+            (
+                scene_id,
+                file_id,
+                basename,
+                folder_path,
+                parent_folder_id,
+                mod_time,
+                created_at,
+                updated_at,
+                duration,
+                video_codec,
+                audio_codec,
+                width,
+                height,
+                frame_rate,
+                bit_rate,
+            ) = row
+
+            file_dict = {
+                "id": str(file_id),
+                "path": os.path.join(folder_path, basename),
+                "video_codec": video_codec,
+                "audio_codec": audio_codec,
+                "width": width,
+                "height": height,
+                "frame_rate": frame_rate,
+                "duration": duration,
+                "bit_rate": bit_rate,
+                "basename": basename,
+                "mod_time": str(mod_time),
+                "created_at": str(created_at),
+                "updated_at": str(updated_at),
+                "parent_folder_id": str(parent_folder_id),
+                "fingerprints": [],
+            }
+
+            file_dicts_by_id[file_id] = file_dict
+            scene_dicts_by_id[scene_id]["files"].append(file_dict)
+
+        for file_id, fingerprint_type, fingerprint in self.conn.execute(
+            "SELECT ff.file_id, ff.type, ff.fingerprint FROM scenes_files sf JOIN files_fingerprints ff ON ff.file_id = sf.file_id WHERE sf.scene_id > ? AND sf.scene_id <= ? AND ff.type IN ('oshash', 'phash') ORDER BY ff.file_id, ff.type",
+            scene_id_range,
+        ):
+            if (file_dict := file_dicts_by_id.get(file_id)) is None:
+                continue
+
+            file_dict["fingerprints"].append(
+                {
+                    "type": fingerprint_type,
+                    "value": format_fingerprint(fingerprint_type, fingerprint),
+                }
+            )
+
+    def _read_performers(
+        self, scene_dicts_by_id: dict[int, dict], scene_id_range: tuple[int, int]
+    ):
+        performer_stash_ids: dict[int, list[dict]] = {}
+
+        for performer_id, endpoint, stash_id in self.conn.execute(
+            "SELECT psi.performer_id, psi.endpoint, psi.stash_id FROM performer_stash_ids psi WHERE psi.performer_id IN (SELECT performer_id FROM performers_scenes WHERE scene_id > ? AND scene_id <= ?) ORDER BY psi.performer_id",
+            scene_id_range,
+        ):
+            performer_stash_ids.setdefault(performer_id, []).append(
+                {"endpoint": endpoint, "stash_id": stash_id}
+            )
+
+        for (
+            scene_id,
+            performer_id,
+            name,
+            gender,
+            favorite,
+            rating100,
+        ) in self.conn.execute(
+            "SELECT ps.scene_id, p.id, p.name, p.gender, p.favorite, p.rating FROM performers_scenes ps JOIN performers p ON p.id = ps.performer_id WHERE ps.scene_id > ? AND ps.scene_id <= ? ORDER BY ps.scene_id, p.id",
+            scene_id_range,
+        ):
+            scene_dicts_by_id[scene_id]["performers"].append(
+                {
+                    "id": str(performer_id),
+                    "name": name,
+                    "gender": gender or None,
+                    "favorite": bool(favorite),
+                    "rating100": rating100,
+                    "stash_ids": performer_stash_ids.get(performer_id, []),
+                }
+            )
+
+    def _read_tags(
+        self, scene_dicts_by_id: dict[int, dict], scene_id_range: tuple[int, int]
+    ):
+        # the templates order the tags and the performers themselves (see create_tags_replacer and apply_performers_order_by)
+        for scene_id, tag_id, name in self.conn.execute(
+            "SELECT st.scene_id, t.id, t.name FROM scenes_tags st JOIN tags t ON t.id = st.tag_id WHERE st.scene_id > ? AND st.scene_id <= ? ORDER BY st.scene_id, t.id",
+            scene_id_range,
+        ):
+            scene_dicts_by_id[scene_id]["tags"].append(
+                {"id": str(tag_id), "name": name}
+            )
+
+    def _read_movies(
+        self, scene_dicts_by_id: dict[int, dict], scene_id_range: tuple[int, int]
+    ):
+        for scene_id, movie_id, name, date, scene_index in self.conn.execute(
+            self.movies_query, scene_id_range
+        ):
+            scene_dicts_by_id[scene_id]["movies"].append(
+                {
+                    "movie": {"id": str(movie_id), "name": name, "date": date or None},
+                    "scene_index": scene_index,
+                }
+            )
+
+
+def format_fingerprint(fingerprint_type: str, fingerprint) -> str:
+    # the phash is stored as a signed 64-bit integer, and returned as an unsigned hex string by the GraphQL API
+    if fingerprint_type == "phash" and isinstance(fingerprint, int):
+        return format(fingerprint & 0xFFFFFFFFFFFFFFFF, "x")
+
+    if isinstance(fingerprint, bytes):
+        return fingerprint.decode()
+
+    return str(fingerprint)
@@ -1,20 +1,43 @@
+import gzip
+import json
 import logging
+from typing import Iterator, Optional
 
-import pydantic
 import requests
+import requests.adapters
 
 import components.setup_logging
-from models.config import get_config
+from components.instrumentation import get_run_metrics
+from models.compact_scene import CompactScene
+from models.config import StashApiConfig, get_config
 from models.scene import Scene
-from models.studio import Studio
+from models.studio import Studio, StudiosVersion
 
 logger = logging.getLogger(__name__)
 
 
 class StashGraphQL:
-    def __init__(self, graphql_url: str):
+    def __init__(
+        self,
+        graphql_url: str,
+        api_config: Optional[StashApiConfig] = None,
+        test_connection: bool = True,
+    ):
         self.graphql_url = graphql_url
-        self.test_connection()
+        self.api_config = api_config or StashApiConfig()
+        self.session = create_session(self.api_config)
+
+        if test_connection:
+            self.test_connection()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.session.close()
 
     def test_connection(self):
         try:
@@ -82,6 +105,40 @@ class StashGraphQL:
 
         return studios
 
+    def get_studios_version(self) -> StudiosVersion:
+        """
+        Returns the number of studios and the time the last studio was updated, which change whenever a studio is created, updated or deleted
+        """
+
+        query = """
+            query GetStudiosVersion($filter: FindFilterType) {
+                findStudios(filter: $filter) {
+                    count
+                    studios {
+                        updated_at
+                    }
+                }
+            }
+        """
+
+        variables = {
+            "filter": {
+                "direction": "DESC",
+                "page": 1,
+                "per_page": 1,
+                "sort": "updated_at",
+            }
+        }
+
+        response = self._send_request(query, variables)
+
+        studio_dicts = response["findStudios"]["studios"]
+
+        return StudiosVersion(
+            count=response["findStudios"]["count"],
+            updated_at=studio_dicts[0]["updated_at"] if studio_dicts else None,
+        )
+
     def get_all_scenes(self):
         query = (
             """
@@ -108,16 +165,77 @@ class StashGraphQL:
 
         response = self._send_request(query, variables)
 
-        scenes = []
-        for scene_dict in response["findScenes"]["scenes"]:
-            try:
-                scenes.append(Scene(**scene_dict))
-            except pydantic.error_wrappers.ValidationError as e:
-                logger.error("Error parsing scene: %s", scene_dict, exc_info=True)
+        scenes = parse_scenes(response["findScenes"]["scenes"])
 
         logger.info("Found %s scenes", len(scenes))
         return scenes
 
+    def get_scene_count(self) -> int:
+        query = """
+            query GetSceneCount($filter: FindFilterType) {
+                findScenes(filter: $filter) {
+                    count
+                }
+            }
+        """
+
+        variables = {"filter": {"page": 1, "per_page": 1}}
+
+        response = self._send_request(query, variables)
+        return response["findScenes"]["count"]
+
+    def iter_all_scenes(self, per_page: int) -> Iterator[CompactScene]:
+        """
+        Yields every scene, fetching `per_page` scenes per request so only one page is held in memory at a time
+        """
+
+        page = 1
+        while True:
+            _, scene_dicts = self.get_scenes_page(page, per_page)
+
+            yield from parse_scenes(scene_dicts)
+
+            if len(scene_dicts) < per_page:
+                return
+
+            page += 1
+
+    def get_scenes_page(self, page: int, per_page: int) -> tuple[int, list[dict]]:
+        """
+        Returns the total number of scenes, and the scenes of the page (not parsed yet)
+        """
+
+        query = (
+            """
+          query GetScenesPage($filter:FindFilterType) {
+                findScenes(filter: $filter) {
+                    count
+                    scenes {
+                        ...Scene_Data
+                    }
+                }
+            }
+        """
+            + SCENE_DATA_FRAGMENT
+        )
+
+        variables = {
+            "filter": {
+                # sort by id so that the pages stay stable while files are being renamed
+                "direction": "ASC",
+                "page": page,
+                "per_page": per_page,
+                "sort": "id",
+            }
+        }
+
+        response = self._send_request(query, variables)
+        scene_dicts = response["findScenes"]["scenes"]
+
+        logger.debug("Fetched scenes page %s (%s scenes)", page, len(scene_dicts))
+
+        return response["findScenes"]["count"], scene_dicts
+
     def get_scene_with_id(self, scene_id: int):
         query = (
             """
@@ -136,11 +254,124 @@ class StashGraphQL:
         response = self._send_request(query, variables)
         return Scene(**response["findScene"])
 
+    def get_scenes_with_ids(
+        self, scene_ids: list[int], chunk_size: int
+    ) -> Iterator[CompactScene]:
+        """
+        Yields the scenes with the given ids (in the same order), fetching `chunk_size` scenes per request
+        """
+
+        for chunk_start in range(0, len(scene_ids), chunk_size):
+            yield from self.get_scenes_chunk(
+                scene_ids[chunk_start : chunk_start + chunk_size]
+            )
+
+    def get_scenes_chunk(self, scene_ids: list[int]) -> list[CompactScene]:
+        """
+        Returns the scenes with the given ids (in the same order) with a single request, the scenes that are not found are skipped
+        """
+
+        query = (
+            """
+            query FindScenesWithIds($scene_ids: [Int!], $filter: FindFilterType) {
+                findScenes(scene_ids: $scene_ids, filter: $filter) {
+                    scenes {
+                        ...Scene_Data
+                    }
+                }
+            }
+            """
+            + SCENE_DATA_FRAGMENT
+        )
+
+        variables = {
+            "scene_ids": scene_ids,
+            "filter": {"per_page": -1},  # per_page: -1 -> means Get all
+        }
+
+        response = self._send_request(query, variables)
+
+        scene_dicts_by_id = {
+            int(scene_dict["id"]): scene_dict
+            for scene_dict in response["findScenes"]["scenes"]
+        }
+
+        scene_dicts = []
+        for scene_id in scene_ids:
+            scene_dict = scene_dicts_by_id.get(scene_id)
+
+            if scene_dict is None:
+                logger.warning("Scene with id %s not found", scene_id)
+                continue
+
+            scene_dicts.append(scene_dict)
+
+        return parse_scenes(scene_dicts)
+
     def _send_request(self, query, variables=None):
         body = {"query": query, "variables": variables}
 
-        response = requests.post(self.graphql_url, json=body)
-        return response.json().get("data")
+        timeout = (self.api_config.CONNECT_TIMEOUT, self.api_config.READ_TIMEOUT)
+
+        metrics = get_run_metrics()
+
+        with metrics.time("graphql.request"):
+            if not self.api_config.GZIP_REQUESTS:
+                response = self.session.post(
+                    self.graphql_url, json=body, timeout=timeout
+                )
+            else:
+                response = self.session.post(
+                    self.graphql_url,
+                    data=gzip.compress(json.dumps(body).encode()),
+                    headers={
+                        "Content-Type": "application/json",
+                        "Content-Encoding": "gzip",
+                    },
+                    timeout=timeout,
+                )
+
+            data = response.json().get("data")
+
+        metrics.count("graphql.requests")
+        metrics.count("graphql.bytes_fetched", len(response.content))
+
+        return data
+
+
+def parse_scenes(scene_dicts: list[dict]) -> list[CompactScene]:
+    "Parses the scenes of a findScenes response, the scenes that are not valid are logged and skipped"
+
+    scenes = []
+    for scene_dict in scene_dicts:
+        try:
+            scenes.append(CompactScene.from_dict(scene_dict))
+        except (KeyError, TypeError, ValueError) as e:
+            logger.error("Error parsing scene: %s", scene_dict, exc_info=True)
+
+    return scenes
+
+
+def create_session(api_config: StashApiConfig) -> requests.Session:
+    """
+    Creates a session that keeps the connections to the Stash GraphQL API alive between requests
+    """
+
+    session = requests.Session()
+
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=1, pool_maxsize=api_config.POOL_SIZE
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    session.headers["Connection"] = "keep-alive"
+    # requests decompresses gzip responses transparently
+    session.headers["Accept-Encoding"] = (
+        "gzip, deflate" if api_config.GZIP_RESPONSES else "identity"
+    )
+
+    return session
 
 
 SCENE_DATA_FRAGMENT = """
@@ -1,7 +1,5 @@
 import sys
 
-from models.config import get_config
-
 
 class StashLogger:
     def __init__(self, disable_logger: bool):
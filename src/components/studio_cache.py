@@ -0,0 +1,74 @@
+import logging
+import os
+from pathlib import Path
+from typing import Optional
+
+import pydantic
+
+import components.setup_logging
+from components.stash_graphql import StashGraphQL
+from models.studio import Studio, StudioCache, StudiosVersion
+
+logger = logging.getLogger(__name__)
+
+
+def read_studio_cache(cache_path: str) -> Optional[StudioCache]:
+    try:
+        return StudioCache.parse_file(cache_path)
+    except FileNotFoundError:
+        return None
+    except (pydantic.ValidationError, ValueError):
+        logger.warning("Ignoring invalid studio cache: '%s'", cache_path)
+        return None
+
+
+def write_studio_cache(cache_path: str, studio_cache: StudioCache):
+    # write to a temporary file first, so an interrupted write never leaves a partial cache behind
+    tmp_cache_path = f"{cache_path}.tmp"
+
+    Path(cache_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(tmp_cache_path, "w", encoding="utf-8") as file:
+        file.write(studio_cache.json())
+
+    os.replace(tmp_cache_path, cache_path)
+
+
+def get_studios(
+    stash_graphql: StashGraphQL, cache_path: Optional[str], refresh: bool = False
+) -> list[Studio]:
+    """
+    Returns all the studios, from the studio cache file if no studio was created, updated or deleted since it was written
+
+    If `cache_path` is None, the studios are always fetched. If `refresh` is True, the cache is rewritten even if it is up to date
+    """
+
+    _, studios = get_versioned_studios(stash_graphql, cache_path, refresh)
+
+    return studios
+
+
+def get_versioned_studios(
+    stash_graphql: StashGraphQL, cache_path: Optional[str], refresh: bool = False
+) -> tuple[Optional[StudiosVersion], list[Studio]]:
+    """
+    Same as `get_studios`, along with the version of the studios (None if `cache_path` is None, the version is only fetched for the cache)
+    """
+
+    if cache_path is None:
+        return None, stash_graphql.get_all_studios()
+
+    # get the version before the studios, so a studio updated in between is fetched again next time
+    version = stash_graphql.get_studios_version()
+
+    if not refresh and (studio_cache := read_studio_cache(cache_path)) is not None:
+        if studio_cache.version == version:
+            logger.debug("Using %d cached studios", len(studio_cache.studios))
+            return version, studio_cache.studios
+
+        logger.info("Studios changed since they were cached, fetching all studios")
+
+    studios = stash_graphql.get_all_studios()
+
+    write_studio_cache(cache_path, StudioCache(version=version, studios=studios))
+
+    return version, studios
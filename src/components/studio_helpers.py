@@ -1,123 +1,158 @@
-from typing import Optional
+from typing import Iterable, Optional
 
+from models.compact_scene import CompactSceneStudio
 from models.studio import Studio
 
 
-def find_studio_with_id(studio_id: str, studios: list[Studio]) -> Optional[Studio]:
-    for studio in studios:
-        if studio.id == studio_id:
-            return studio
+class StudioRegistry:
+    """
+    Indexes the studios by id and by lowercase name, and remembers the hierarchy of each studio once it is computed
+    """
 
-    return None
+    def __init__(self, studios: Iterable[Studio]):
+        self.studios = list(studios)
 
+        self._studios_by_id: dict[str, Studio] = {}
+        self._studios_by_name: dict[str, Studio] = {}
 
-def find_studio_with_name(studio_name: str, studios: list[Studio]) -> Optional[Studio]:
-    for studio in studios:
-        if studio.name.lower() == studio_name.lower():
-            return studio
+        # setdefault -> if there are duplicates, the first studio in the list wins (same as a linear scan)
+        for studio in self.studios:
+            self._studios_by_id.setdefault(studio.id, studio)
+            self._studios_by_name.setdefault(studio.name.lower(), studio)
 
-    return None
+        self._hierarchies: dict[str, list[Studio]] = {}
+        self._hierarchy_ids: dict[str, frozenset[str]] = {}
 
+    def __iter__(self):
+        return iter(self.studios)
 
-def get_parent_studio(studio: Studio, studios: list[Studio]) -> Studio:
-    # Get the studio from the list of studios, to ensure we have the full object
-    curr_studio = find_studio_with_id(studio.id, studios)
+    def __len__(self):
+        return len(self.studios)
 
-    # The studio that the caller sent should always be found in the studio list
-    if curr_studio is None:
-        raise ValueError(f"Studio {studio.id} not found in studios list")
+    def find_with_id(self, studio_id: str) -> Optional[Studio]:
+        return self._studios_by_id.get(studio_id)
 
-    # If the studio has a parent, return the parent, otherwise, return itself
-    if not curr_studio.parent_studio:
-        return curr_studio
+    def find_with_name(self, studio_name: str) -> Optional[Studio]:
+        return self._studios_by_name.get(studio_name.lower())
 
-    parent_studio = find_studio_with_id(curr_studio.parent_studio.id, studios)
+    def get_parent(self, studio: Studio | CompactSceneStudio) -> Studio:
+        # Get the studio from the registry, to ensure we have the full object
+        curr_studio = self.find_with_id(studio.id)
 
-    if not parent_studio:
-        raise ValueError(
-            f"Studio {curr_studio.parent_studio.id} not found in studios list"
-        )
+        # The studio that the caller sent should always be found in the registry
+        if curr_studio is None:
+            raise ValueError(f"Studio {studio.id} not found in studios list")
 
-    return parent_studio
+        # If the studio has a parent, return the parent, otherwise, return itself
+        if not curr_studio.parent_studio:
+            return curr_studio
 
+        parent_studio = self.find_with_id(curr_studio.parent_studio.id)
 
-def get_studio_family(studio: Studio, studios: list[Studio]) -> Studio:
-    curr_studio = find_studio_with_id(studio.id, studios)
+        if not parent_studio:
+            raise ValueError(
+                f"Studio {curr_studio.parent_studio.id} not found in studios list"
+            )
 
-    if curr_studio is None:
-        raise ValueError(f"Studio {studio.id} not found in studios list")
+        return parent_studio
 
-    # if you pass a string into a set ie. set("string"), it will create a set of characters ie. {'s', 't', 'r', 'i', 'n', 'g'}
-    # so we need to put the string in an array and then create a set from the array
-    explored_studio_ids = set([curr_studio.id])
+    def get_hierarchy(self, studio: Studio | CompactSceneStudio) -> list[Studio]:
+        """
+        Returns the studios from the top level studio down to the given studio
+        """
 
-    while True:
-        parent_studio = get_parent_studio(curr_studio, studios)
+        if (hierarchy := self._hierarchies.get(studio.id)) is not None:
+            return list(hierarchy)
 
-        if parent_studio.id in explored_studio_ids:
-            return curr_studio
+        curr_studio = self.find_with_id(studio.id)
 
-        explored_studio_ids.add(parent_studio.id)
-        curr_studio = parent_studio
+        if curr_studio is None:
+            raise ValueError(f"Studio '{studio.id}' not found in studios list")
 
+        hierarchy = [curr_studio]
 
-def contains_studio(
-    studio: Studio, target_studio_family: Studio, studios: list[Studio]
-) -> bool:
-    curr_studio = find_studio_with_id(studio.id, studios)
+        # if you pass a string into a set ie. set("string"), it will create a set of characters ie. {'s', 't', 'r', 'i', 'n', 'g'}
+        # so we need to put the string in an array and then create a set from the array
+        explored_studio_ids = set([curr_studio.id])
+
+        while True:
+            parent_studio = self.get_parent(curr_studio)
+
+            if parent_studio.id in explored_studio_ids:
+                break
+
+            hierarchy.append(parent_studio)
+            explored_studio_ids.add(parent_studio.id)
 
-    if curr_studio is None:
-        raise ValueError(f"Studio '{studio.id}' not found in studios list")
+            curr_studio = parent_studio
 
-    studio_family = find_studio_with_id(target_studio_family.id, studios)
+        hierarchy.reverse()
 
-    if studio_family is None:
-        raise ValueError(
-            f"Studio '{target_studio_family.id}' not found in studios list"
-        )
+        self._hierarchies[studio.id] = hierarchy
+        self._hierarchy_ids[studio.id] = frozenset(explored_studio_ids)
 
-    # child studio is the same as the target studio family
-    if curr_studio.id == studio_family.id:
-        return True
+        return list(hierarchy)
 
-    # if you pass a string into a set ie. set("string"), it will create a set of characters ie. {'s', 't', 'r', 'i', 'n', 'g'}
-    # so we need to put the string in an array and then create a set from the array
-    explored_studio_ids = set([curr_studio.id])
+    def get_family(self, studio: Studio | CompactSceneStudio) -> Studio:
+        return self.get_hierarchy(studio)[0]
 
-    while True:
-        curr_studio = get_parent_studio(curr_studio, studios)
+    def contains(
+        self, studio: Studio | CompactSceneStudio, target_studio_family: Studio
+    ) -> bool:
+        if self.find_with_id(studio.id) is None:
+            raise ValueError(f"Studio '{studio.id}' not found in studios list")
 
-        if curr_studio.id == studio_family.id:
-            return True
+        if self.find_with_id(target_studio_family.id) is None:
+            raise ValueError(
+                f"Studio '{target_studio_family.id}' not found in studios list"
+            )
 
-        if curr_studio.id in explored_studio_ids:
-            return False
+        # computes and caches the hierarchy ids
+        self.get_hierarchy(studio)
 
-        explored_studio_ids.add(curr_studio.id)
+        return target_studio_family.id in self._hierarchy_ids[studio.id]
 
 
-def get_studio_hierarchy(studio: Studio, studios: list[Studio]) -> list[Studio]:
-    curr_studio = find_studio_with_id(studio.id, studios)
+def as_studio_registry(studios: list[Studio] | StudioRegistry) -> StudioRegistry:
+    if isinstance(studios, StudioRegistry):
+        return studios
 
-    if curr_studio is None:
-        raise ValueError(f"Studio '{studio.id}' not found in studios list")
+    return StudioRegistry(studios)
 
-    studio_hierarchy = [curr_studio]
 
-    # if you pass a string into a set ie. set("string"), it will create a set of characters ie. {'s', 't', 'r', 'i', 'n', 'g'}
-    # so we need to put the string in an array and then create a set from the array
-    explored_studio_ids = set([curr_studio.id])
+def find_studio_with_id(
+    studio_id: str, studios: list[Studio] | StudioRegistry
+) -> Optional[Studio]:
+    return as_studio_registry(studios).find_with_id(studio_id)
 
-    while True:
-        parent_studio = get_parent_studio(curr_studio, studios)
 
-        if parent_studio.id in explored_studio_ids:
-            break
+def find_studio_with_name(
+    studio_name: str, studios: list[Studio] | StudioRegistry
+) -> Optional[Studio]:
+    return as_studio_registry(studios).find_with_name(studio_name)
 
-        studio_hierarchy.append(parent_studio)
-        explored_studio_ids.add(parent_studio.id)
 
-        curr_studio = parent_studio
+def get_parent_studio(
+    studio: Studio | CompactSceneStudio, studios: list[Studio] | StudioRegistry
+) -> Studio:
+    return as_studio_registry(studios).get_parent(studio)
+
+
+def get_studio_family(
+    studio: Studio | CompactSceneStudio, studios: list[Studio] | StudioRegistry
+) -> Studio:
+    return as_studio_registry(studios).get_family(studio)
+
+
+def contains_studio(
+    studio: Studio | CompactSceneStudio,
+    target_studio_family: Studio,
+    studios: list[Studio] | StudioRegistry,
+) -> bool:
+    return as_studio_registry(studios).contains(studio, target_studio_family)
+
 
-    studio_hierarchy.reverse()
-    return studio_hierarchy
+def get_studio_hierarchy(
+    studio: Studio | CompactSceneStudio, studios: list[Studio] | StudioRegistry
+) -> list[Studio]:
+    return as_studio_registry(studios).get_hierarchy(studio)
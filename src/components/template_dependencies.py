@@ -0,0 +1,110 @@
+from typing import Sequence, TypeVar
+
+from components.template_parser import compile_template
+from models.config import Config, FileDirTemplateConfig, FileNameTemplateConfig
+
+TemplateConfig = TypeVar(
+    "TemplateConfig", FileNameTemplateConfig, FileDirTemplateConfig
+)
+
+# The fields of the Scene.Update hook input that can change the value of each template variable
+# The file variables only change when the primary file of the scene is changed
+TEMPLATE_VARIABLE_INPUT_FIELDS: dict[str, tuple[str, ...]] = {
+    "title": ("title",),
+    "studio": ("studio_id",),
+    "parent_studio": ("studio_id",),
+    "studio_family": ("studio_id",),
+    "studio_hierarchy": ("studio_id",),
+    "performers": ("performer_ids",),
+    "performers_stash_ids": ("performer_ids",),
+    "date": ("date",),
+    "resolution": ("primary_file_id",),
+    "resolution_name": ("primary_file_id",),
+    "duration": ("primary_file_id",),
+    "bit_rate_mbps": ("primary_file_id",),
+    "video_codec": ("primary_file_id",),
+    "audio_codec": ("primary_file_id",),
+    "oshash": ("primary_file_id",),
+    "phash": ("primary_file_id",),
+    "src": ("primary_file_id",),
+    "tags": ("tag_ids",),
+    "movie_scene_number": ("movies", "groups"),
+    "movie_name": ("movies", "groups"),
+    "movie_date": ("movies", "groups"),
+    "scene_stash_id": ("stash_ids",),
+    "studio_code": ("code",),
+    "rating": ("rating100", "rating"),
+}
+
+# The fields of the Scene.Update hook input that can change whether a template filter matches
+TEMPLATE_FILTER_INPUT_FIELDS: dict[str, tuple[str, ...]] = {
+    "matches_studio": ("studio_id",),
+    "matches_part_of_studio": ("studio_id",),
+    "matches_all_tags": ("tag_ids",),
+    "matches_any_tags": ("tag_ids",),
+    "matches_organized_value": ("organized",),
+    "matches_scene_with_no_performers": ("performer_ids",),
+    "matches_src": ("primary_file_id",),
+}
+
+
+def get_file_path_input_fields(config: Config) -> frozenset[str]:
+    """
+    Returns the fields of the Scene.Update hook input that can change the new file path of a scene with the config's templates and filters
+    """
+
+    input_fields: set[str] = set()
+
+    for template_configs in [
+        config.FILE_NAME_CONFIG.FILE_NAME_TEMPLATES,
+        config.FILE_DIR_CONFIG.FILE_DIR_TEMPLATES,
+    ]:
+        for template_config in get_reachable_template_configs(template_configs):
+            input_fields.update(get_template_input_fields(template_config))
+
+    return frozenset(input_fields)
+
+
+def get_template_input_fields(
+    template_config: FileNameTemplateConfig | FileDirTemplateConfig,
+) -> frozenset[str]:
+    """
+    Returns the fields of the Scene.Update hook input that can change the value of the template, or whether it matches a scene
+    """
+
+    input_fields: set[str] = set()
+
+    for variable_name in compile_template(template_config.TEMPLATE).variable_names:
+        input_fields.update(TEMPLATE_VARIABLE_INPUT_FIELDS[variable_name])
+
+    for filter_name, filter_input_fields in TEMPLATE_FILTER_INPUT_FIELDS.items():
+        if is_filter_set(template_config, filter_name):
+            input_fields.update(filter_input_fields)
+
+    return frozenset(input_fields)
+
+
+def get_reachable_template_configs(
+    template_configs: Sequence[TemplateConfig],
+) -> Sequence[TemplateConfig]:
+    """
+    Returns the templates up to the first one matching every scene: the first matching template is used, so the templates after it never are
+    """
+
+    for idx, template_config in enumerate(template_configs):
+        if not any(
+            is_filter_set(template_config, filter_name)
+            for filter_name in TEMPLATE_FILTER_INPUT_FIELDS
+        ):
+            return template_configs[: idx + 1]
+
+    return template_configs
+
+
+def is_filter_set(
+    template_config: FileNameTemplateConfig | FileDirTemplateConfig, filter_name: str
+) -> bool:
+    filter_value = getattr(template_config, filter_name, None)
+
+    # an empty list of tags matches every scene
+    return filter_value is not None and filter_value != []
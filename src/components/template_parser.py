@@ -0,0 +1,92 @@
+import functools
+import re
+from typing import NamedTuple, Optional, Union
+
+# Template variables that accept a strftime format eg. {date:%Y.%m.%d}
+FORMATTABLE_TEMPLATE_VARIABLE_NAMES = ("date", "duration", "movie_date")
+
+TEMPLATE_VARIABLE_NAMES = (
+    "title",
+    "studio",
+    "parent_studio",
+    "studio_family",
+    "performers",
+    "date",
+    "resolution",
+    "resolution_name",
+    "duration",
+    "bit_rate_mbps",
+    "tags",
+    "video_codec",
+    "audio_codec",
+    "movie_scene_number",
+    "movie_name",
+    "movie_date",
+    "scene_stash_id",
+    "performers_stash_ids",
+    "studio_code",
+    "oshash",
+    "phash",
+    "src",
+    "rating",
+    "studio_hierarchy",
+)
+
+TEMPLATE_VARIABLE_PATTERN = re.compile(
+    r"\{(?:(%s)(?::(.+?))?|(%s))\}"
+    % (
+        "|".join(FORMATTABLE_TEMPLATE_VARIABLE_NAMES),
+        "|".join(
+            name
+            for name in TEMPLATE_VARIABLE_NAMES
+            if name not in FORMATTABLE_TEMPLATE_VARIABLE_NAMES
+        ),
+    )
+)
+
+
+class TemplateVariable(NamedTuple):
+    name: str
+    # the strftime format of {date:<format>}, {duration:<format>} and {movie_date:<format>}, otherwise None
+    format_spec: Optional[str] = None
+
+
+class CompiledTemplate(NamedTuple):
+    # literal text and template variables, in the order they appear in the template
+    nodes: tuple[Union[str, TemplateVariable], ...]
+
+    @property
+    def variable_names(self) -> frozenset[str]:
+        return frozenset(
+            node.name for node in self.nodes if isinstance(node, TemplateVariable)
+        )
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_template(template: str) -> CompiledTemplate:
+    """
+    Parses the template into literal text and template variable nodes
+
+    Text in braces that is not a known template variable (eg. "{random}") is kept as literal text
+    """
+
+    nodes: list[Union[str, TemplateVariable]] = []
+    literal_start = 0
+
+    for match in TEMPLATE_VARIABLE_PATTERN.finditer(template):
+        if match.start() > literal_start:
+            nodes.append(template[literal_start : match.start()])
+
+        formattable_name, format_spec, name = match.groups()
+
+        if formattable_name is not None:
+            nodes.append(TemplateVariable(formattable_name, format_spec))
+        else:
+            nodes.append(TemplateVariable(name))
+
+        literal_start = match.end()
+
+    if literal_start < len(template):
+        nodes.append(template[literal_start:])
+
+    return CompiledTemplate(tuple(nodes))
@@ -1,25 +1,61 @@
-import datetime
+from __future__ import annotations
+
+from components.import_timing import enable_import_timing, is_import_timing_enabled
+
+# enabled before the other imports, to time them as well
+if is_import_timing_enabled():
+    enable_import_timing()
+
+import functools
 import json
 import logging
 import os
-import re
 import sys
-from pathlib import Path
-from typing import Optional
-
-import pathvalidate
+from typing import TYPE_CHECKING, Optional
 
 import components.setup_logging
-from components.process_scenes import process_scenes
-from components.stash_db import StashDB
-from components.stash_graphql import StashGraphQL
+from components.daemon_client import connect_to_daemon, forward_to_daemon
+from components.hook_spool import HookSpool, rename_spooled_scenes
+from components.hook_startup_cache import (
+    HOOK_STARTUP_CACHE_PATH,
+    HookStartupSettings,
+    load_hook_startup_settings,
+    save_hook_startup_settings,
+)
+from components.import_timing import drain_import_durations
+from components.instrumentation import (
+    get_run_metrics,
+    report_run_metrics,
+    reset_run_metrics,
+)
+from components.plugin_input import read_plugin_input
+from components.plugin_paths import resolve_plugin_path
 from components.stash_logger import get_stash_logger
-from models.config import Config, FileNameConfig, PerformersConfig, get_config
-from models.scene import Scene, SceneFile, ScenePerformer
-from models.studio import Studio
+
+# The rest of the renamer (pydantic, requests, the models and the config) is imported by the functions using it,
+# so that a hook skipping a scene with the cached hook startup settings does not import it
+if TYPE_CHECKING:
+    from components.renamer_session import RenamerSession
+    from models.config import Config
 
 logger = logging.getLogger(__name__)
 
+_renamer_session: Optional[RenamerSession] = None
+
+# The tasks of the plugin (see renamer-2.yml), and the mode the hooks forward to the renamer daemon
+RUN_MODES = frozenset(
+    [
+        "all_scenes",
+        "plan_all_scenes",
+        "apply_plan",
+        "refresh_studio_cache",
+        "rename_spooled_scenes",
+    ]
+)
+
+# The task or hook run by the plugin input ("hook" for the hooks), the run metrics are written to a file of their own for each mode
+_run_mode = "all_scenes"
+
 
 def optional_chain(root, keys: str):
     result = root
@@ -33,41 +69,560 @@ def optional_chain(root, keys: str):
     return result
 
 
-def rename_all_scenes():
+def get_config() -> Config:
+    from models.config import get_config
+
+    return get_config()
+
+
+def is_config_loaded() -> bool:
+    # models.config is only imported once the config is needed
+    if (config_module := sys.modules.get("models.config")) is None:
+        return False
+
+    return config_module.is_config_loaded()
+
+
+def rename_all_scenes(plan_path: Optional[str] = None):
+    from components.async_stash_graphql import AsyncStashGraphQL, iter_async
+    from components.process_scenes import process_scenes
+    from components.stash_db_reader import StashDBReader
+    from components.stash_graphql import StashGraphQL
+    from components.studio_cache import get_studios
+    from models.config import StashApiConfig, StashDBConfig
+
     logger.info("Renaming all Scenes")
     config = get_config()
-    stash_graphql = StashGraphQL(config.STASH_API_GRAPHQL_URL)
 
-    scenes = stash_graphql.get_all_scenes()
-    studios = stash_graphql.get_all_studios()
+    if plan_path is None:
+        clear_scene_fingerprints()
+    stash_api_config = config.STASH_API_CONFIG or StashApiConfig()
+
+    with StashGraphQL(config.STASH_API_GRAPHQL_URL, stash_api_config) as stash_graphql:
+        with get_run_metrics().time("main.get_studios"):
+            studios = get_studios(stash_graphql, get_studio_cache_path())
+
+        stash_db_config = config.STASH_DB_CONFIG or StashDBConfig()
+
+        if stash_db_config.READ_SCENES_FROM_DB:
+            with StashDBReader(
+                config.STASH_SQLITE_DATABASE_PATH, stash_db_config.BUSY_TIMEOUT
+            ) as stash_db_reader:
+                with get_run_metrics().time("main.get_scene_count"):
+                    scene_count = stash_db_reader.get_scene_count()
+                logger.info("Found %s scenes in the stash db", scene_count)
+
+                scenes = stash_db_reader.iter_all_scenes(
+                    stash_api_config.SCENES_PER_PAGE
+                )
+
+                process_scenes(scenes, studios, scene_count, plan_path)
+        else:
+            with get_run_metrics().time("main.get_scene_count"):
+                scene_count = stash_graphql.get_scene_count()
+            logger.info("Found %s scenes", scene_count)
+
+            # the next pages are fetched concurrently while the scenes of the current page are renamed
+            async_stash_graphql = AsyncStashGraphQL(
+                stash_graphql, stash_api_config.MAX_CONCURRENT_REQUESTS
+            )
+            scenes = (
+                scene
+                for page_scenes in iter_async(
+                    async_stash_graphql.get_all_scenes(stash_api_config.SCENES_PER_PAGE)
+                )
+                for scene in page_scenes
+            )
+
+            process_scenes(scenes, studios, scene_count, plan_path)
 
-    process_scenes(scenes, studios)
     logger.info("Finished Renaming all Scenes")
 
 
-def rename_scenes(scene_ids: list[int]):
-    logger.info("Renaming Scenes with IDs: %s", scene_ids)
+def get_studio_cache_path() -> Optional[str]:
+    from models.config import StashApiConfig
+
+    stash_api_config = get_config().STASH_API_CONFIG or StashApiConfig()
+
+    if stash_api_config.STUDIO_CACHE_PATH is None:
+        return None
+
+    return resolve_plugin_path(stash_api_config.STUDIO_CACHE_PATH)
+
+
+def refresh_studio_cache():
+    from components.stash_graphql import StashGraphQL
+    from components.studio_cache import get_studios
+    from models.config import StashApiConfig
+
+    logger.info("Refreshing the studio cache")
     config = get_config()
-    stash_graphql = StashGraphQL(config.STASH_API_GRAPHQL_URL)
+    stash_api_config = config.STASH_API_CONFIG or StashApiConfig()
+
+    if (studio_cache_path := get_studio_cache_path()) is None:
+        logger.info("The studio cache is disabled")
+        return
+
+    with StashGraphQL(config.STASH_API_GRAPHQL_URL, stash_api_config) as stash_graphql:
+        studios = get_studios(stash_graphql, studio_cache_path, refresh=True)
+
+    logger.info("Cached %d studios", len(studios))
+
+
+def get_rename_plan_path():
+    from models.config import ProcessingConfig
+
+    processing_config = get_config().PROCESSING_CONFIG or ProcessingConfig()
+
+    return resolve_plugin_path(processing_config.RENAME_PLAN_PATH)
+
+
+def get_run_metrics_path() -> Optional[str]:
+    "The path of the run metrics file of the current run mode"
+
+    if (run_metrics_path := get_run_metrics_path_template()) is None:
+        return None
+
+    return run_metrics_path.replace("{mode}", _run_mode)
+
+
+def get_run_metrics_path_template() -> Optional[str]:
+    # a hook skipped with the cached settings did not load the config
+    if (hook_startup_settings := get_hook_startup_settings()) is not None:
+        return hook_startup_settings.run_metrics_path
+
+    # the run failed before the config was loaded (eg. an invalid config), the metrics are only logged
+    if not is_config_loaded():
+        return None
+
+    from models.config import ProcessingConfig
+
+    processing_config = get_config().PROCESSING_CONFIG or ProcessingConfig()
+
+    if processing_config.RUN_METRICS_PATH is None:
+        return None
+
+    return resolve_plugin_path(processing_config.RUN_METRICS_PATH)
+
+
+def plan_all_scenes():
+    plan_path = get_rename_plan_path()
+    logger.info("Planning renames of all Scenes to '%s'", plan_path)
 
-    scenes: list[Scene] = []
-    for scene_id in scene_ids:
-        scenes.append(stash_graphql.get_scene_with_id(scene_id))
+    rename_all_scenes(plan_path)
 
-    studios = stash_graphql.get_all_studios()
 
-    process_scenes(scenes, studios)
+def apply_plan():
+    from components.process_scenes import apply_rename_plan
+
+    plan_path = get_rename_plan_path()
+    logger.info("Applying rename plan '%s'", plan_path)
+
+    clear_scene_fingerprints()
+    apply_rename_plan(plan_path)
+
+    logger.info("Finished Applying rename plan")
+
+
+def rename_scenes(scene_ids: list[int], single_transaction: bool = False) -> set[int]:
+    """
+    Returns the ids of the scenes whose files were all renamed (or did not need to be renamed)
+
+    With `single_transaction`, the renames are committed to the stash db in one transaction (eg. for a batch of coalesced hooks)
+    """
+
+    import asyncio
+
+    from components.process_scenes import process_scenes
+
+    logger.info("Renaming Scenes with IDs: %s", scene_ids)
+    renamer_session = get_renamer_session()
+
+    studios, scenes = asyncio.run(fetch_studios_and_scenes(renamer_session, scene_ids))
+
+    renamed_scene_ids = process_scenes(
+        scenes,
+        studios,
+        len(scene_ids),
+        template_matchers=renamer_session.get_template_matchers(studios),
+        single_transaction=single_transaction,
+    )
+
     logger.info("Finished Renaming Scenes with IDs: %s", scene_ids)
 
+    return {int(scene_id) for scene_id in renamed_scene_ids}
+
+
+async def fetch_studios_and_scenes(
+    renamer_session: RenamerSession, scene_ids: list[int]
+):
+    """
+    Fetches the studios and the chunks of scenes concurrently
+    """
+
+    import asyncio
+
+    from components.async_stash_graphql import AsyncStashGraphQL
+
+    stash_api_config = renamer_session.stash_api_config
+    async_stash_graphql = AsyncStashGraphQL(
+        renamer_session.stash_graphql, stash_api_config.MAX_CONCURRENT_REQUESTS
+    )
+
+    def get_studios_with_metrics():
+        with get_run_metrics().time("main.get_studios"):
+            return renamer_session.get_studios()
+
+    return await asyncio.gather(
+        async_stash_graphql.run(get_studios_with_metrics),
+        async_stash_graphql.get_scenes_with_ids(
+            scene_ids, stash_api_config.SCENE_IDS_PER_REQUEST
+        ),
+    )
+
+
+def get_renamer_session() -> RenamerSession:
+    "The session renaming scenes by id, created once per process (and kept between hooks by the renamer daemon)"
+
+    from components.renamer_session import RenamerSession
+
+    global _renamer_session
+
+    if _renamer_session is None:
+        _renamer_session = RenamerSession(get_config(), get_studio_cache_path())
+
+    return _renamer_session
+
+
+def close_renamer_session():
+    global _renamer_session
+
+    if _renamer_session is not None:
+        _renamer_session.close()
+        _renamer_session = None
+
+
+def rename_updated_scene(scene_id: int, updated_fields: list[str]):
+    """
+    Renames the scene updated in Stash, unless none of the updated fields can change its file path
+    """
+
+    from components.scene_fingerprints import hash_config, is_scene_unchanged
+    from components.template_dependencies import get_file_path_input_fields
+    from models.config import HookConfig
+
+    config = get_config()
+    hook_config = config.HOOK_CONFIG or HookConfig()
+
+    if not hook_config.SKIP_UNCHANGED_SCENES:
+        rename_hook_scenes([scene_id])
+        return
+
+    file_path_input_fields = get_file_path_input_fields(config)
+
+    if file_path_input_fields.isdisjoint(updated_fields):
+        logger.info(
+            "None of the updated fields are used by the templates, skipping scene %s",
+            scene_id,
+        )
+        return
+
+    if is_scene_unchanged(
+        resolve_plugin_path(hook_config.SCENE_FINGERPRINTS_PATH),
+        hash_config(config),
+        config.STASH_SQLITE_DATABASE_PATH,
+        scene_id,
+        file_path_input_fields,
+    ):
+        logger.info(
+            "The values used by the templates did not change, skipping scene %s",
+            scene_id,
+        )
+        return
+
+    rename_hook_scenes([scene_id])
+
+
+def rename_updated_scenes(scene_ids: list[int], updated_fields: list[str]):
+    """
+    Renames the scenes updated at once in Stash, unless none of the updated fields can change their file path
+    """
+
+    from components.template_dependencies import get_file_path_input_fields
+    from models.config import HookConfig
+
+    config = get_config()
+    hook_config = config.HOOK_CONFIG or HookConfig()
+
+    # the bulk update input holds changes (eg. tags to add) rather than values, so only the updated fields are checked
+    if hook_config.SKIP_UNCHANGED_SCENES and get_file_path_input_fields(
+        config
+    ).isdisjoint(updated_fields):
+        logger.info(
+            "None of the updated fields are used by the templates, skipping scenes %s",
+            scene_ids,
+        )
+        return
+
+    rename_hook_scenes(scene_ids)
+
+
+def rename_hook_scenes(scene_ids: list[int]):
+    """
+    Renames the scenes updated by a hook. With HOOK_CONFIG.COALESCE_WINDOW_MS, the scenes are spooled
+    and renamed in a batch with the scenes of the hooks fired within the window
+    """
+
+    from models.config import HookConfig
+
+    hook_config = get_config().HOOK_CONFIG or HookConfig()
+
+    if hook_config.COALESCE_WINDOW_MS is None:
+        rename_scenes_and_update_fingerprints(scene_ids)
+        return
+
+    spool_hook_scenes(resolve_plugin_path(hook_config.HOOK_SPOOL_PATH), scene_ids)
+
+    rename_spooled_hook_scenes()
+
+
+def spool_hook_scenes(hook_spool_path: str, scene_ids: list[int]):
+    logger.info("Spooling scenes %s", scene_ids)
+
+    with HookSpool(hook_spool_path) as hook_spool:
+        hook_spool.add(scene_ids)
+
+
+def rename_spooled_hook_scenes():
+    """
+    Renames the spooled scenes in batches if this hook is the first of a burst, returns right away otherwise
+    """
+
+    from models.config import HookConfig
+
+    hook_config = get_config().HOOK_CONFIG or HookConfig()
+    hook_spool_path = resolve_plugin_path(hook_config.HOOK_SPOOL_PATH)
+
+    with HookSpool(hook_spool_path) as hook_spool:
+        rename_spooled_scenes(
+            hook_spool,
+            f"{hook_spool_path}.lock",
+            (hook_config.COALESCE_WINDOW_MS or 0) / 1000,
+            # one stash db transaction per batch, whatever the commit batch size of the full runs is
+            functools.partial(
+                rename_scenes_and_update_fingerprints, single_transaction=True
+            ),
+        )
+
+
+def rename_scenes_and_update_fingerprints(
+    scene_ids: list[int], single_transaction: bool = False
+):
+    """
+    Renames the scenes, then records the fingerprints of the renamed scenes so that the next hooks skip them until the values their file path is made of change
+    """
+
+    from components.scene_fingerprints import (
+        SceneFingerprintStore,
+        hash_config,
+        record_scene_fingerprints,
+    )
+    from components.template_dependencies import get_file_path_input_fields
+    from models.config import HookConfig
+
+    config = get_config()
+    hook_config = config.HOOK_CONFIG or HookConfig()
+
+    if not hook_config.SKIP_UNCHANGED_SCENES:
+        rename_scenes(scene_ids, single_transaction)
+        return
+
+    scene_fingerprints_path = resolve_plugin_path(hook_config.SCENE_FINGERPRINTS_PATH)
+    config_hash = hash_config(config)
+
+    # a scene whose rename fails (or is interrupted) is not skipped by the next hooks
+    scene_fingerprints = SceneFingerprintStore(scene_fingerprints_path, config_hash)
+
+    try:
+        scene_fingerprints.delete(scene_ids)
+    finally:
+        scene_fingerprints.close()
+
+    renamed_scene_ids = rename_scenes(scene_ids, single_transaction)
+
+    # the scenes with a file that failed to be renamed are renamed again by the next hooks
+    record_scene_fingerprints(
+        scene_fingerprints_path,
+        config_hash,
+        config.STASH_SQLITE_DATABASE_PATH,
+        [scene_id for scene_id in scene_ids if scene_id in renamed_scene_ids],
+        get_file_path_input_fields(config),
+    )
+
+
+def clear_scene_fingerprints():
+    """
+    Drops the fingerprints of all the scenes, before a run that may rename any of them
+    """
+
+    from components.scene_fingerprints import SceneFingerprintStore, hash_config
+    from models.config import HookConfig
+
+    config = get_config()
+    hook_config = config.HOOK_CONFIG or HookConfig()
+    scene_fingerprints_path = resolve_plugin_path(hook_config.SCENE_FINGERPRINTS_PATH)
+
+    if not os.path.exists(scene_fingerprints_path):
+        return
+
+    scene_fingerprints = SceneFingerprintStore(
+        scene_fingerprints_path, hash_config(config)
+    )
+
+    try:
+        scene_fingerprints.clear()
+    finally:
+        scene_fingerprints.close()
+
+
+def get_hook_scene_ids(hook_input: dict, updated_fields: list[str]) -> list[int]:
+    if "id" in updated_fields:
+        return [int(hook_input["id"])]
+    elif "ids" in updated_fields:
+        return [int(scene_id) for scene_id in hook_input["ids"]]
+    else:
+        raise ValueError("id or ids not in inputFields")
+
+
+@functools.cache
+def get_hook_startup_settings() -> Optional[HookStartupSettings]:
+    return load_hook_startup_settings(resolve_plugin_path(HOOK_STARTUP_CACHE_PATH))
+
+
+def cache_hook_startup_settings():
+    """
+    Caches the settings the next hooks need to skip a scene, derived from the config
+    """
+
+    from components.scene_fingerprints import hash_config
+    from components.template_dependencies import get_file_path_input_fields
+    from models.config import HookConfig
+
+    config = get_config()
+    hook_config = config.HOOK_CONFIG or HookConfig()
+
+    if not hook_config.CACHE_STARTUP_SETTINGS:
+        return
+
+    save_hook_startup_settings(
+        resolve_plugin_path(HOOK_STARTUP_CACHE_PATH),
+        HookStartupSettings(
+            skip_unchanged_scenes=hook_config.SKIP_UNCHANGED_SCENES,
+            file_path_input_fields=get_file_path_input_fields(config),
+            scene_fingerprints_path=resolve_plugin_path(
+                hook_config.SCENE_FINGERPRINTS_PATH
+            ),
+            config_hash=hash_config(config),
+            stash_db_path=config.STASH_SQLITE_DATABASE_PATH,
+            run_metrics_path=get_run_metrics_path_template(),
+            daemon_socket_path=(
+                resolve_plugin_path(hook_config.DAEMON_SOCKET_PATH)
+                if hook_config.DAEMON_ENABLED
+                else None
+            ),
+            hook_spool_path=(
+                resolve_plugin_path(hook_config.HOOK_SPOOL_PATH)
+                if hook_config.COALESCE_WINDOW_MS is not None
+                else None
+            ),
+        ),
+    )
+
+
+def skip_updated_scenes_with_cached_settings(
+    hook_input: dict, updated_fields: list[str]
+) -> Optional[bool]:
+    """
+    Returns True if none of the updated fields can change the file path of the updated scenes (or their values did not change),
+    checked with the cached hook startup settings instead of the config. Returns None if the settings are not cached
+    """
+
+    if (hook_startup_settings := get_hook_startup_settings()) is None:
+        return None
+
+    if not hook_startup_settings.skip_unchanged_scenes:
+        return False
+
+    if hook_startup_settings.file_path_input_fields.isdisjoint(updated_fields):
+        logger.info(
+            "None of the updated fields are used by the templates, skipping scenes %s",
+            hook_input.get("id", hook_input.get("ids")),
+        )
+        return True
+
+    # the bulk update input holds changes rather than values
+    if "id" not in updated_fields:
+        return False
+
+    from components.scene_fingerprints import is_scene_unchanged
+
+    scene_id = int(hook_input["id"])
+
+    if is_scene_unchanged(
+        hook_startup_settings.scene_fingerprints_path,
+        hook_startup_settings.config_hash,
+        hook_startup_settings.stash_db_path,
+        scene_id,
+        hook_startup_settings.file_path_input_fields,
+    ):
+        logger.info(
+            "The values used by the templates did not change, skipping scene %s",
+            scene_id,
+        )
+        return True
+
+    return False
+
 
 def main():
+    reset_run_metrics()
+
+    try:
+        run()
+    finally:
+        close_renamer_session()
+
+        if is_import_timing_enabled():
+            for timer_name, durations in drain_import_durations().items():
+                for seconds in durations:
+                    get_run_metrics().record(timer_name, seconds)
+
+        # an error reporting the metrics does not replace the error of the run, nor fails a run that succeeded
+        try:
+            report_run_metrics(get_run_metrics_path())
+        except Exception:
+            logger.warning("Error reporting the run metrics", exc_info=True)
+
+
+def run():
     # Log to StashApp
     stash_logger = get_stash_logger()
     stash_logger.debug("Starting Renamer 2")
     logger.info("Starting Renamer 2")
 
-    # Get args from StashApp
-    stashPluginInput = sys.stdin.read()
+    # Get args from StashApp, without the cover image and the details of the hook input
+    with get_run_metrics().time("main.read_plugin_input"):
+        stashPluginInput = read_plugin_input(sys.stdin)
+
+    handle_plugin_input(stashPluginInput)
+
+
+def handle_plugin_input(stashPluginInput: str, forward_hooks: bool = True):
+    """
+    Runs the task or the hook of the plugin input (as read by `read_plugin_input`). If `forward_hooks` is True, the hooks are forwarded to the renamer daemon when it is enabled
+    """
+
+    global _run_mode
 
     if stashPluginInput.strip() == "":
         rename_all_scenes()
@@ -75,34 +630,67 @@ def main():
 
     stashPluginArgs = json.loads(stashPluginInput)
 
-    if (
-        optional_chain(stashPluginArgs, "args.hookContext.input.cover_image")
-        is not None
-    ):
-        stashPluginArgs["args"]["hookContext"]["input"][
-            "cover_image"
-        ] = "--- REDACTED ---"
-
-    if optional_chain(stashPluginArgs, "args.hookContext.input.details") is not None:
-        stashPluginArgs["args"]["hookContext"]["input"]["details"] = "--- REDACTED ---"
+    if optional_chain(stashPluginArgs, "args.hookContext") is not None:
+        _run_mode = "hook"
+    elif (run_mode := optional_chain(stashPluginArgs, "args.mode")) in RUN_MODES:
+        _run_mode = run_mode
 
-    logger.debug(f"stashPluginArgs: {stashPluginArgs}")
+    logger.debug("stashPluginArgs: %s", stashPluginArgs)
 
     if optional_chain(stashPluginArgs, "args.mode") == "all_scenes":
         rename_all_scenes()
         return
 
+    if optional_chain(stashPluginArgs, "args.mode") == "plan_all_scenes":
+        plan_all_scenes()
+        return
+
+    if optional_chain(stashPluginArgs, "args.mode") == "apply_plan":
+        apply_plan()
+        return
+
+    if optional_chain(stashPluginArgs, "args.mode") == "refresh_studio_cache":
+        refresh_studio_cache()
+        return
+
+    # sent to the renamer daemon by the hooks that spooled their scenes
+    if optional_chain(stashPluginArgs, "args.mode") == "rename_spooled_scenes":
+        rename_spooled_hook_scenes()
+        return
+
     if optional_chain(stashPluginArgs, "args.hookContext.inputFields") is not None:
         inputFields = stashPluginArgs["args"]["hookContext"]["inputFields"]
 
+        skipped = skip_updated_scenes_with_cached_settings(
+            stashPluginArgs["args"]["hookContext"]["input"], inputFields
+        )
+
+        if skipped:
+            return
+
+        if skipped is None:
+            cache_hook_startup_settings()
+        elif (
+            forward_hooks
+            and (daemon_socket_path := get_hook_startup_settings().daemon_socket_path)
+            is not None
+            and forward_hook_to_daemon(
+                daemon_socket_path,
+                stashPluginInput,
+                stashPluginArgs["args"]["hookContext"]["input"],
+                inputFields,
+            )
+        ):
+            return
+
         if "id" in inputFields:
             scene_id = int(stashPluginArgs["args"]["hookContext"]["input"]["id"])
-            rename_scenes([scene_id])
+            rename_updated_scene(scene_id, inputFields)
             return
         elif "ids" in inputFields:
             scene_ids = stashPluginArgs["args"]["hookContext"]["input"]["ids"]
             scene_ids = [int(scene_id) for scene_id in scene_ids]
-            rename_scenes(scene_ids)
+            rename_updated_scenes(scene_ids, inputFields)
             return
         else:
             raise ValueError("id or ids not in inputFields")
@@ -111,5 +699,65 @@ def main():
     return
 
 
+def forward_hook_to_daemon(
+    daemon_socket_path: str,
+    stashPluginInput: str,
+    hook_input: dict,
+    updated_fields: list[str],
+) -> bool:
+    """
+    Forwards the hook to the renamer daemon, returns False if the hook should run on its own process instead.
+    When the hooks are coalesced, the scenes are spooled before waiting for the daemon, so that the daemon
+    renames them in the batch of the hook it is running (the daemon runs the hooks one at a time)
+    """
+
+    hook_startup_settings = get_hook_startup_settings()
+
+    if (hook_spool_path := hook_startup_settings.hook_spool_path) is None:
+        return forward_to_daemon(daemon_socket_path, stashPluginInput)
+
+    spool_hook_scenes(hook_spool_path, get_hook_scene_ids(hook_input, updated_fields))
+
+    # a hook run on its own process renames the spooled scenes (after spooling them again)
+    return forward_to_daemon(
+        daemon_socket_path, json.dumps({"args": {"mode": "rename_spooled_scenes"}})
+    )
+
+
+def serve_daemon():
+    """
+    Runs the renamer daemon, until it has been idle for HOOK_CONFIG.DAEMON_IDLE_TIMEOUT seconds or the config changed
+    """
+
+    # imported before the first hook
+    import components.process_scenes
+    from components.renamer_daemon import RenamerDaemon, daemon_socket_lock
+    from models.config import HookConfig
+
+    hook_config = get_config().HOOK_CONFIG or HookConfig()
+    socket_path = resolve_plugin_path(hook_config.DAEMON_SOCKET_PATH)
+
+    with daemon_socket_lock(socket_path):
+        # another hook started a daemon at the same time
+        if (conn := connect_to_daemon(socket_path)) is not None:
+            conn.close()
+            return
+
+        daemon = RenamerDaemon(
+            socket_path,
+            functools.partial(handle_plugin_input, forward_hooks=False),
+            hook_config.DAEMON_IDLE_TIMEOUT,
+        )
+
+    try:
+        with daemon:
+            daemon.serve_until_stopped()
+    finally:
+        close_renamer_session()
+
+
 if __name__ == "__main__":
-    main()
+    if sys.argv[1:] == ["--daemon"]:
+        serve_daemon()
+    else:
+        main()
@@ -0,0 +1,262 @@
+from __future__ import annotations
+
+import datetime
+from dataclasses import dataclass, field
+from typing import Optional
+
+from pydantic.datetime_parse import parse_date, parse_time
+
+from models.scene import (
+    PerformerGenderEnum,
+    Scene,
+    SceneFileFingerprintTypeEnum,
+    get_resolution_name,
+)
+
+# Slotted, validated once scene models for the rename hot path
+#
+# They have the same attributes as the pydantic models in models/scene.py, but are built directly from the GraphQL JSON
+# (or from a pydantic Scene), and the derived attributes (eg. SceneFile.oshash) are computed once when the model is built.
+
+
+def parse_optional_date(value) -> Optional[datetime.date]:
+    if value is None or value == "":
+        return None
+
+    return parse_date(value)
+
+
+@dataclass(slots=True)
+class CompactStashId:
+    endpoint: str
+    stash_id: str
+
+    @staticmethod
+    def from_dict(stash_id_dict: dict) -> CompactStashId:
+        return CompactStashId(
+            endpoint=str(stash_id_dict["endpoint"]),
+            stash_id=str(stash_id_dict["stash_id"]),
+        )
+
+
+@dataclass(slots=True)
+class CompactSceneStudio:
+    id: str
+    name: str
+
+    @staticmethod
+    def from_dict(studio_dict: dict) -> CompactSceneStudio:
+        return CompactSceneStudio(
+            id=str(studio_dict["id"]), name=str(studio_dict["name"])
+        )
+
+
+@dataclass(slots=True)
+class CompactSceneTag:
+    id: int
+    name: str
+
+    @staticmethod
+    def from_dict(tag_dict: dict) -> CompactSceneTag:
+        return CompactSceneTag(id=int(tag_dict["id"]), name=str(tag_dict["name"]))
+
+
+@dataclass(slots=True)
+class CompactScenePerformer:
+    id: int
+    name: str
+    favorite: bool
+    gender: Optional[PerformerGenderEnum]
+    rating100: Optional[int]
+    stash_ids: list[CompactStashId]
+
+    stash_id: Optional[str] = field(init=False)
+
+    def __post_init__(self):
+        self.stash_id = self.stash_ids[0].stash_id if self.stash_ids else None
+
+    @property
+    def rating(self):
+        return self.rating100
+
+    @staticmethod
+    def from_dict(performer_dict: dict) -> CompactScenePerformer:
+        gender = performer_dict.get("gender")
+        rating100 = performer_dict.get("rating100")
+
+        return CompactScenePerformer(
+            id=int(performer_dict["id"]),
+            name=str(performer_dict["name"]),
+            favorite=bool(performer_dict["favorite"]),
+            gender=PerformerGenderEnum(gender) if gender else None,
+            rating100=int(rating100) if rating100 is not None else None,
+            stash_ids=[
+                CompactStashId.from_dict(stash_id_dict)
+                for stash_id_dict in performer_dict["stash_ids"]
+            ],
+        )
+
+
+@dataclass(slots=True)
+class CompactSceneMovie:
+    id: int
+    name: str
+    date: Optional[datetime.date]
+    scene_index: Optional[int]
+
+    @staticmethod
+    def from_dict(scene_movie_dict: dict) -> CompactSceneMovie:
+        movie_dict = scene_movie_dict["movie"]
+        scene_index = scene_movie_dict.get("scene_index")
+
+        return CompactSceneMovie(
+            id=int(movie_dict["id"]),
+            name=str(movie_dict["name"]),
+            date=parse_optional_date(movie_dict.get("date")),
+            scene_index=int(scene_index) if scene_index is not None else None,
+        )
+
+
+@dataclass(slots=True)
+class CompactSceneFile:
+    id: str
+    path: str
+    basename: str
+    width: int
+    height: int
+    video_codec: str
+    audio_codec: str
+    frame_rate: float
+    duration: datetime.time
+    bit_rate: int
+    parent_folder_id: int
+
+    extension: str = field(init=False)
+    bit_rate_mbps: str = field(init=False)
+    resolution: str = field(init=False)
+    resolution_name: str = field(init=False)
+    oshash: Optional[str] = field(init=False, default=None)
+    phash: Optional[str] = field(init=False, default=None)
+
+    def __post_init__(self):
+        self.extension = self.basename.split(".")[-1]
+        self.bit_rate_mbps = str(round(self.bit_rate / 1000000, 2))
+        self.resolution = f"{self.height}p"
+        self.resolution_name = get_resolution_name(self.width, self.height)
+
+    @staticmethod
+    def from_dict(file_dict: dict) -> CompactSceneFile:
+        file = CompactSceneFile(
+            id=str(file_dict["id"]),
+            path=str(file_dict["path"]),
+            basename=str(file_dict["basename"]),
+            width=int(file_dict["width"]),
+            height=int(file_dict["height"]),
+            video_codec=str(file_dict["video_codec"]),
+            audio_codec=str(file_dict["audio_codec"]),
+            frame_rate=float(file_dict["frame_rate"]),
+            duration=parse_time(file_dict["duration"]),
+            bit_rate=int(file_dict["bit_rate"]),
+            parent_folder_id=int(file_dict["parent_folder_id"]),
+        )
+
+        # the first fingerprint of each type, like SceneFile.oshash and SceneFile.phash
+        for fingerprint_dict in reversed(file_dict.get("fingerprints", [])):
+            fingerprint_type = SceneFileFingerprintTypeEnum(fingerprint_dict["type"])
+
+            if fingerprint_type == SceneFileFingerprintTypeEnum.OSHASH:
+                file.oshash = str(fingerprint_dict["value"])
+            elif fingerprint_type == SceneFileFingerprintTypeEnum.PHASH:
+                file.phash = str(fingerprint_dict["value"])
+
+        return file
+
+
+@dataclass(slots=True)
+class CompactScene:
+    id: str
+    title: Optional[str]
+    date: Optional[datetime.date]
+    studio: Optional[CompactSceneStudio]
+    performers: list[CompactScenePerformer]
+    rating100: Optional[int]
+    organized: bool
+    code: Optional[str]
+    tags: list[CompactSceneTag]
+    files: list[CompactSceneFile]
+    movies: list[CompactSceneMovie]
+    stash_ids: list[CompactStashId]
+
+    stash_id: Optional[str] = field(init=False)
+    movie_name: Optional[str] = field(init=False)
+    movie_date: Optional[datetime.date] = field(init=False)
+    movie_scene_number: Optional[int] = field(init=False)
+
+    def __post_init__(self):
+        self.stash_id = self.stash_ids[0].stash_id if self.stash_ids else None
+
+        first_movie = self.movies[0] if self.movies else None
+        self.movie_name = first_movie.name if first_movie else None
+        self.movie_date = first_movie.date if first_movie else None
+        self.movie_scene_number = first_movie.scene_index if first_movie else None
+
+    @property
+    def rating(self):
+        return self.rating100
+
+    @property
+    def studio_code(self):
+        return self.code
+
+    @staticmethod
+    def from_dict(scene_dict: dict) -> CompactScene:
+        """
+        Builds the scene from the GraphQL JSON (or a pydantic Scene's dict), raises a KeyError, TypeError or ValueError if it is not valid
+        """
+
+        studio_dict = scene_dict.get("studio")
+        rating100 = scene_dict.get("rating100")
+
+        return CompactScene(
+            id=str(scene_dict["id"]),
+            title=scene_dict.get("title", ""),
+            date=parse_optional_date(scene_dict.get("date")),
+            studio=(
+                CompactSceneStudio.from_dict(studio_dict)
+                if studio_dict is not None
+                else None
+            ),
+            performers=[
+                CompactScenePerformer.from_dict(performer_dict)
+                for performer_dict in scene_dict["performers"]
+            ],
+            rating100=int(rating100) if rating100 is not None else None,
+            organized=bool(scene_dict["organized"]),
+            code=scene_dict.get("code"),
+            tags=[
+                CompactSceneTag.from_dict(tag_dict) for tag_dict in scene_dict["tags"]
+            ],
+            files=[
+                CompactSceneFile.from_dict(file_dict)
+                for file_dict in scene_dict["files"]
+            ],
+            movies=[
+                CompactSceneMovie.from_dict(scene_movie_dict)
+                for scene_movie_dict in scene_dict["movies"]
+            ],
+            stash_ids=[
+                CompactStashId.from_dict(stash_id_dict)
+                for stash_id_dict in scene_dict["stash_ids"]
+            ],
+        )
+
+    @staticmethod
+    def from_scene(scene: Scene) -> CompactScene:
+        return CompactScene.from_dict(scene.dict())
+
+
+def as_compact_scene(scene: Scene | CompactScene) -> CompactScene:
+    if isinstance(scene, CompactScene):
+        return scene
+
+    return CompactScene.from_scene(scene)
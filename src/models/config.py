@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import importlib
 from typing import Literal, Optional
 
 from pydantic import BaseModel, Extra
@@ -9,7 +10,7 @@ from models.template_variables_config import (
     SceneTitleConfig,
     TemplateVariablesConfig,
 )
-from user_config import user_config
+import user_config as user_config_module
 
 
 class Config(BaseModel, validate_assignment=True, extra=Extra.forbid):
@@ -21,6 +22,10 @@ class Config(BaseModel, validate_assignment=True, extra=Extra.forbid):
     FILE_DIR_CONFIG: FileDirConfig
     TEMPLATE_VARIABLES_CONFIG: TemplateVariablesConfig
     PATH_CONFIG: PathConfig
+    STASH_API_CONFIG: Optional[StashApiConfig] = None
+    PROCESSING_CONFIG: Optional[ProcessingConfig] = None
+    STASH_DB_CONFIG: Optional[StashDBConfig] = None
+    HOOK_CONFIG: Optional[HookConfig] = None
 
 
 class FileNameConfig(BaseModel, validate_assignment=True, extra=Extra.forbid):
@@ -60,6 +65,80 @@ class PathConfig(BaseModel, validate_assignment=True, extra=Extra.forbid):
     TEMPLATE_VARIABLE_REMOVAL_ORDER: list[str] = []
 
 
+class StashApiConfig(BaseModel, validate_assignment=True, extra=Extra.forbid):
+    # Number of scenes requested per findScenes page when renaming all scenes
+    SCENES_PER_PAGE: int = 500
+    # Number of scenes requested at once when renaming scenes by id (eg. after a bulk edit in Stash)
+    SCENE_IDS_PER_REQUEST: int = 100
+    # Max number of connections kept open to the Stash GraphQL API
+    POOL_SIZE: int = 4
+    # Max number of requests sent at the same time when renaming scenes by id, and of pages requested ahead when renaming all scenes (should not be more than POOL_SIZE)
+    MAX_CONCURRENT_REQUESTS: int = 4
+    # Seconds to wait for a connection to / a response from the Stash GraphQL API (None -> wait forever)
+    CONNECT_TIMEOUT: Optional[float] = 10
+    READ_TIMEOUT: Optional[float] = 300
+    # If set to True, request bodies are gzip compressed (requires a server that accepts "Content-Encoding: gzip")
+    GZIP_REQUESTS: bool = False
+    # If set to True, the server is allowed to gzip compress its responses
+    GZIP_RESPONSES: bool = True
+    # Path of the file caching the studios between runs (relative to the plugin folder, None -> fetch all studios on every run)
+    # The cache is refreshed when a studio was created, updated or deleted since it was written
+    STUDIO_CACHE_PATH: Optional[str] = "studio_cache.json"
+
+
+class ProcessingConfig(BaseModel, validate_assignment=True, extra=Extra.forbid):
+    # If set to True, planning new file paths, moving files and updating the stash db run concurrently
+    PIPELINE_ENABLED: bool = False
+    # Max number of items waiting between two pipeline stages
+    PIPELINE_QUEUE_SIZE: int = 100
+    # Number of processes planning the new file paths (1 -> plan on the current process)
+    PLANNER_WORKERS: int = 1
+    # Number of scenes sent to a planner process at once
+    PLANNER_CHUNK_SIZE: int = 50
+    # Path of the rename plan file written by the "Plan" task and applied by the "Apply Plan" task (relative to the plugin folder)
+    RENAME_PLAN_PATH: str = "rename_plan.jsonl"
+    # Path of the JSON file the timers and counters of the last run are written to, for debugging (relative to the plugin folder, None -> only written to the log)
+    # {mode} is replaced by the task or hook that ran (eg. "all_scenes", "apply_plan", "hook"), so a hook does not overwrite the metrics of the last task
+    # eg. "run_metrics.{mode}.json"
+    RUN_METRICS_PATH: Optional[str] = None
+
+
+class StashDBConfig(BaseModel, validate_assignment=True, extra=Extra.forbid):
+    # Number of renamed files committed to the stash db per transaction (None -> a single transaction for the whole run)
+    # If a transaction fails, the files of the whole transaction are moved back to their original path
+    COMMIT_BATCH_SIZE: Optional[int] = 1
+    # Seconds to wait for a lock on the stash db (eg. while Stash is writing to it) before failing
+    BUSY_TIMEOUT: float = 30
+    # If set to True, all the folders of the stash db are loaded with one query when connecting, instead of being looked up one at a time
+    PRELOAD_FOLDERS: bool = False
+    # If set to True, the "Run" task reads the scenes straight from the stash db (opened read-only) instead of the GraphQL API
+    # The studios are still read from the GraphQL API
+    READ_SCENES_FROM_DB: bool = False
+
+
+class HookConfig(BaseModel, validate_assignment=True, extra=Extra.forbid):
+    # If set to True, the Scene.Update hook does not rename a scene when none of the updated fields are used by the templates and filters,
+    # or when the values they resolve to in the stash db (eg. the names of the tags, the attributes of the files) and the paths of its files did not change since the scene was renamed
+    # NOTE: a scene is not renamed by an update of fields the templates do not use, even if its files were moved outside of the renamer
+    SKIP_UNCHANGED_SCENES: bool = False
+    # Path of the file storing the fingerprints of the renamed scenes, when SKIP_UNCHANGED_SCENES is set (relative to the plugin folder)
+    SCENE_FINGERPRINTS_PATH: str = "scene_fingerprints.db"
+    # If set to True, the settings the hooks need to skip a scene are cached, so that a hook skipping a scene does not load the config (nor most of the renamer)
+    CACHE_STARTUP_SETTINGS: bool = True
+    # If set to True, the hooks are forwarded to a renamer daemon started by the first hook, which keeps the config, the studios,
+    # the compiled templates and the connections to Stash between hooks (requires Unix sockets and CACHE_STARTUP_SETTINGS)
+    DAEMON_ENABLED: bool = False
+    # Path of the Unix socket the renamer daemon listens on (relative to the plugin folder)
+    DAEMON_SOCKET_PATH: str = "renamer_daemon.sock"
+    # Seconds without a hook before the renamer daemon stops (None -> never stops)
+    DAEMON_IDLE_TIMEOUT: Optional[float] = 600
+    # Milliseconds the first hook of a burst waits for the next hooks, to rename all the scenes they updated in a single batch
+    # (one studio fetch, one rename run, one progress stream and one stash db transaction). None -> each hook renames its scenes on its own
+    COALESCE_WINDOW_MS: Optional[int] = None
+    # Path of the database spooling the scenes waiting for the batch (relative to the plugin folder)
+    HOOK_SPOOL_PATH: str = "hook_spool.db"
+
+
 FileNameTemplateConfig.update_forward_refs()
 FileNameConfig.update_forward_refs()
 
@@ -67,9 +146,52 @@ FileDirTemplateConfig.update_forward_refs()
 FileDirConfig.update_forward_refs()
 
 PathConfig.update_forward_refs()
+StashApiConfig.update_forward_refs()
+ProcessingConfig.update_forward_refs()
+StashDBConfig.update_forward_refs()
+HookConfig.update_forward_refs()
 Config.update_forward_refs()
 
 
+# The validated user config, shared by the whole process
+_config: Optional[Config] = None
+
+
 def get_config():
-    config = Config(**user_config)
-    return config
+    global _config
+
+    if _config is None:
+        _config = Config(**user_config_module.user_config)
+
+    return _config
+
+
+def is_config_loaded() -> bool:
+    return _config is not None
+
+
+def reload_config():
+    """
+    Re-reads user_config.py and replaces the cached config
+    """
+
+    global _config
+
+    importlib.reload(user_config_module)
+    _config = Config(**user_config_module.user_config)
+
+    return _config
+
+
+def set_config(config: Config):
+    "Replaces the cached config, eg. with a config built in a test"
+
+    global _config
+    _config = config
+
+
+def invalidate_config():
+    "Drops the cached config, the next get_config call validates user_config again"
+
+    global _config
+    _config = None
@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from pydantic import BaseModel, Extra
+
+
+class PlannedRename(BaseModel, validate_assignment=True, extra=Extra.forbid):
+    scene_id: str
+    file_id: str
+    parent_folder_id: int
+    src: str
+    dst: str
+
+    # Same attributes as SceneFile, so a planned rename can be moved and committed to the stash db like a scene file
+
+    @property
+    def id(self):
+        return self.file_id
+
+    @property
+    def path(self):
+        return self.src
+
+    @property
+    def basename(self):
+        return Path(self.src).name
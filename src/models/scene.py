@@ -127,27 +127,7 @@ class SceneFile(BaseModel, validate_assignment=True, extra=Extra.forbid):
 
     @property
     def resolution_name(self):
-        if self.height > self.width:
-            return "VERTICAL"
-
-        if self.height >= 4320:
-            return "8k"
-        elif self.height >= 3384:
-            return "6k"
-        elif self.height >= 2880:
-            return "5k"
-        elif self.height >= 2160:
-            return "4k"
-        elif self.height >= 1440:
-            return "2k"
-        elif self.height >= 1080:
-            return "FHD"
-        elif self.height >= 720:
-            return "HD"
-        elif self.height >= 480:
-            return "SD"
-        else:
-            return f"{self.height}p"
+        return get_resolution_name(self.width, self.height)
 
     @property
     def oshash(self):
@@ -164,6 +144,30 @@ class SceneFile(BaseModel, validate_assignment=True, extra=Extra.forbid):
         return None
 
 
+def get_resolution_name(width: int, height: int) -> str:
+    if height > width:
+        return "VERTICAL"
+
+    if height >= 4320:
+        return "8k"
+    elif height >= 3384:
+        return "6k"
+    elif height >= 2880:
+        return "5k"
+    elif height >= 2160:
+        return "4k"
+    elif height >= 1440:
+        return "2k"
+    elif height >= 1080:
+        return "FHD"
+    elif height >= 720:
+        return "HD"
+    elif height >= 480:
+        return "SD"
+    else:
+        return f"{height}p"
+
+
 class SceneFileFingerprint(BaseModel, validate_assignment=True, extra=Extra.forbid):
     type: SceneFileFingerprintTypeEnum
     value: str
@@ -7,3 +7,13 @@ class Studio(BaseModel, validate_assignment=True, extra=Extra.forbid):
     id: str
     name: str
     parent_studio: Optional[Studio] = None
+
+
+class StudiosVersion(BaseModel, validate_assignment=True, extra=Extra.forbid):
+    count: int
+    updated_at: Optional[str] = None
+
+
+class StudioCache(BaseModel, validate_assignment=True, extra=Extra.forbid):
+    version: StudiosVersion
+    studios: list[Studio]
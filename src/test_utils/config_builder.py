@@ -79,6 +79,33 @@ class ConfigBuilder:
 
         return self
 
+    def with_pipeline_enabled(self, pipeline_enabled: bool):
+        self.config_dict.setdefault("PROCESSING_CONFIG", {})[
+            "PIPELINE_ENABLED"
+        ] = pipeline_enabled
+
+        return self
+
+    def with_planner_workers(self, planner_workers: int, planner_chunk_size: int = 50):
+        processing_config = self.config_dict.setdefault("PROCESSING_CONFIG", {})
+        processing_config["PLANNER_WORKERS"] = planner_workers
+        processing_config["PLANNER_CHUNK_SIZE"] = planner_chunk_size
+
+        return self
+
+    def with_dryrun_enabled(self, dryrun_enabled: bool):
+        self.config_dict["DRYRUN_ENABLED"] = dryrun_enabled
+
+        return self
+
+    def with_stash_db(self, sqlite_path: str, commit_batch_size: Optional[int] = 1):
+        self.config_dict["STASH_SQLITE_DATABASE_PATH"] = sqlite_path
+        self.config_dict.setdefault("STASH_DB_CONFIG", {})[
+            "COMMIT_BATCH_SIZE"
+        ] = commit_batch_size
+
+        return self
+
     def build(self):
         return Config(**self.config_dict)
 
@@ -0,0 +1,347 @@
+import sqlite3
+from pathlib import Path
+from typing import Callable
+
+# The columns of the stash db tables that the renamer reads and writes, in the same order as in Stash
+CREATE_TABLES_SQL = """
+CREATE TABLE folders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    path TEXT NOT NULL UNIQUE,
+    parent_folder_id INTEGER,
+    mod_time DATETIME NOT NULL,
+    created_at DATETIME NOT NULL,
+    updated_at DATETIME NOT NULL,
+    zip_file_id INTEGER
+);
+CREATE TABLE files (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    basename TEXT NOT NULL,
+    zip_file_id INTEGER,
+    parent_folder_id INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mod_time DATETIME NOT NULL,
+    created_at DATETIME NOT NULL,
+    updated_at DATETIME NOT NULL
+);
+CREATE TABLE video_files (
+    file_id INTEGER NOT NULL PRIMARY KEY,
+    duration FLOAT NOT NULL,
+    video_codec VARCHAR(255) NOT NULL,
+    format VARCHAR(255) NOT NULL,
+    audio_codec VARCHAR(255) NOT NULL,
+    width TINYINT NOT NULL,
+    height TINYINT NOT NULL,
+    frame_rate FLOAT NOT NULL,
+    bit_rate INTEGER NOT NULL
+);
+CREATE TABLE files_fingerprints (
+    file_id INTEGER NOT NULL,
+    type VARCHAR(255) NOT NULL,
+    fingerprint BLOB NOT NULL,
+    PRIMARY KEY (file_id, type, fingerprint)
+);
+CREATE TABLE studios (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name VARCHAR(255) NOT NULL,
+    parent_id INTEGER
+);
+CREATE TABLE scenes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title VARCHAR(255),
+    date DATE,
+    rating TINYINT,
+    studio_id INTEGER,
+    organized BOOLEAN NOT NULL DEFAULT '0',
+    code TEXT
+);
+CREATE TABLE scenes_files (
+    scene_id INTEGER NOT NULL,
+    file_id INTEGER NOT NULL,
+    "primary" BOOLEAN NOT NULL,
+    PRIMARY KEY (scene_id, file_id)
+);
+CREATE TABLE scene_stash_ids (
+    scene_id INTEGER NOT NULL,
+    endpoint VARCHAR(255) NOT NULL,
+    stash_id VARCHAR(36) NOT NULL
+);
+CREATE TABLE performers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name VARCHAR(255) NOT NULL,
+    gender VARCHAR(20),
+    favorite BOOLEAN NOT NULL DEFAULT FALSE,
+    rating TINYINT
+);
+CREATE TABLE performers_scenes (
+    performer_id INTEGER,
+    scene_id INTEGER,
+    PRIMARY KEY (scene_id, performer_id)
+);
+CREATE TABLE performer_stash_ids (
+    performer_id INTEGER,
+    endpoint VARCHAR(255),
+    stash_id VARCHAR(36)
+);
+CREATE TABLE tags (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name VARCHAR(255)
+);
+CREATE TABLE scenes_tags (
+    scene_id INTEGER,
+    tag_id INTEGER,
+    PRIMARY KEY (scene_id, tag_id)
+);
+CREATE TABLE groups (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name VARCHAR(255) NOT NULL,
+    date DATE
+);
+CREATE TABLE groups_scenes (
+    group_id INTEGER,
+    scene_id INTEGER,
+    scene_index TINYINT,
+    PRIMARY KEY (group_id, scene_id)
+);
+"""
+
+TIMESTAMP = "2023-03-07T12:21:01-07:00"
+
+
+class StashDBBuilder:
+    """
+    Creates a minimal stash sqlite database with the given folders, files and scenes
+    """
+
+    def __init__(self, sqlite_path: str):
+        self.sqlite_path = sqlite_path
+        self.folder_paths: list[str] = []
+        self.files: list[tuple[int, str]] = []
+        self.scene_dicts: list[dict] = []
+
+    def with_folder(self, folder_path: str):
+        self.folder_paths.append(str(Path(folder_path)))
+
+        return self
+
+    def with_file(self, file_id: int, file_path: str):
+        self.files.append((file_id, str(Path(file_path))))
+
+        return self
+
+    def with_scene(self, scene_dict: dict):
+        "Adds the scene (in the Scene_Data GraphQL JSON, eg. from SceneBuilder.build_dict) and its files, studio, performers, tags and movies"
+
+        self.scene_dicts.append(scene_dict)
+
+        return self
+
+    def build(self) -> str:
+        conn = sqlite3.connect(self.sqlite_path)
+        conn.executescript(CREATE_TABLES_SQL)
+
+        folder_ids: dict[str, int] = {}
+
+        def insert_folder(folder_path: str) -> int:
+            if folder_path in folder_ids:
+                return folder_ids[folder_path]
+
+            parent_path = str(Path(folder_path).parent)
+            parent_folder_id = (
+                insert_folder(parent_path) if parent_path != folder_path else None
+            )
+
+            result = conn.execute(
+                "INSERT INTO folders (path, parent_folder_id, mod_time, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (folder_path, parent_folder_id, TIMESTAMP, TIMESTAMP, TIMESTAMP),
+            )
+            folder_ids[folder_path] = result.lastrowid
+
+            return result.lastrowid
+
+        for folder_path in self.folder_paths:
+            insert_folder(folder_path)
+
+        for file_id, file_path in self.files:
+            conn.execute(
+                "INSERT INTO files (id, basename, parent_folder_id, size, mod_time, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    file_id,
+                    Path(file_path).name,
+                    insert_folder(str(Path(file_path).parent)),
+                    0,
+                    TIMESTAMP,
+                    TIMESTAMP,
+                    TIMESTAMP,
+                ),
+            )
+
+        for scene_dict in self.scene_dicts:
+            insert_scene(conn, scene_dict, insert_folder)
+
+        conn.commit()
+        conn.close()
+
+        return self.sqlite_path
+
+
+def insert_scene(
+    conn: sqlite3.Connection, scene_dict: dict, insert_folder: Callable[[str], int]
+):
+    studio_dict = scene_dict.get("studio")
+
+    if studio_dict is not None:
+        parent_studio_dict = studio_dict.get("parent_studio")
+
+        if parent_studio_dict is not None:
+            conn.execute(
+                "INSERT OR IGNORE INTO studios (id, name) VALUES (?, ?)",
+                (int(parent_studio_dict["id"]), parent_studio_dict["name"]),
+            )
+
+        conn.execute(
+            "INSERT OR IGNORE INTO studios (id, name, parent_id) VALUES (?, ?, ?)",
+            (
+                int(studio_dict["id"]),
+                studio_dict["name"],
+                int(parent_studio_dict["id"]) if parent_studio_dict else None,
+            ),
+        )
+
+    scene_id = int(scene_dict["id"])
+
+    conn.execute(
+        "INSERT INTO scenes (id, title, date, rating, studio_id, organized, code) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (
+            scene_id,
+            scene_dict.get("title"),
+            scene_dict.get("date"),
+            scene_dict.get("rating100"),
+            int(studio_dict["id"]) if studio_dict is not None else None,
+            scene_dict["organized"],
+            scene_dict.get("code"),
+        ),
+    )
+
+    for stash_id_dict in scene_dict["stash_ids"]:
+        conn.execute(
+            "INSERT INTO scene_stash_ids (scene_id, endpoint, stash_id) VALUES (?, ?, ?)",
+            (scene_id, stash_id_dict["endpoint"], stash_id_dict["stash_id"]),
+        )
+
+    for file_index, file_dict in enumerate(scene_dict["files"]):
+        file_id = int(file_dict["id"])
+        file_path = str(Path(file_dict["path"]))
+
+        conn.execute(
+            "INSERT INTO files (id, basename, parent_folder_id, size, mod_time, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                file_id,
+                Path(file_path).name,
+                insert_folder(str(Path(file_path).parent)),
+                0,
+                TIMESTAMP,
+                TIMESTAMP,
+                TIMESTAMP,
+            ),
+        )
+        conn.execute(
+            "INSERT INTO video_files (file_id, duration, video_codec, format, audio_codec, width, height, frame_rate, bit_rate) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                file_id,
+                float(file_dict["duration"]),
+                file_dict["video_codec"],
+                file_dict["basename"].split(".")[-1],
+                file_dict["audio_codec"],
+                int(file_dict["width"]),
+                int(file_dict["height"]),
+                float(file_dict["frame_rate"]),
+                int(file_dict["bit_rate"]),
+            ),
+        )
+        conn.execute(
+            'INSERT INTO scenes_files (scene_id, file_id, "primary") VALUES (?, ?, ?)',
+            (scene_id, file_id, file_index == 0),
+        )
+
+        for fingerprint_dict in file_dict.get("fingerprints", []):
+            fingerprint = fingerprint_dict["value"]
+
+            # Stash stores the phash as a signed 64-bit integer
+            if fingerprint_dict["type"] == "phash":
+                fingerprint = int.from_bytes(
+                    int(fingerprint, 16).to_bytes(8, "big"), "big", signed=True
+                )
+
+            conn.execute(
+                "INSERT INTO files_fingerprints (file_id, type, fingerprint) VALUES (?, ?, ?)",
+                (file_id, fingerprint_dict["type"], fingerprint),
+            )
+
+    for performer_dict in scene_dict["performers"]:
+        performer_id = int(performer_dict["id"])
+
+        inserted = conn.execute(
+            "INSERT OR IGNORE INTO performers (id, name, gender, favorite, rating) VALUES (?, ?, ?, ?, ?)",
+            (
+                performer_id,
+                performer_dict["name"],
+                performer_dict.get("gender"),
+                performer_dict["favorite"],
+                performer_dict.get("rating100"),
+            ),
+        ).rowcount
+
+        if inserted:
+            for stash_id_dict in performer_dict["stash_ids"]:
+                conn.execute(
+                    "INSERT INTO performer_stash_ids (performer_id, endpoint, stash_id) VALUES (?, ?, ?)",
+                    (
+                        performer_id,
+                        stash_id_dict["endpoint"],
+                        stash_id_dict["stash_id"],
+                    ),
+                )
+
+        conn.execute(
+            "INSERT INTO performers_scenes (performer_id, scene_id) VALUES (?, ?)",
+            (performer_id, scene_id),
+        )
+
+    for tag_dict in scene_dict["tags"]:
+        conn.execute(
+            "INSERT OR IGNORE INTO tags (id, name) VALUES (?, ?)",
+            (int(tag_dict["id"]), tag_dict["name"]),
+        )
+        conn.execute(
+            "INSERT INTO scenes_tags (scene_id, tag_id) VALUES (?, ?)",
+            (scene_id, int(tag_dict["id"])),
+        )
+
+    for scene_movie_dict in scene_dict["movies"]:
+        movie_dict = scene_movie_dict["movie"]
+
+        conn.execute(
+            "INSERT OR IGNORE INTO groups (id, name, date) VALUES (?, ?, ?)",
+            (int(movie_dict["id"]), movie_dict["name"], movie_dict.get("date")),
+        )
+        conn.execute(
+            "INSERT INTO groups_scenes (group_id, scene_id, scene_index) VALUES (?, ?, ?)",
+            (
+                int(movie_dict["id"]),
+                scene_id,
+                scene_movie_dict.get("scene_index"),
+            ),
+        )
+
+
+def get_stash_db_file_path(sqlite_path: str, file_id: int) -> str:
+    "Reads the committed path of a file from the stash db"
+
+    conn = sqlite3.connect(sqlite_path)
+    row = conn.execute(
+        "SELECT folders.path, files.basename FROM files JOIN folders ON folders.id = files.parent_folder_id WHERE files.id = ?",
+        (file_id,),
+    ).fetchone()
+    conn.close()
+
+    return str(Path(row[0]) / row[1])
@@ -333,4 +333,18 @@ config = {
             "{performers}",
         ],
     },
+    "STASH_API_CONFIG": {
+        # Path of the file caching the studios between runs (relative to the plugin folder), so that a run does not fetch all the studios from Stash
+        # The cache is refreshed when a studio was created, updated or deleted since it was written. If set to None, no file is written and all the studios are fetched on every run
+        "STUDIO_CACHE_PATH": "studio_cache.json",
+    },
+    "HOOK_CONFIG": {
+        # If set to True, the settings the hooks need to skip a scene are cached in "hook_startup_cache.json" (in the plugin folder),
+        # so that a hook skipping a scene does not load the config. The cache is written again whenever user_config.py or the renamer changes
+        "CACHE_STARTUP_SETTINGS": True,
+        # If set to True, a hook does not rename a scene when the values its file path is made of did not change since it was renamed
+        # The values are remembered in the SCENE_FINGERPRINTS_PATH file (relative to the plugin folder)
+        "SKIP_UNCHANGED_SCENES": False,
+        "SCENE_FINGERPRINTS_PATH": "scene_fingerprints.db",
+    },
 }
@@ -0,0 +1,130 @@
+import asyncio
+import threading
+import time
+
+from pytest_mock import MockerFixture
+
+from components.async_stash_graphql import AsyncStashGraphQL, iter_async
+from components.stash_graphql import StashGraphQL
+from test_utils.scene_builder import SceneBuilder
+
+
+def create_stash_graphql(mocker: MockerFixture):
+    mocker.patch.object(StashGraphQL, "test_connection")
+    return StashGraphQL("https://stash.example.com/graphql")
+
+
+class ConcurrentRequestsRecorder:
+    "Answers the findScenes requests after a delay, recording the max number of requests in flight"
+
+    def __init__(self, scene_count: int):
+        self.scene_count = scene_count
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def send_request(self, query, variables=None):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+        time.sleep(0.02)
+
+        with self.lock:
+            self.in_flight -= 1
+
+        if "scene_ids" in variables:
+            scene_ids = variables["scene_ids"]
+        else:
+            per_page = variables["filter"]["per_page"]
+            first_scene_id = (variables["filter"]["page"] - 1) * per_page + 1
+            scene_ids = range(
+                first_scene_id, min(first_scene_id + per_page, self.scene_count + 1)
+            )
+
+        return {
+            "findScenes": {
+                "count": self.scene_count,
+                "scenes": [
+                    SceneBuilder({"id": str(scene_id)}).build_dict()
+                    for scene_id in scene_ids
+                ],
+            }
+        }
+
+
+class TestAsyncStashGraphQL:
+    def test_get_all_scenes_requests_pages_concurrently(self, mocker: MockerFixture):
+        stash_graphql = create_stash_graphql(mocker)
+        recorder = ConcurrentRequestsRecorder(scene_count=25)
+        mocker.patch.object(
+            stash_graphql, "_send_request", side_effect=recorder.send_request
+        )
+
+        async_stash_graphql = AsyncStashGraphQL(stash_graphql, 3)
+        scenes = [
+            scene
+            for page_scenes in iter_async(
+                async_stash_graphql.get_all_scenes(per_page=2)
+            )
+            for scene in page_scenes
+        ]
+
+        assert [scene.id for scene in scenes] == [str(id) for id in range(1, 26)]
+        assert 1 < recorder.max_in_flight <= 3
+
+    def test_get_all_scenes_requests_scenes_added_since_the_first_page(
+        self, mocker: MockerFixture
+    ):
+        stash_graphql = create_stash_graphql(mocker)
+        recorder = ConcurrentRequestsRecorder(scene_count=4)
+
+        def send_request(query, variables=None):
+            response = recorder.send_request(query, variables)
+            recorder.scene_count = 7
+
+            return response
+
+        mocker.patch.object(stash_graphql, "_send_request", side_effect=send_request)
+
+        async_stash_graphql = AsyncStashGraphQL(stash_graphql, 3)
+        pages = list(iter_async(async_stash_graphql.get_all_scenes(per_page=2)))
+
+        assert [[scene.id for scene in page_scenes] for page_scenes in pages] == [
+            ["1", "2"],
+            ["3", "4"],
+            ["5", "6"],
+            ["7"],
+        ]
+
+    def test_stops_requesting_pages_when_closed(self, mocker: MockerFixture):
+        stash_graphql = create_stash_graphql(mocker)
+        recorder = ConcurrentRequestsRecorder(scene_count=100)
+        send_request_mock = mocker.patch.object(
+            stash_graphql, "_send_request", side_effect=recorder.send_request
+        )
+
+        pages = iter_async(AsyncStashGraphQL(stash_graphql, 2).get_all_scenes(2))
+        next(pages)
+        pages.close()
+
+        # the first page, and at most 3 pages requested ahead of the second page
+        assert send_request_mock.call_count <= 4
+        assert recorder.in_flight == 0
+
+    def test_get_scenes_with_ids_keeps_requested_order(self, mocker: MockerFixture):
+        stash_graphql = create_stash_graphql(mocker)
+        recorder = ConcurrentRequestsRecorder(scene_count=10)
+        mocker.patch.object(
+            stash_graphql, "_send_request", side_effect=recorder.send_request
+        )
+
+        async def get_scenes_with_ids():
+            return await AsyncStashGraphQL(stash_graphql, 2).get_scenes_with_ids(
+                [5, 3, 9, 1, 7], chunk_size=1
+            )
+
+        scenes = asyncio.run(get_scenes_with_ids())
+
+        assert [scene.id for scene in scenes] == ["5", "3", "9", "1", "7"]
+        assert 1 < recorder.max_in_flight <= 2
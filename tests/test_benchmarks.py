@@ -0,0 +1,44 @@
+from benchmarks.run_benchmarks import compare_results, run_benchmarks
+
+
+class TestRunBenchmarks:
+    def test_times_every_stage(self):
+        results = run_benchmarks(
+            [20], studio_depth=2, studio_fanout=2, template_count=5
+        )
+
+        [library] = results["libraries"]
+
+        assert library["file_count"] == 20
+        assert library["studio_count"] == 6
+        assert list(library["stages"]) == [
+            "graphql_parse",
+            "scene_models",
+            "matching",
+            "fill_template",
+            "create_new_file_path",
+            "stash_db_writes",
+        ]
+        assert all(stage["items"] == 20 for stage in library["stages"].values())
+
+    def test_compares_stage_times_to_baseline(self):
+        baseline_results = {
+            "libraries": [{"file_count": 10, "stages": {"matching": {"seconds": 2.0}}}]
+        }
+        results = {
+            "libraries": [
+                {
+                    "file_count": 10,
+                    "stages": {
+                        "matching": {"seconds": 1.0},
+                        "fill_template": {"seconds": 1.0},
+                    },
+                },
+                {"file_count": 20, "stages": {"matching": {"seconds": 1.0}}},
+            ]
+        }
+
+        [line] = compare_results(results, baseline_results)
+
+        assert "matching" in line
+        assert "(-50.0%)" in line
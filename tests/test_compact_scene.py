@@ -0,0 +1,115 @@
+import datetime
+import pickle
+
+import pytest
+
+from models.compact_scene import CompactScene, as_compact_scene
+from models.scene import PerformerGenderEnum
+from test_utils.scene_builder import SceneBuilder
+
+
+def create_scene_dict():
+    return (
+        SceneBuilder(
+            {
+                "id": "1",
+                "code": "ABC-123",
+                "rating100": 80,
+                "stash_ids": [{"endpoint": "https://stashdb.org", "stash_id": "a1"}],
+                "movies": [
+                    {
+                        "movie": {"id": "3", "name": "Movie A", "date": "2020-05-01"},
+                        "scene_index": 2,
+                    }
+                ],
+            }
+        )
+        .with_performers(
+            [
+                {"id": "2", "name": "Performer B", "gender": "FEMALE"},
+                {"id": "1", "name": "Performer A", "gender": ""},
+            ]
+        )
+        .with_tags(["Tag A", "Tag B"])
+        .with_files(
+            [
+                {
+                    "id": "1",
+                    "basename": "file1.mp4",
+                    "path": "/videos/file1.mp4",
+                    "width": "1080",
+                    "height": "1920",
+                    "video_codec": "h264",
+                    "audio_codec": "aac",
+                    "frame_rate": 30,
+                    "duration": 3030.56,
+                    "bit_rate": 6158790,
+                    "mod_time": "2022-11-29T23:54:07-07:00",
+                    "created_at": "2023-02-22T22:55:02-07:00",
+                    "updated_at": "2023-03-07T12:21:01-07:00",
+                    "parent_folder_id": "140",
+                    "fingerprints": [
+                        {"type": "oshash", "value": "os1"},
+                        {"type": "phash", "value": "ph1"},
+                        {"type": "oshash", "value": "os2"},
+                    ],
+                }
+            ]
+        )
+        .build_dict()
+    )
+
+
+class TestCompactScene:
+    def test_has_same_values_as_pydantic_scene(self):
+        scene_dict = create_scene_dict()
+
+        compact_scene = CompactScene.from_dict(scene_dict)
+        scene = SceneBuilder(scene_dict).build()
+
+        assert compact_scene.id == scene.id
+        assert compact_scene.date == scene.date == datetime.date(2021, 1, 1)
+        assert compact_scene.rating == scene.rating
+        assert compact_scene.studio_code == scene.studio_code
+        assert compact_scene.stash_id == scene.stash_id
+        assert compact_scene.movie_name == scene.movie_name
+        assert compact_scene.movie_date == scene.movie_date
+        assert compact_scene.movie_scene_number == scene.movie_scene_number
+        assert [tag.name for tag in compact_scene.tags] == ["Tag A", "Tag B"]
+
+        compact_performers = compact_scene.performers
+        assert [performer.id for performer in compact_performers] == [2, 1]
+        assert compact_performers[0].gender == PerformerGenderEnum.FEMALE
+        assert compact_performers[1].gender is None
+
+        compact_file, file = compact_scene.files[0], scene.files[0]
+        assert compact_file.parent_folder_id == file.parent_folder_id == 140
+        assert compact_file.duration == file.duration
+        assert compact_file.extension == file.extension
+        assert compact_file.bit_rate_mbps == file.bit_rate_mbps
+        assert compact_file.resolution == file.resolution
+        assert compact_file.resolution_name == file.resolution_name == "VERTICAL"
+        assert compact_file.oshash == file.oshash == "os1"
+        assert compact_file.phash == file.phash == "ph1"
+
+    def test_from_pydantic_scene(self):
+        scene = SceneBuilder(create_scene_dict()).build()
+
+        assert as_compact_scene(scene) == CompactScene.from_dict(create_scene_dict())
+
+    def test_compact_scene_is_not_converted_again(self):
+        compact_scene = CompactScene.from_dict(create_scene_dict())
+
+        assert as_compact_scene(compact_scene) is compact_scene
+
+    def test_can_be_pickled(self):
+        compact_scene = CompactScene.from_dict(create_scene_dict())
+
+        assert pickle.loads(pickle.dumps(compact_scene)) == compact_scene
+
+    def test_invalid_scene_raises_value_error(self):
+        scene_dict = create_scene_dict()
+        scene_dict["files"][0]["width"] = "wide"
+
+        with pytest.raises(ValueError):
+            CompactScene.from_dict(scene_dict)
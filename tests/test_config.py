@@ -0,0 +1,61 @@
+import pytest
+
+import models.config
+from models.config import get_config, invalidate_config, reload_config, set_config
+from test_utils.config_builder import ConfigBuilder
+
+
+class TestGetConfig:
+    @pytest.fixture(autouse=True)
+    def fresh_config(self):
+        invalidate_config()
+        yield
+        invalidate_config()
+
+    def test_config_is_validated_once(self, monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.setattr(
+            models.config.user_config_module,
+            "user_config",
+            ConfigBuilder().build_dict(),
+        )
+
+        config = get_config()
+
+        assert get_config() is config
+
+    def test_invalidate_config(self, monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.setattr(
+            models.config.user_config_module,
+            "user_config",
+            ConfigBuilder().build_dict(),
+        )
+
+        config = get_config()
+        invalidate_config()
+
+        assert get_config() is not config
+
+    def test_set_config(self):
+        config = ConfigBuilder().with_max_path_len(100).build()
+
+        set_config(config)
+
+        assert get_config() is config
+
+    def test_reload_config(self, monkeypatch: pytest.MonkeyPatch):
+        reload_mock_calls = []
+
+        def reload(module):
+            reload_mock_calls.append(module)
+            module.user_config = ConfigBuilder().with_max_path_len(123).build_dict()
+
+        monkeypatch.setattr(models.config.importlib, "reload", reload)
+        monkeypatch.setattr(
+            models.config.user_config_module, "user_config", {"invalid": True}
+        )
+
+        config = reload_config()
+
+        assert reload_mock_calls == [models.config.user_config_module]
+        assert config.PATH_CONFIG.MAX_PATH_LENGTH == 123
+        assert get_config() is config
@@ -0,0 +1,90 @@
+from pathlib import Path
+
+from pytest_mock import MockerFixture
+
+import components.destination_index
+from components.destination_index import DestinationIndex
+from test_utils.config_builder import ConfigBuilder
+from test_utils.helpers import run_renamer_with_mock
+from test_utils.scene_builder import SceneBuilder
+from test_utils.scene_file_builder import SceneFileBuilder
+
+
+class TestDestinationIndex:
+    def test_lists_directory_once(self, mocker: MockerFixture, tmp_path: Path):
+        (tmp_path / "a.mp4").touch()
+        (tmp_path / "sub").mkdir()
+        list_file_names_spy = mocker.spy(
+            components.destination_index, "list_file_names"
+        )
+
+        destination_index = DestinationIndex()
+
+        assert destination_index.contains(str(tmp_path / "a.mp4"))
+        assert not destination_index.contains(str(tmp_path / "b.mp4"))
+        # directories are not files
+        assert not destination_index.contains(str(tmp_path / "sub"))
+        assert list_file_names_spy.call_count == 1
+
+    def test_missing_directory(self, tmp_path: Path):
+        destination_index = DestinationIndex()
+
+        assert not destination_index.contains(str(tmp_path / "missing" / "a.mp4"))
+
+    def test_reserve_and_release(self, tmp_path: Path):
+        (tmp_path / "a.mp4").touch()
+        destination_index = DestinationIndex()
+
+        destination_index.reserve(str(tmp_path / "b.mp4"))
+        destination_index.release(str(tmp_path / "a.mp4"))
+
+        assert destination_index.contains(str(tmp_path / "b.mp4"))
+        assert not destination_index.contains(str(tmp_path / "a.mp4"))
+
+    def test_release_before_listing(self, tmp_path: Path):
+        (tmp_path / "a.mp4").touch()
+        destination_index = DestinationIndex()
+
+        destination_index.release(str(tmp_path / "a.mp4"))
+
+        assert not destination_index.contains(str(tmp_path / "a.mp4"))
+
+        destination_index.reserve(str(tmp_path / "a.mp4"))
+
+        assert destination_index.contains(str(tmp_path / "a.mp4"))
+
+
+class TestDryRunDuplicateFilePaths:
+    def test_files_planned_earlier_in_dry_run(
+        self, mocker: MockerFixture, tmp_path: Path
+    ):
+        scenes = [
+            SceneBuilder({"id": scene_id})
+            .with_title("Same Title")
+            .with_files(
+                [
+                    SceneFileBuilder(str(scene_id))
+                    .with_file_path(str(tmp_path / f"file{scene_id}.mp4"))
+                    .build_dict()
+                ]
+            )
+            .build()
+            for scene_id in range(1, 4)
+        ]
+        studios = [scenes[0].studio]
+
+        config = (
+            ConfigBuilder()
+            .with_file_name_templates([{"TEMPLATE": "{title}"}])
+            .with_file_dir_templates([{"TEMPLATE": str(tmp_path / "renamed")}])
+            .with_pipeline_enabled(False)
+            .build()
+        )
+
+        renames = run_renamer_with_mock(mocker, config, scenes, studios)
+
+        assert [rename["dst_file_name"] for rename in renames] == [
+            "Same Title",
+            "Same Title (1)",
+            "Same Title (2)",
+        ]
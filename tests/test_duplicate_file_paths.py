@@ -1,3 +1,5 @@
+import os
+from pathlib import Path
 from unittest.mock import call
 import pytest
 from pytest_mock import MockerFixture
@@ -9,23 +11,25 @@ from models.scene import Studio
 from test_utils.scene_file_builder import SceneFileBuilder
 
 
-def create_file_exists_mock_validator(
+def create_destination_index_mock_validator(
     mocker: MockerFixture,
     expected_file_exists_calls: list[str],
 ):
-    side_effect = [True for _ in range(len(expected_file_exists_calls) - 1)]
-    side_effect.append(False)
+    """
+    All the checked paths except the last one are files in the destination directory, which should be listed only once
+    """
 
-    file_exists_mock = mocker.patch(
-        "components.process_scenes.file_exists",
-        side_effect=side_effect,
+    destination_dir = os.path.normcase(str(Path(expected_file_exists_calls[0]).parent))
+
+    list_file_names_mock = mocker.patch(
+        "components.destination_index.list_file_names",
+        return_value={Path(path).name for path in expected_file_exists_calls[:-1]},
     )
 
-    def file_exists_mock_validator():
-        expected_call_args_list = [call(path) for path in expected_file_exists_calls]
-        return file_exists_mock.call_args_list == expected_call_args_list
+    def destination_index_mock_validator():
+        return list_file_names_mock.call_args_list == [call(destination_dir)]
 
-    return file_exists_mock_validator
+    return destination_index_mock_validator
 
 
 class TestDuplicateFilePaths:
@@ -80,7 +84,7 @@ class TestDuplicateFilePaths:
             expected_rename_dst,
         ]
 
-        validate_file_exists_mock = create_file_exists_mock_validator(
+        validate_destination_index_mock = create_destination_index_mock_validator(
             mocker,
             expected_file_exists_calls=expected_file_exists_calls,
         )
@@ -90,7 +94,7 @@ class TestDuplicateFilePaths:
         assert len(renames) == 1
         assert renames[0]["dst"] == expected_rename_dst
 
-        assert validate_file_exists_mock()
+        assert validate_destination_index_mock()
 
     def test_file_path_exists_once(
         self,
@@ -115,7 +119,7 @@ class TestDuplicateFilePaths:
             expected_rename_dst,
         ]
 
-        validate_file_exists_mock = create_file_exists_mock_validator(
+        validate_destination_index_mock = create_destination_index_mock_validator(
             mocker,
             expected_file_exists_calls=expected_file_exists_calls,
         )
@@ -125,7 +129,7 @@ class TestDuplicateFilePaths:
         assert len(renames) == 1
         assert renames[0]["dst"] == expected_rename_dst
 
-        assert validate_file_exists_mock()
+        assert validate_destination_index_mock()
 
     def test_file_path_exists_twice(
         self,
@@ -151,7 +155,7 @@ class TestDuplicateFilePaths:
             expected_rename_dst,
         ]
 
-        validate_file_exists_mock = create_file_exists_mock_validator(
+        validate_destination_index_mock = create_destination_index_mock_validator(
             mocker,
             expected_file_exists_calls=expected_file_exists_calls,
         )
@@ -161,7 +165,7 @@ class TestDuplicateFilePaths:
         assert len(renames) == 1
         assert renames[0]["dst"] == expected_rename_dst
 
-        assert validate_file_exists_mock()
+        assert validate_destination_index_mock()
 
     def test_file_path_exists_thrice(
         self,
@@ -184,7 +188,7 @@ class TestDuplicateFilePaths:
             expected_rename_dst,
         ]
 
-        validate_file_exists_mock = create_file_exists_mock_validator(
+        validate_destination_index_mock = create_destination_index_mock_validator(
             mocker,
             expected_file_exists_calls=expected_file_exists_calls,
         )
@@ -194,7 +198,7 @@ class TestDuplicateFilePaths:
         assert len(renames) == 1
         assert renames[0]["dst"] == expected_rename_dst
 
-        assert validate_file_exists_mock()
+        assert validate_destination_index_mock()
 
     def test_file_path_exists_many_times(
         self,
@@ -228,7 +232,7 @@ class TestDuplicateFilePaths:
             expected_rename_dst,
         ]
 
-        validate_file_exists_mock = create_file_exists_mock_validator(
+        validate_destination_index_mock = create_destination_index_mock_validator(
             mocker,
             expected_file_exists_calls=expected_file_exists_calls,
         )
@@ -238,4 +242,4 @@ class TestDuplicateFilePaths:
         assert len(renames) == 1
         assert renames[0]["dst"] == expected_rename_dst
 
-        assert validate_file_exists_mock()
+        assert validate_destination_index_mock()
@@ -0,0 +1,103 @@
+import pytest
+from pytest_mock import MockerFixture
+
+from components.find_matching_template import (
+    compile_template_matchers,
+    find_matching_template,
+)
+from components.studio_helpers import StudioRegistry
+from models.studio import Studio
+from test_utils.config_builder import ConfigBuilder
+from test_utils.scene_builder import SceneBuilder
+
+
+class TestTemplateMatchers:
+    @pytest.fixture
+    def studios(self):
+        studio_bangbros = Studio(**{"id": 1, "name": "Bangbros"})
+        studio_bang_bus = Studio(
+            **{"id": 2, "name": "Bang Bus", "parent_studio": studio_bangbros}
+        )
+        return StudioRegistry([studio_bangbros, studio_bang_bus])
+
+    def test_studio_names_are_resolved_once(
+        self, studios: StudioRegistry, mocker: MockerFixture
+    ):
+        config = (
+            ConfigBuilder()
+            .with_file_name_templates(
+                [
+                    {"matches_studio": "Bang Bus", "TEMPLATE": "bang bus"},
+                    {"matches_part_of_studio": "bangbros", "TEMPLATE": "bangbros"},
+                ]
+            )
+            .build()
+        )
+
+        template_matchers = compile_template_matchers(config, studios)
+
+        find_with_name_spy = mocker.spy(studios, "find_with_name")
+
+        for studio_id in ["1", "2"]:
+            scene = (
+                SceneBuilder()
+                .with_studio(studios.find_with_id(studio_id).dict())
+                .build()
+            )
+
+            matching_template = find_matching_template(
+                scene, scene.files[0], template_matchers.file_name
+            )
+
+            assert matching_template == {"1": "bangbros", "2": "bang bus"}[studio_id]
+
+        assert find_with_name_spy.call_count == 0
+
+    def test_only_set_filters_are_checked(self, studios: StudioRegistry):
+        config = (
+            ConfigBuilder()
+            .with_file_name_templates(
+                [{"matches_any_tags": ["Tag A", " Tag B "], "TEMPLATE": "tagged"}]
+            )
+            .build()
+        )
+
+        template_matchers = compile_template_matchers(config, studios)
+
+        assert [
+            filter_name for filter_name, _ in template_matchers.file_name[0].filters
+        ] == ["matches_any_tags"]
+
+        scene = SceneBuilder().with_tags(["Tag B"]).build()
+
+        assert (
+            find_matching_template(scene, scene.files[0], template_matchers.file_name)
+            == "tagged"
+        )
+
+    def test_unknown_studio_name_raises_when_matching(self, studios: StudioRegistry):
+        config = (
+            ConfigBuilder()
+            .with_file_name_templates(
+                [{"matches_studio": "Unknown Studio", "TEMPLATE": "unknown"}]
+            )
+            .build()
+        )
+
+        template_matchers = compile_template_matchers(config, studios)
+
+        scene = SceneBuilder().with_studio({"id": 1, "name": "Bangbros"}).build()
+
+        with pytest.raises(ValueError):
+            find_matching_template(scene, scene.files[0], template_matchers.file_name)
+
+        scene_without_studio = SceneBuilder().with_studio(None).build()
+
+        assert (
+            find_matching_template(
+                scene_without_studio,
+                scene_without_studio.files[0],
+                template_matchers.file_name,
+            )
+            is None
+        )
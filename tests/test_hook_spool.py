@@ -0,0 +1,223 @@
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from pytest_mock import MockerFixture
+
+import main
+from components.hook_spool import (
+    HookSpool,
+    SpooledScene,
+    leader_lock,
+    rename_spooled_scenes,
+)
+from components.hook_startup_cache import HookStartupSettings
+from test_utils.config_builder import ConfigBuilder
+from test_utils.scene_builder import SceneBuilder
+from test_utils.stash_db_builder import StashDBBuilder
+
+
+@pytest.fixture
+def hook_spool(tmp_path: Path):
+    hook_spool = HookSpool(str(tmp_path / "hook_spool.db"))
+    yield hook_spool
+    hook_spool.close()
+
+
+@pytest.fixture
+def lock_path(tmp_path: Path) -> str:
+    return str(tmp_path / "hook_spool.db.lock")
+
+
+class TestHookSpool:
+    def test_spools_scenes_once(self, hook_spool: HookSpool):
+        hook_spool.add([1, 2])
+        hook_spool.add([1])
+
+        assert hook_spool.get_spooled_scenes() == [
+            SpooledScene(1, 2),
+            SpooledScene(2, 1),
+        ]
+
+    def test_keeps_scenes_spooled_again_while_renamed(self, hook_spool: HookSpool):
+        hook_spool.add([1, 2])
+        spooled_scenes = hook_spool.get_spooled_scenes()
+
+        hook_spool.add([2])
+        removed_at = time.time()
+        hook_spool.remove(spooled_scenes)
+
+        assert hook_spool.get_spooled_scenes() == [SpooledScene(2, 2)]
+        assert hook_spool.get_oldest_spooled_at() >= removed_at
+
+
+class TestLeaderLock:
+    def test_single_leader(self, lock_path: str):
+        with leader_lock(lock_path) as is_leader:
+            assert is_leader
+
+            with leader_lock(lock_path) as is_other_leader:
+                assert not is_other_leader
+
+        with leader_lock(lock_path) as is_leader:
+            assert is_leader
+
+
+class TestRenameSpooledScenes:
+    def test_renames_scenes_spooled_within_the_window(
+        self, hook_spool: HookSpool, lock_path: str
+    ):
+        batches: list[list[int]] = []
+
+        def rename_batch(scene_ids: list[int]):
+            batches.append(scene_ids)
+
+            # spooled by a hook fired during the batch
+            if len(batches) == 1:
+                hook_spool.add([3])
+
+        hook_spool.add([1, 2])
+        hook_spool.add([1])
+
+        rename_spooled_scenes(hook_spool, lock_path, 0.01, rename_batch)
+
+        assert batches == [[1, 2], [3]]
+        assert hook_spool.get_oldest_spooled_at() is None
+
+    def test_waits_a_window_for_scenes_spooled_again_during_a_batch(
+        self, hook_spool: HookSpool, lock_path: str
+    ):
+        batches: list[tuple[list[int], float]] = []
+
+        def rename_batch(scene_ids: list[int]):
+            batches.append((scene_ids, time.time()))
+
+            # spooled again by a hook fired during the batch
+            if len(batches) == 1:
+                hook_spool.add([1])
+
+        hook_spool.add([1, 2])
+        rename_spooled_scenes(hook_spool, lock_path, 0.1, rename_batch)
+
+        [(first_batch, first_batch_at), (second_batch, second_batch_at)] = batches
+        assert first_batch == [1, 2]
+        assert second_batch == [1]
+        assert second_batch_at - first_batch_at >= 0.1
+
+    def test_returns_while_another_hook_is_the_leader(
+        self, hook_spool: HookSpool, lock_path: str
+    ):
+        batches: list[list[int]] = []
+        hook_spool.add([1])
+
+        with leader_lock(lock_path):
+            rename_spooled_scenes(hook_spool, lock_path, 0, batches.append)
+
+        assert batches == []
+        assert len(hook_spool.get_spooled_scenes()) == 1
+
+    def test_removes_failed_batch(self, hook_spool: HookSpool, lock_path: str):
+        def rename_batch(scene_ids: list[int]):
+            raise ValueError("Rename failed")
+
+        hook_spool.add([1])
+
+        with pytest.raises(ValueError, match="Rename failed"):
+            rename_spooled_scenes(hook_spool, lock_path, 0, rename_batch)
+
+        assert hook_spool.get_spooled_scenes() == []
+
+
+class TestCoalescedHooks:
+    @pytest.fixture
+    def config(self, mocker: MockerFixture, tmp_path: Path):
+        stash_db_builder = StashDBBuilder(str(tmp_path / "stash.db"))
+
+        for scene_id in ["1", "2", "3"]:
+            stash_db_builder.with_scene(
+                SceneBuilder({"id": scene_id}).with_files([]).build_dict()
+            )
+
+        config = (
+            ConfigBuilder()
+            .with_file_name_templates([{"TEMPLATE": "{title}"}])
+            .with_stash_db(stash_db_builder.build())
+            .build()
+        )
+        config.HOOK_CONFIG = {
+            "SKIP_UNCHANGED_SCENES": True,
+            "SCENE_FINGERPRINTS_PATH": str(tmp_path / "scene_fingerprints.db"),
+            "HOOK_SPOOL_PATH": str(tmp_path / "hook_spool.db"),
+            "COALESCE_WINDOW_MS": 200,
+        }
+        mocker.patch("main.get_config", return_value=config)
+
+        return config
+
+    def test_renames_a_burst_of_hooks_in_one_batch(self, mocker: MockerFixture, config):
+        rename_scenes_mock = mocker.patch(
+            "main.rename_scenes",
+            side_effect=lambda scene_ids, single_transaction: set(scene_ids),
+        )
+
+        hooks = [
+            threading.Thread(
+                target=main.rename_updated_scene,
+                args=(scene_id, ["id", "title"]),
+            )
+            for scene_id in [1, 2, 2, 3]
+        ] + [
+            threading.Thread(
+                target=main.rename_updated_scenes, args=([3, 4], ["ids", "title"])
+            )
+        ]
+
+        for hook in hooks:
+            hook.start()
+        for hook in hooks:
+            hook.join()
+
+        rename_scenes_mock.assert_called_once()
+        scene_ids, single_transaction = rename_scenes_mock.call_args.args
+        assert sorted(scene_ids) == [1, 2, 3, 4]
+        assert single_transaction
+
+        # the fingerprints of the renamed scenes were recorded
+        main.rename_updated_scene(1, ["id", "title"])
+        rename_scenes_mock.assert_called_once()
+
+    def test_spools_scenes_before_forwarding_to_the_daemon(
+        self, mocker: MockerFixture, tmp_path: Path
+    ):
+        hook_spool_path = str(tmp_path / "hook_spool.db")
+        mocker.patch(
+            "main.get_hook_startup_settings",
+            return_value=HookStartupSettings(
+                skip_unchanged_scenes=True,
+                file_path_input_fields=frozenset(["title"]),
+                scene_fingerprints_path=str(tmp_path / "scene_fingerprints.db"),
+                config_hash="config",
+                stash_db_path=str(tmp_path / "stash.db"),
+                run_metrics_path=None,
+                daemon_socket_path="renamer_daemon.sock",
+                hook_spool_path=hook_spool_path,
+            ),
+        )
+        forward_to_daemon_mock = mocker.patch(
+            "main.forward_to_daemon", return_value=True
+        )
+
+        assert main.forward_hook_to_daemon(
+            "renamer_daemon.sock",
+            '{"args": {}}',
+            {"id": "1", "title": "Title", "rating100": 80},
+            ["id", "title", "rating100"],
+        )
+
+        forward_to_daemon_mock.assert_called_once_with(
+            "renamer_daemon.sock", '{"args": {"mode": "rename_spooled_scenes"}}'
+        )
+
+        with HookSpool(hook_spool_path) as hook_spool:
+            assert hook_spool.get_spooled_scenes() == [SpooledScene(1, 1)]
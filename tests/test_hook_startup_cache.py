@@ -0,0 +1,169 @@
+import builtins
+import sys
+from pathlib import Path
+
+import pytest
+from pytest_mock import MockerFixture
+
+import components.hook_startup_cache
+import components.import_timing
+import main
+from components.hook_startup_cache import (
+    HookStartupSettings,
+    load_hook_startup_settings,
+    save_hook_startup_settings,
+)
+from components.import_timing import drain_import_durations
+from components.scene_fingerprints import record_scene_fingerprints
+from test_utils.scene_builder import SceneBuilder
+from test_utils.stash_db_builder import StashDBBuilder
+
+
+@pytest.fixture
+def source_path(mocker: MockerFixture, tmp_path: Path) -> Path:
+    source_path = tmp_path / "src" / "user_config.py"
+    source_path.parent.mkdir()
+    source_path.write_text("user_config = {}")
+
+    mocker.patch.object(components.hook_startup_cache, "SOURCE_DIR", source_path.parent)
+
+    return source_path
+
+
+def create_settings(tmp_path: Path, **settings) -> HookStartupSettings:
+    return HookStartupSettings(
+        **{
+            "skip_unchanged_scenes": True,
+            "file_path_input_fields": frozenset(["title", "studio_id"]),
+            "scene_fingerprints_path": str(tmp_path / "scene_fingerprints.db"),
+            "config_hash": "config",
+            "stash_db_path": str(tmp_path / "stash.db"),
+            "run_metrics_path": None,
+            "daemon_socket_path": None,
+            "hook_spool_path": None,
+            **settings,
+        }
+    )
+
+
+class TestHookStartupCache:
+    def test_loads_saved_settings(self, source_path: Path, tmp_path: Path):
+        cache_path = str(tmp_path / "hook_startup_cache.json")
+        settings = create_settings(tmp_path)
+
+        save_hook_startup_settings(cache_path, settings)
+
+        assert load_hook_startup_settings(cache_path) == settings
+
+    def test_ignores_settings_cached_before_a_source_file_changed(
+        self, source_path: Path, tmp_path: Path
+    ):
+        cache_path = str(tmp_path / "hook_startup_cache.json")
+        save_hook_startup_settings(cache_path, create_settings(tmp_path))
+
+        source_path.write_text("user_config = {'DRYRUN_ENABLED': False}")
+
+        assert load_hook_startup_settings(cache_path) is None
+
+    def test_ignores_settings_cached_before_a_source_file_was_added(
+        self, source_path: Path, tmp_path: Path
+    ):
+        cache_path = str(tmp_path / "hook_startup_cache.json")
+        save_hook_startup_settings(cache_path, create_settings(tmp_path))
+
+        (source_path.parent / "components").mkdir()
+        (source_path.parent / "components" / "daemon_client.py").write_text("")
+
+        assert load_hook_startup_settings(cache_path) is None
+
+    def test_ignores_missing_and_invalid_cache(self, source_path: Path, tmp_path: Path):
+        cache_path = tmp_path / "hook_startup_cache.json"
+
+        assert load_hook_startup_settings(str(cache_path)) is None
+
+        cache_path.write_text("{")
+
+        assert load_hook_startup_settings(str(cache_path)) is None
+
+
+class TestSkipUpdatedScenesWithCachedSettings:
+    def mock_settings(
+        self, mocker: MockerFixture, settings: HookStartupSettings | None
+    ):
+        mocker.patch("main.get_hook_startup_settings", return_value=settings)
+
+    def test_not_cached(self, mocker: MockerFixture):
+        self.mock_settings(mocker, None)
+
+        assert (
+            main.skip_updated_scenes_with_cached_settings(
+                {"id": "1", "rating100": 80}, ["id", "rating100"]
+            )
+            is None
+        )
+
+    def test_skips_fields_not_in_templates(self, mocker: MockerFixture, tmp_path: Path):
+        self.mock_settings(mocker, create_settings(tmp_path))
+
+        assert main.skip_updated_scenes_with_cached_settings(
+            {"id": "1", "rating100": 80}, ["id", "rating100"]
+        )
+        assert main.skip_updated_scenes_with_cached_settings(
+            {"ids": ["1", "2"]}, ["ids", "rating100"]
+        )
+        assert not main.skip_updated_scenes_with_cached_settings(
+            {"ids": ["1", "2"]}, ["ids", "title"]
+        )
+
+    def test_skips_unchanged_fields(self, mocker: MockerFixture, tmp_path: Path):
+        settings = create_settings(tmp_path)
+        self.mock_settings(mocker, settings)
+
+        StashDBBuilder(settings.stash_db_path).with_scene(
+            SceneBuilder({"id": "1"}).with_files([]).build_dict()
+        ).build()
+
+        hook_input = {"id": "1", "title": "Title"}
+        assert not main.skip_updated_scenes_with_cached_settings(
+            hook_input, ["id", "title"]
+        )
+
+        record_scene_fingerprints(
+            settings.scene_fingerprints_path,
+            settings.config_hash,
+            settings.stash_db_path,
+            [1],
+            settings.file_path_input_fields,
+        )
+
+        assert main.skip_updated_scenes_with_cached_settings(
+            hook_input, ["id", "title"]
+        )
+
+    def test_skip_unchanged_scenes_disabled(
+        self, mocker: MockerFixture, tmp_path: Path
+    ):
+        self.mock_settings(
+            mocker, create_settings(tmp_path, skip_unchanged_scenes=False)
+        )
+
+        assert not main.skip_updated_scenes_with_cached_settings(
+            {"id": "1", "rating100": 80}, ["id", "rating100"]
+        )
+
+
+class TestImportTiming:
+    def test_times_first_imports(self, monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.delitem(sys.modules, "colorsys", raising=False)
+        monkeypatch.setattr(
+            builtins, "__import__", components.import_timing._timed_import
+        )
+        drain_import_durations()
+
+        import colorsys
+        import json
+
+        durations = drain_import_durations()
+
+        assert list(durations) == ["import.colorsys"]
+        assert durations["import.colorsys"][0] >= 0
@@ -0,0 +1,222 @@
+import json
+import threading
+from pathlib import Path
+
+import pytest
+from pytest_mock import MockerFixture
+
+import main
+from components.instrumentation import (
+    RESERVOIR_SIZE,
+    RunMetrics,
+    get_run_metrics,
+    percentile,
+    report_run_metrics,
+    reset_run_metrics,
+)
+from components.stash_db import StashDB
+from test_utils.config_builder import ConfigBuilder
+from test_utils.helpers import run_renamer_with_mock
+from test_utils.scene_builder import SceneBuilder
+from test_utils.scene_file_builder import SceneFileBuilder
+from test_utils.stash_db_builder import StashDBBuilder
+
+
+@pytest.fixture(autouse=True)
+def run_metrics():
+    return reset_run_metrics()
+
+
+class TestRunMetrics:
+    def test_percentiles(self):
+        values = [float(value) for value in range(1, 101)]
+
+        assert percentile(values, 50) == 50
+        assert percentile(values, 99) == 99
+        assert percentile([3.0], 99) == 3
+
+    def test_summary(self):
+        run_metrics = RunMetrics()
+
+        for seconds in [0.1, 0.2, 0.3, 0.4]:
+            run_metrics.record("plan.file", seconds)
+
+        run_metrics.count("graphql.bytes_fetched", 100)
+        run_metrics.count("graphql.bytes_fetched", 50)
+
+        summary = run_metrics.summary()
+
+        assert summary["timers"]["plan.file"] == {
+            "count": 4,
+            "total_seconds": 1.0,
+            "p50_seconds": 0.2,
+            "p99_seconds": 0.4,
+            "max_seconds": 0.4,
+        }
+        assert summary["counters"] == {"graphql.bytes_fetched": 150}
+
+    def test_merges_drained_metrics(self):
+        planner_metrics = RunMetrics()
+        planner_metrics.record("plan.file", 0.5)
+        planner_metrics.count("plan.duplicate_suffixes")
+
+        run_metrics = RunMetrics()
+        run_metrics.record("plan.file", 0.25)
+        run_metrics.merge(planner_metrics.drain())
+
+        assert planner_metrics.summary()["timers"] == {}
+        assert run_metrics.summary()["timers"]["plan.file"]["count"] == 2
+        assert run_metrics.summary()["counters"] == {"plan.duplicate_suffixes": 1}
+
+    def test_timers_keep_a_bounded_sample_of_durations(self):
+        run_metrics = RunMetrics()
+
+        for milliseconds in range(1, 10_001):
+            run_metrics.record("plan.file", milliseconds / 1000)
+
+        other_metrics = RunMetrics()
+        other_metrics.record("plan.file", 20.0)
+        run_metrics.merge(other_metrics.drain())
+
+        count, total, max_seconds, samples = run_metrics.drain()[0]["plan.file"]
+
+        assert (count, max_seconds) == (10_001, 20.0)
+        assert total == pytest.approx(50_025.0)
+        assert len(samples) == RESERVOIR_SIZE
+
+    def test_combines_metrics_recorded_by_threads(self):
+        run_metrics = RunMetrics()
+
+        def record_metrics():
+            for _ in range(100):
+                run_metrics.record("move.rename", 0.01)
+                run_metrics.count("files.moved")
+
+        threads = [threading.Thread(target=record_metrics) for _ in range(4)]
+
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        summary = run_metrics.summary()
+
+        assert summary["timers"]["move.rename"]["count"] == 400
+        assert summary["timers"]["move.rename"]["p50_seconds"] == 0.01
+        assert summary["counters"] == {"files.moved": 400}
+
+    def test_report_writes_metrics_file(self, run_metrics: RunMetrics, tmp_path: Path):
+        run_metrics.count("files.planned", 3)
+
+        metrics_path = tmp_path / "run_metrics.json"
+        report_run_metrics(str(metrics_path))
+
+        assert json.loads(metrics_path.read_text())["counters"] == {"files.planned": 3}
+
+
+class TestRunMetricsPath:
+    @pytest.mark.parametrize(
+        "plugin_input,run_metrics_file_name",
+        [
+            ('{"args": {"mode": "apply_plan"}}', "run_metrics.apply_plan.json"),
+            (
+                '{"args": {"hookContext": {"input": {"id": "1"}, "inputFields": ["id"]}}}',
+                "run_metrics.hook.json",
+            ),
+        ],
+    )
+    def test_one_file_per_mode(
+        self,
+        mocker: MockerFixture,
+        tmp_path: Path,
+        plugin_input: str,
+        run_metrics_file_name: str,
+    ):
+        mocker.patch.object(main, "_run_mode", "all_scenes")
+        mocker.patch(
+            "main.get_run_metrics_path_template",
+            return_value=str(tmp_path / "run_metrics.{mode}.json"),
+        )
+        mocker.patch("main.apply_plan")
+        mocker.patch("main.skip_updated_scenes_with_cached_settings", return_value=True)
+
+        main.handle_plugin_input(plugin_input)
+
+        assert main.get_run_metrics_path() == str(tmp_path / run_metrics_file_name)
+
+
+class TestReportRunMetrics:
+    @pytest.fixture(autouse=True)
+    def read_plugin_input(self, mocker: MockerFixture):
+        return mocker.patch("main.read_plugin_input", return_value="")
+
+    def test_keeps_the_error_of_the_run(self, mocker: MockerFixture):
+        mocker.patch("main.rename_all_scenes", side_effect=ValueError("Run failed"))
+        mocker.patch("main.is_config_loaded", return_value=False)
+        get_config_mock = mocker.patch(
+            "main.get_config", side_effect=ValueError("Invalid config")
+        )
+
+        with pytest.raises(ValueError, match="Run failed"):
+            main.main()
+
+        get_config_mock.assert_not_called()
+
+    def test_does_not_fail_the_run(self, mocker: MockerFixture, tmp_path: Path):
+        rename_all_scenes_mock = mocker.patch("main.rename_all_scenes")
+        mocker.patch(
+            "main.get_run_metrics_path",
+            return_value=str(tmp_path / "missing" / "run_metrics.json"),
+        )
+
+        main.main()
+
+        rename_all_scenes_mock.assert_called_once()
+
+
+class TestProcessScenesMetrics:
+    def test_records_stages_of_each_file(self, mocker: MockerFixture):
+        scenes = [
+            SceneBuilder({"id": str(scene_id)})
+            .with_files([SceneFileBuilder(str(scene_id)).build_dict()])
+            .build()
+            for scene_id in range(1, 4)
+        ]
+
+        run_renamer_with_mock(mocker, ConfigBuilder().build(), scenes, [])
+
+        summary = get_run_metrics().summary()
+
+        assert summary["counters"]["scenes.processed"] == 3
+        assert summary["counters"]["files.planned"] == 3
+        assert summary["timers"]["plan.file"]["count"] == 3
+        assert summary["timers"]["plan.fill_template"]["count"] == 3
+        assert summary["timers"]["move.rename"]["count"] == 3
+        assert summary["timers"]["file.total"]["count"] == 3
+
+
+class TestStashDBMetrics:
+    def test_records_rows_written(self, tmp_path: Path):
+        sqlite_path = (
+            StashDBBuilder(str(tmp_path / "stash.db"))
+            .with_folder(str(tmp_path))
+            .with_file(1, str(tmp_path / "file1.mp4"))
+            .with_file(2, str(tmp_path / "file2.mp4"))
+            .build()
+        )
+
+        stash_db = StashDB(sqlite_path, dryrun_enabled=False, commit_batch_size=None)
+
+        for file_id in [1, 2]:
+            file = SceneFileBuilder(str(file_id)).build()
+            stash_db.rename(file, str(tmp_path / "renamed" / f"file{file_id}.mp4"))
+
+        stash_db.commit()
+        stash_db.close()
+
+        summary = get_run_metrics().summary()
+
+        # 2 updated files and 1 new folder
+        assert summary["counters"]["stash_db.rows_written"] == 3
+        assert summary["counters"]["stash_db.commits"] == 1
+        assert summary["timers"]["stash_db.update_file"]["count"] == 2
@@ -0,0 +1,113 @@
+from pathlib import Path
+
+import pytest
+from pytest_mock import MockerFixture
+
+import components.process_scenes
+from components.process_scenes import process_scenes
+from models.studio import Studio
+from test_utils.config_builder import ConfigBuilder
+from test_utils.scene_builder import SceneBuilder
+from test_utils.scene_file_builder import SceneFileBuilder
+from test_utils.stash_db_builder import StashDBBuilder, get_stash_db_file_path
+
+# (scene title, number of files), the duplicate titles generate colliding file paths
+SCENES = [
+    ("Scene A", 1),
+    ("Scene B", 2),
+    ("Scene A", 1),
+    ("Scene C", 1),
+    ("Scene A", 2),
+    ("Scene B", 1),
+    ("Scene D", 1),
+]
+
+
+def run_renamer(
+    mocker: MockerFixture,
+    root_dir: Path,
+    planner_workers: int,
+    pipeline_enabled: bool,
+) -> dict[int, str]:
+    """
+    Renames the SCENES files in root_dir, returns the new path (relative to root_dir) of each file id
+    """
+
+    files_dir = root_dir / "files"
+    renamed_dir = root_dir / "renamed"
+    files_dir.mkdir(parents=True)
+    renamed_dir.mkdir()
+
+    # a file that is not part of any scene is already at one of the new paths
+    (renamed_dir / "Scene C.mp4").touch()
+
+    stash_db_builder = StashDBBuilder(str(root_dir / "stash.db")).with_folder(
+        str(root_dir)
+    )
+
+    scenes = []
+    file_id = 0
+    for scene_id, (title, file_count) in enumerate(SCENES, 1):
+        files = []
+
+        for _ in range(file_count):
+            file_id += 1
+            file_path = files_dir / f"file{file_id}.mp4"
+            file_path.touch()
+
+            stash_db_builder.with_file(file_id, str(file_path))
+            files.append(
+                SceneFileBuilder(str(file_id))
+                .with_file_path(str(file_path))
+                .build_dict()
+            )
+
+        scenes.append(
+            SceneBuilder({"id": scene_id}).with_title(title).with_files(files).build()
+        )
+
+    sqlite_path = stash_db_builder.build()
+
+    config = (
+        ConfigBuilder()
+        .with_dryrun_enabled(False)
+        .with_stash_db(sqlite_path)
+        .with_pipeline_enabled(pipeline_enabled)
+        .with_planner_workers(planner_workers, planner_chunk_size=2)
+        .with_file_name_templates([{"TEMPLATE": "{title}"}])
+        .with_file_dir_templates([{"TEMPLATE": str(renamed_dir)}])
+        .build()
+    )
+    mocker.patch("components.process_scenes.get_config", return_value=config)
+
+    process_scenes(scenes, [Studio(**{"id": 1, "name": "Studio A"})])
+
+    new_file_paths = {}
+    for file_id in range(1, file_id + 1):
+        new_file_path = Path(get_stash_db_file_path(sqlite_path, file_id))
+
+        assert new_file_path.is_file()
+        new_file_paths[file_id] = str(new_file_path.relative_to(root_dir))
+
+    return new_file_paths
+
+
+class TestParallelPlanning:
+    @pytest.mark.parametrize("pipeline_enabled", [True, False])
+    def test_same_renames_as_single_process(
+        self, mocker: MockerFixture, tmp_path: Path, pipeline_enabled: bool
+    ):
+        expected_file_paths = run_renamer(
+            mocker, tmp_path / "single", 1, pipeline_enabled
+        )
+
+        # only the files planned again on the current process are recorded, not the ones planned in the pool
+        plan_file_rename_spy = mocker.spy(components.process_scenes, "plan_file_rename")
+        file_paths = run_renamer(mocker, tmp_path / "parallel", 2, pipeline_enabled)
+
+        assert plan_file_rename_spy.call_count > 0
+
+        assert file_paths == expected_file_paths
+        assert len(set(file_paths.values())) == len(file_paths)
+        assert str(Path("renamed") / "Scene A (2).mp4") in file_paths.values()
+        assert str(Path("renamed") / "Scene C (1).mp4") in file_paths.values()
@@ -0,0 +1,149 @@
+import threading
+
+import pytest
+from pytest_mock import MockerFixture
+
+from components.pipeline import run_pipeline, run_serially
+from test_utils.config_builder import ConfigBuilder
+from test_utils.helpers import run_renamer_with_mock
+from test_utils.scene_builder import SceneBuilder
+from test_utils.scene_file_builder import SceneFileBuilder
+
+
+class TestRunPipeline:
+    def test_items_go_through_every_stage_in_order(self):
+        results = []
+
+        run_pipeline(
+            range(50),
+            [
+                lambda item: [item, item + 1000],
+                lambda item: [item * 2],
+                lambda item: results.append(item) or [],
+            ],
+            queue_size=2,
+        )
+
+        expected = []
+        run_serially(
+            range(50),
+            [
+                lambda item: [item, item + 1000],
+                lambda item: [item * 2],
+                lambda item: expected.append(item) or [],
+            ],
+        )
+
+        assert results == expected
+
+    def test_stages_run_on_their_own_threads(self):
+        thread_names = set()
+
+        def record_thread(item):
+            thread_names.add(threading.current_thread().name)
+            return [item]
+
+        run_pipeline(range(5), [record_thread, record_thread], queue_size=1)
+
+        assert len(thread_names) == 2
+        assert threading.current_thread().name not in thread_names
+
+    def test_stage_error_is_raised_and_downstream_items_are_finished(self):
+        committed = []
+
+        def plan(item):
+            if item == 3:
+                raise ValueError("planning failed")
+            return [item]
+
+        with pytest.raises(ValueError):
+            run_pipeline(
+                range(10), [plan, lambda item: committed.append(item) or []], 1
+            )
+
+        assert committed == [0, 1, 2]
+
+    def test_source_stops_when_a_stage_fails(self):
+        pulled = []
+
+        def source():
+            for item in range(1000):
+                pulled.append(item)
+                yield item
+
+        def fail(item):
+            raise ValueError("stage failed")
+
+        with pytest.raises(ValueError):
+            run_pipeline(source(), [fail], queue_size=1)
+
+        assert len(pulled) < 1000
+
+
+class TestProcessScenesPipeline:
+    def test_pipeline_matches_serial_processing(self, mocker: MockerFixture):
+        scenes = [
+            SceneBuilder({"id": str(idx)})
+            .with_title(f"Scene {idx}")
+            .with_files(
+                [
+                    SceneFileBuilder(id=str(idx))
+                    .with_file_path(f"/library/file {idx}.mp4")
+                    .build_dict()
+                ]
+            )
+            .build()
+            for idx in range(20)
+        ]
+        studios = [scene.studio for scene in scenes[:1] if scene.studio]
+
+        config_builder = ConfigBuilder().with_file_dir_templates(
+            [{"TEMPLATE": "/renamed/{studio}"}]
+        )
+
+        pipeline_renames = run_renamer_with_mock(
+            mocker, config_builder.with_pipeline_enabled(True).build(), scenes, studios
+        )
+        serial_renames = run_renamer_with_mock(
+            mocker, config_builder.with_pipeline_enabled(False).build(), scenes, studios
+        )
+
+        assert len(pipeline_renames) == 20
+        assert pipeline_renames == serial_renames
+
+    def test_files_planned_to_the_same_path_get_a_duplicate_suffix(
+        self, mocker: MockerFixture
+    ):
+        scene = (
+            SceneBuilder()
+            .with_title("Same Title")
+            .with_files(
+                [
+                    SceneFileBuilder(id="1")
+                    .with_file_path("/library/a.mp4")
+                    .build_dict(),
+                    SceneFileBuilder(id="2")
+                    .with_file_path("/library/b.mp4")
+                    .build_dict(),
+                ]
+            )
+            .build()
+        )
+        studios = [scene.studio] if scene.studio else []
+
+        config = (
+            ConfigBuilder()
+            .with_file_name_templates([{"TEMPLATE": "{title}"}])
+            .with_file_dir_templates([{"TEMPLATE": "/renamed"}])
+            .with_pipeline_enabled(True)
+            .build()
+        )
+
+        mocker.patch("components.destination_index.list_file_names", return_value=set())
+
+        renames = run_renamer_with_mock(mocker, config, [scene], studios)
+
+        assert [rename["dst_file_name"] for rename in renames] == [
+            "Same Title",
+            "Same Title (1)",
+        ]
@@ -0,0 +1,64 @@
+import io
+import json
+
+import pytest
+
+from components.plugin_input import read_plugin_input
+
+
+def create_hook_plugin_input(hook_input: dict, input_fields: list[str]) -> dict:
+    return {
+        "server_connection": {"Scheme": "http", "Port": 9999, "Dir": "C:\\stash"},
+        "args": {
+            "hookContext": {
+                "id": 1,
+                "type": "Scene.Update.Post",
+                "input": hook_input,
+                "inputFields": input_fields,
+            }
+        },
+    }
+
+
+class TestReadPluginInput:
+    @pytest.mark.parametrize("chunk_size", [1, 3, 64 * 1024])
+    def test_skips_cover_image_and_details(self, chunk_size: int):
+        hook_input = {
+            "id": "1",
+            "title": 'A "quoted" title \\ é',
+            "rating100": 80,
+            "organized": True,
+            "performer_ids": ["1", "2"],
+        }
+        input_fields = [*hook_input, "cover_image", "details"]
+
+        plugin_input = create_hook_plugin_input(
+            {
+                **hook_input,
+                "cover_image": "data:image/jpeg;base64," + "QUJD\\/" * 1000,
+                "details": 'Details with "quotes" \\\\',
+            },
+            input_fields,
+        )
+
+        assert json.loads(
+            read_plugin_input(io.StringIO(json.dumps(plugin_input)), chunk_size)
+        ) == create_hook_plugin_input(hook_input, input_fields)
+
+    def test_keeps_other_fields(self):
+        plugin_input = {"args": {"mode": "all_scenes", "details": "Details"}}
+
+        assert json.loads(
+            read_plugin_input(io.StringIO(json.dumps(plugin_input, indent=2)), 5)
+        ) == {"args": {"mode": "all_scenes", "details": "Details"}}
+
+    def test_empty_input(self):
+        assert read_plugin_input(io.StringIO(" \n")) == ""
+
+    @pytest.mark.parametrize(
+        "plugin_input",
+        ['{"args": {}', '{"args" {}}', '{"args": [1 2]}', '{"args": "', "{} {}"],
+    )
+    def test_invalid_input(self, plugin_input: str):
+        with pytest.raises(ValueError, match="Invalid plugin input"):
+            read_plugin_input(io.StringIO(plugin_input), 2)
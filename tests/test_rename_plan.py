@@ -0,0 +1,133 @@
+from pathlib import Path
+
+import pytest
+from pytest_mock import MockerFixture
+
+from components.process_scenes import apply_rename_plan, process_scenes
+from components.rename_plan import read_rename_plan
+from models.studio import Studio
+from test_utils.config_builder import ConfigBuilder
+from test_utils.scene_builder import SceneBuilder
+from test_utils.scene_file_builder import SceneFileBuilder
+from test_utils.stash_db_builder import StashDBBuilder, get_stash_db_file_path
+
+
+class TestRenamePlan:
+    @pytest.fixture
+    def studio(self):
+        return Studio(**{"id": 1, "name": "Studio A"})
+
+    @pytest.fixture
+    def scenes(self, tmp_path: Path):
+        scenes = []
+
+        for scene_id, title in enumerate(["Scene A", "Scene B", "Scene A"], 1):
+            file_path = tmp_path / "files" / f"file{scene_id}.mp4"
+            file_path.parent.mkdir(exist_ok=True)
+            file_path.touch()
+
+            scenes.append(
+                SceneBuilder({"id": scene_id})
+                .with_title(title)
+                .with_files(
+                    [
+                        SceneFileBuilder(str(scene_id))
+                        .with_file_path(str(file_path))
+                        .build_dict()
+                    ]
+                )
+                .build()
+            )
+
+        return scenes
+
+    @pytest.fixture
+    def sqlite_path(self, tmp_path: Path, scenes):
+        stash_db_builder = StashDBBuilder(str(tmp_path / "stash.db")).with_folder(
+            str(tmp_path)
+        )
+
+        for scene in scenes:
+            stash_db_builder.with_file(int(scene.files[0].id), scene.files[0].path)
+
+        return stash_db_builder.build()
+
+    @pytest.fixture
+    def config(self, mocker: MockerFixture, tmp_path: Path, sqlite_path: str):
+        config = (
+            ConfigBuilder()
+            .with_dryrun_enabled(False)
+            .with_stash_db(sqlite_path)
+            .with_file_name_templates([{"TEMPLATE": "{title}"}])
+            .with_file_dir_templates([{"TEMPLATE": str(tmp_path / "renamed")}])
+            .build()
+        )
+        mocker.patch("components.process_scenes.get_config", return_value=config)
+
+        return config
+
+    @pytest.mark.parametrize("pipeline_enabled", [True, False])
+    def test_plan_does_not_rename(
+        self,
+        mocker: MockerFixture,
+        tmp_path: Path,
+        config,
+        scenes,
+        studio: Studio,
+        pipeline_enabled: bool,
+    ):
+        config.PROCESSING_CONFIG = {"PIPELINE_ENABLED": pipeline_enabled}
+        rename_mock = mocker.patch("components.process_scenes.rename")
+        plan_path = str(tmp_path / "plan.jsonl")
+
+        process_scenes(scenes, [studio], plan_path=plan_path)
+
+        rename_mock.assert_not_called()
+
+        planned_renames = list(read_rename_plan(plan_path))
+
+        assert [
+            (planned_rename.scene_id, planned_rename.file_id)
+            for planned_rename in planned_renames
+        ] == [("1", "1"), ("2", "2"), ("3", "3")]
+        # the 1st file is not moved, but its planned path is taken
+        assert [
+            Path(planned_rename.dst).name for planned_rename in planned_renames
+        ] == [
+            "Scene A.mp4",
+            "Scene B.mp4",
+            "Scene A (1).mp4",
+        ]
+        assert not Path(f"{plan_path}.tmp").exists()
+
+    def test_apply_plan(
+        self, tmp_path: Path, config, scenes, studio: Studio, sqlite_path: str
+    ):
+        plan_path = str(tmp_path / "plan.jsonl")
+        process_scenes(scenes, [studio], plan_path=plan_path)
+
+        apply_rename_plan(plan_path)
+
+        for planned_rename in read_rename_plan(plan_path):
+            assert not Path(planned_rename.src).exists()
+            assert Path(planned_rename.dst).is_file()
+            assert (
+                get_stash_db_file_path(sqlite_path, int(planned_rename.file_id))
+                == planned_rename.dst
+            )
+
+    def test_apply_plan_skips_moved_files(
+        self, tmp_path: Path, config, scenes, studio: Studio, sqlite_path: str
+    ):
+        plan_path = str(tmp_path / "plan.jsonl")
+        process_scenes(scenes, [studio], plan_path=plan_path)
+
+        # the file of the 2nd scene was moved after the plan was written
+        moved_file_path = tmp_path / "moved.mp4"
+        Path(scenes[1].files[0].path).rename(moved_file_path)
+
+        apply_rename_plan(plan_path)
+
+        assert get_stash_db_file_path(sqlite_path, 2) == scenes[1].files[0].path
+        assert not (tmp_path / "renamed" / "Scene B.mp4").exists()
+        assert (tmp_path / "renamed" / "Scene A (1).mp4").is_file()
@@ -0,0 +1,277 @@
+import json
+import multiprocessing
+import socket
+import sys
+import threading
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+from pytest_mock import MockerFixture
+
+import components.hook_startup_cache
+import main
+from components.daemon_client import RenamerDaemonError, forward_to_daemon
+from components.instrumentation import get_run_metrics, reset_run_metrics
+from components.renamer_session import RenamerSession
+from components.stash_graphql import StashGraphQL
+from models.studio import Studio, StudiosVersion
+from test_utils.config_builder import ConfigBuilder
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(socket, "AF_UNIX"), reason="the renamer daemon needs Unix sockets"
+)
+
+
+@pytest.fixture
+def source_path(mocker: MockerFixture, tmp_path: Path) -> Path:
+    source_path = tmp_path / "src" / "user_config.py"
+    source_path.parent.mkdir()
+    source_path.write_text("user_config = {}")
+
+    mocker.patch.object(components.hook_startup_cache, "SOURCE_DIR", source_path.parent)
+
+    return source_path
+
+
+@pytest.fixture
+def socket_path(tmp_path: Path) -> str:
+    return str(tmp_path / "renamer_daemon.sock")
+
+
+def serve_test_daemon(socket_path: str, plugin_inputs_path: str, idle_timeout: float):
+    from components.renamer_daemon import RenamerDaemon
+
+    def handle_plugin_input(plugin_input: str):
+        if plugin_input == "fail":
+            raise ValueError("Hook failed")
+
+        with open(plugin_inputs_path, "a") as plugin_inputs_file:
+            plugin_inputs_file.write(plugin_input + "\n")
+
+        get_run_metrics().count("scenes.processed")
+        print("\x01i\x02Renamed scene", file=sys.stderr)
+
+    with RenamerDaemon(socket_path, handle_plugin_input, idle_timeout) as daemon:
+        daemon.serve_until_stopped()
+
+
+class DaemonProcess:
+    "Runs a renamer daemon on a process of its own, like the daemon started by a hook"
+
+    def __init__(self, socket_path: str, idle_timeout: float = 5):
+        self.plugin_inputs_path = f"{socket_path}.inputs"
+
+        self.process = multiprocessing.get_context("fork").Process(
+            target=serve_test_daemon,
+            args=(socket_path, self.plugin_inputs_path, idle_timeout),
+            daemon=True,
+        )
+        self.process.start()
+
+    @property
+    def plugin_inputs(self) -> list[str]:
+        try:
+            return Path(self.plugin_inputs_path).read_text().splitlines()
+        except FileNotFoundError:
+            return []
+
+    def stop(self):
+        self.process.terminate()
+        self.process.join()
+
+
+@pytest.fixture
+def start_daemon_mock(mocker: MockerFixture):
+    # the hooks wait for the daemons started by the tests to listen on the socket
+    return mocker.patch("components.daemon_client.start_daemon")
+
+
+@pytest.fixture
+def daemon_process(source_path: Path, socket_path: str, start_daemon_mock):
+    daemon_process = DaemonProcess(socket_path)
+    yield daemon_process
+    daemon_process.stop()
+
+
+class TestRenamerDaemon:
+    def test_runs_forwarded_hooks(
+        self, daemon_process: DaemonProcess, socket_path: str, capsys
+    ):
+        reset_run_metrics()
+
+        assert forward_to_daemon(socket_path, '{"args": {}}')
+        assert forward_to_daemon(socket_path, '{"args": {"mode": "test"}}')
+
+        assert daemon_process.plugin_inputs == [
+            '{"args": {}}',
+            '{"args": {"mode": "test"}}',
+        ]
+        assert capsys.readouterr().err == "\x01i\x02Renamed scene\n" * 2
+        summary = get_run_metrics().summary()
+        assert summary["counters"]["scenes.processed"] == 2
+        assert summary["timers"]["daemon.request"]["count"] == 2
+
+    def test_failed_hook(self, daemon_process: DaemonProcess, socket_path: str):
+        with pytest.raises(RenamerDaemonError, match="Hook failed"):
+            forward_to_daemon(socket_path, "fail")
+
+        # the daemon keeps running after a failed hook
+        assert forward_to_daemon(socket_path, "{}")
+
+    def test_stops_when_the_config_changed(
+        self, daemon_process: DaemonProcess, source_path: Path, socket_path: str
+    ):
+        assert forward_to_daemon(socket_path, "{}")
+
+        source_path.write_text("user_config = {'DRYRUN_ENABLED': False}")
+
+        assert not forward_to_daemon(socket_path, "{}")
+
+        daemon_process.process.join(timeout=5)
+        assert not daemon_process.process.is_alive()
+        assert daemon_process.plugin_inputs == ["{}"]
+        assert not Path(socket_path).exists()
+
+    def test_stops_on_a_request_of_another_protocol_version(
+        self, daemon_process: DaemonProcess, socket_path: str
+    ):
+        assert forward_to_daemon(socket_path, "{}")
+
+        # a request sent by a hook of an earlier version
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.connect(socket_path)
+            conn.sendall(json.dumps({"plugin_input": "{}"}).encode() + b"\n")
+
+            assert json.loads(conn.makefile("r").readline()) == {"status": "restart"}
+
+        daemon_process.process.join(timeout=5)
+        assert not daemon_process.process.is_alive()
+        assert daemon_process.plugin_inputs == ["{}"]
+
+    def test_does_not_replace_a_running_daemon(
+        self,
+        mocker: MockerFixture,
+        daemon_process: DaemonProcess,
+        socket_path: str,
+    ):
+        assert forward_to_daemon(socket_path, "{}")
+
+        config = ConfigBuilder().build()
+        config.HOOK_CONFIG = {"DAEMON_SOCKET_PATH": socket_path}
+        mocker.patch("main.get_config", return_value=config)
+        renamer_daemon_mock = mocker.patch("components.renamer_daemon.RenamerDaemon")
+
+        main.serve_daemon()
+
+        renamer_daemon_mock.assert_not_called()
+        assert forward_to_daemon(socket_path, "{}")
+        assert daemon_process.plugin_inputs == ["{}", "{}"]
+
+    def test_fails_the_hook_when_the_daemon_does_not_reply(
+        self, mocker: MockerFixture, socket_path: str, start_daemon_mock
+    ):
+        mocker.patch("components.daemon_client.DAEMON_REPLY_TIMEOUT", 0.1)
+
+        # a daemon stuck before accepting the connection
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+            server.bind(socket_path)
+            server.listen()
+
+            # the daemon may still run the hook, so it is not run on the hook process
+            with pytest.raises(RenamerDaemonError, match="did not reply"):
+                forward_to_daemon(socket_path, "{}")
+
+        start_daemon_mock.assert_not_called()
+
+    def test_fails_the_hook_when_the_daemon_closes_the_connection(
+        self, socket_path: str, start_daemon_mock
+    ):
+        # a daemon that stopped while running the hook
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+            server.bind(socket_path)
+            server.listen()
+
+            def close_after_request():
+                conn, _ = server.accept()
+                with conn:
+                    conn.makefile("r").readline()
+
+            daemon_thread = threading.Thread(target=close_after_request)
+            daemon_thread.start()
+
+            with pytest.raises(RenamerDaemonError, match="closed the connection"):
+                forward_to_daemon(socket_path, "{}")
+
+            daemon_thread.join()
+
+    def test_stops_when_idle(self, source_path: Path, socket_path: str):
+        daemon_process = DaemonProcess(socket_path, idle_timeout=0.05)
+
+        daemon_process.process.join(timeout=5)
+        assert not daemon_process.process.is_alive()
+
+    def test_starts_the_daemon(
+        self, start_daemon_mock, source_path: Path, socket_path: str
+    ):
+        daemon_processes: list[DaemonProcess] = []
+        start_daemon_mock.side_effect = lambda: daemon_processes.append(
+            DaemonProcess(socket_path)
+        )
+
+        try:
+            assert forward_to_daemon(socket_path, "{}")
+            assert forward_to_daemon(socket_path, "{}")
+        finally:
+            for daemon_process in daemon_processes:
+                daemon_process.stop()
+
+        assert len(daemon_processes) == 1
+        assert daemon_processes[0].plugin_inputs == ["{}", "{}"]
+
+
+class TestRenamerSession:
+    @pytest.fixture
+    def renamer_session(self, mocker: MockerFixture):
+        mocker.patch("components.renamer_session.StashGraphQL")
+
+        renamer_session = RenamerSession(ConfigBuilder().build(), None)
+        renamer_session.stash_graphql = MagicMock(spec=StashGraphQL)
+        renamer_session.stash_graphql.get_all_studios.return_value = [
+            Studio(id="1", name="Studio A")
+        ]
+
+        return renamer_session
+
+    def test_keeps_studios_until_they_change(
+        self, tmp_path: Path, renamer_session: RenamerSession
+    ):
+        renamer_session.studio_cache_path = str(tmp_path / "studio_cache.json")
+        stash_graphql = renamer_session.stash_graphql
+        stash_graphql.get_studios_version.return_value = StudiosVersion(count=1)
+
+        studios = renamer_session.get_studios()
+        template_matchers = renamer_session.get_template_matchers(studios)
+
+        assert renamer_session.get_studios() is studios
+        assert renamer_session.get_template_matchers(studios) is template_matchers
+        assert stash_graphql.get_all_studios.call_count == 1
+
+        stash_graphql.get_studios_version.return_value = StudiosVersion(count=2)
+
+        new_studios = renamer_session.get_studios()
+
+        assert new_studios is not studios
+        assert (
+            renamer_session.get_template_matchers(new_studios) is not template_matchers
+        )
+        assert stash_graphql.get_all_studios.call_count == 2
+
+    def test_fetches_studios_without_studio_cache(
+        self, renamer_session: RenamerSession
+    ):
+        renamer_session.get_studios()
+        renamer_session.get_studios()
+
+        assert renamer_session.stash_graphql.get_all_studios.call_count == 2
+        renamer_session.stash_graphql.get_studios_version.assert_not_called()
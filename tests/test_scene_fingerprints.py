@@ -0,0 +1,329 @@
+import sqlite3
+from pathlib import Path
+
+import pytest
+from pytest_mock import MockerFixture
+
+import main
+from components.scene_fingerprints import (
+    INPUT_FIELD_SCENE_KEYS,
+    SceneFingerprintStore,
+    read_scene_fingerprints,
+)
+from components.stash_db_reader import StashDBReader
+from components.template_dependencies import (
+    TEMPLATE_FILTER_INPUT_FIELDS,
+    TEMPLATE_VARIABLE_INPUT_FIELDS,
+    get_file_path_input_fields,
+)
+from components.template_parser import TEMPLATE_VARIABLE_NAMES
+from test_utils.config_builder import ConfigBuilder
+from test_utils.scene_builder import SceneBuilder
+from test_utils.scene_file_builder import SceneFileBuilder
+from test_utils.stash_db_builder import StashDBBuilder
+
+
+class TestFilePathInputFields:
+    def test_all_template_variables_have_input_fields(self):
+        assert set(TEMPLATE_VARIABLE_INPUT_FIELDS) == set(TEMPLATE_VARIABLE_NAMES)
+
+    def test_template_variables_and_filters(self):
+        config = (
+            ConfigBuilder()
+            .with_file_name_templates(
+                [
+                    {"TEMPLATE": "{title} {date:%Y}", "matches_any_tags": ["Tag"]},
+                    {"TEMPLATE": "{title}"},
+                ]
+            )
+            .with_file_dir_templates(
+                [{"TEMPLATE": "/videos/{studio}", "matches_organized_value": True}]
+            )
+            .build()
+        )
+
+        assert get_file_path_input_fields(config) == {
+            "title",
+            "date",
+            "tag_ids",
+            "studio_id",
+            "organized",
+        }
+
+    def test_templates_after_a_template_matching_every_scene(self):
+        config = (
+            ConfigBuilder()
+            .with_file_name_templates(
+                [
+                    {"TEMPLATE": "{title}", "matches_studio": "Studio A"},
+                    {"TEMPLATE": "{date:%Y}", "matches_any_tags": []},
+                    {"TEMPLATE": "{performers}", "matches_organized_value": True},
+                ]
+            )
+            .with_file_dir_templates([{"TEMPLATE": "/videos"}])
+            .build()
+        )
+
+        assert get_file_path_input_fields(config) == {"title", "studio_id", "date"}
+
+
+def build_stash_db(tmp_path: Path) -> str:
+    return (
+        StashDBBuilder(str(tmp_path / "stash.db"))
+        .with_scene(
+            SceneBuilder({"id": "1", "title": "Title"})
+            .with_studio(
+                {
+                    "id": "2",
+                    "name": "Sub Studio",
+                    "parent_studio": {"id": "1", "name": "Parent Studio"},
+                }
+            )
+            .with_tags(["Tag A", "Tag B"])
+            .with_files(
+                [
+                    SceneFileBuilder("1")
+                    .with_file_path(str(tmp_path / "videos" / "1.mp4"))
+                    .build_dict()
+                ]
+            )
+            .build_dict()
+        )
+        .with_scene(
+            SceneBuilder({"id": "2", "title": "Other Title"})
+            .with_studio(None)
+            .with_files([])
+            .build_dict()
+        )
+        .build()
+    )
+
+
+def update_stash_db(stash_db_path: str, sql: str):
+    conn = sqlite3.connect(stash_db_path)
+    conn.execute(sql)
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture
+def stash_db_path(tmp_path: Path) -> str:
+    return build_stash_db(tmp_path)
+
+
+class TestReadSceneFingerprints:
+    def read_fingerprints(self, stash_db_path: str, input_fields: list[str]):
+        with StashDBReader(stash_db_path) as stash_db_reader:
+            return read_scene_fingerprints(
+                stash_db_reader, [1, 2, 3], frozenset(input_fields)
+            )
+
+    def test_all_input_fields_resolve_to_scene_values(self):
+        assert set(INPUT_FIELD_SCENE_KEYS) == {
+            input_field
+            for input_fields in [
+                *TEMPLATE_VARIABLE_INPUT_FIELDS.values(),
+                *TEMPLATE_FILTER_INPUT_FIELDS.values(),
+            ]
+            for input_field in input_fields
+        }
+
+    def test_missing_scenes(self, stash_db_path: str):
+        assert set(self.read_fingerprints(stash_db_path, ["title"])) == {1, 2}
+
+    def test_resolved_values(self, stash_db_path: str):
+        input_fields = ["title", "studio_id", "tag_ids"]
+        fingerprints = self.read_fingerprints(stash_db_path, input_fields)
+
+        update_stash_db(stash_db_path, "UPDATE tags SET name = 'Tag C' WHERE id = 2")
+        renamed_tag_fingerprints = self.read_fingerprints(stash_db_path, input_fields)
+
+        update_stash_db(
+            stash_db_path, "UPDATE studios SET name = 'New Parent' WHERE id = 1"
+        )
+        renamed_studio_fingerprints = self.read_fingerprints(
+            stash_db_path, input_fields
+        )
+
+        assert renamed_tag_fingerprints[1] != fingerprints[1]
+        assert renamed_studio_fingerprints[1] != renamed_tag_fingerprints[1]
+        assert renamed_studio_fingerprints[2] == fingerprints[2]
+
+    def test_ignores_file_attributes_not_in_file_paths(self, stash_db_path: str):
+        fingerprints = self.read_fingerprints(stash_db_path, ["primary_file_id"])
+
+        update_stash_db(stash_db_path, "UPDATE files SET updated_at = 'now'")
+        assert self.read_fingerprints(stash_db_path, ["primary_file_id"]) == (
+            fingerprints
+        )
+
+        update_stash_db(stash_db_path, "UPDATE video_files SET height = 720")
+        assert self.read_fingerprints(stash_db_path, ["primary_file_id"]) != (
+            fingerprints
+        )
+
+    def test_file_paths(self, stash_db_path: str):
+        fingerprints = self.read_fingerprints(stash_db_path, ["title"])
+
+        # a file moved outside of the renamer
+        update_stash_db(stash_db_path, "UPDATE files SET basename = 'moved.mp4'")
+
+        assert self.read_fingerprints(stash_db_path, ["title"])[1] != fingerprints[1]
+
+
+class TestSceneFingerprintStore:
+    @pytest.fixture
+    def sqlite_path(self, tmp_path: Path):
+        return str(tmp_path / "scene_fingerprints.db")
+
+    def test_unknown_scene(self, sqlite_path: str):
+        scene_fingerprints = SceneFingerprintStore(sqlite_path, "config")
+
+        assert not scene_fingerprints.is_unchanged(1, "fingerprint")
+        assert not scene_fingerprints.is_unchanged(1, None)
+
+    def test_unchanged_fingerprint(self, sqlite_path: str):
+        scene_fingerprints = SceneFingerprintStore(sqlite_path, "config")
+        scene_fingerprints.update({1: "fingerprint", 2: "other fingerprint"})
+        scene_fingerprints.close()
+
+        scene_fingerprints = SceneFingerprintStore(sqlite_path, "config")
+
+        assert scene_fingerprints.is_unchanged(1, "fingerprint")
+        assert not scene_fingerprints.is_unchanged(1, "new fingerprint")
+
+    def test_config_change(self, sqlite_path: str):
+        scene_fingerprints = SceneFingerprintStore(sqlite_path, "config")
+        scene_fingerprints.update({1: "fingerprint"})
+        scene_fingerprints.close()
+
+        scene_fingerprints = SceneFingerprintStore(sqlite_path, "new config")
+
+        assert not scene_fingerprints.is_unchanged(1, "fingerprint")
+
+    def test_drops_fingerprints_of_previous_schema(self, sqlite_path: str):
+        conn = sqlite3.connect(sqlite_path)
+        conn.execute(
+            "CREATE TABLE scene_fingerprints (scene_id TEXT PRIMARY KEY, config_hash TEXT NOT NULL, field_hashes TEXT NOT NULL)"
+        )
+        conn.execute("INSERT INTO scene_fingerprints VALUES ('1', 'config', '{}')")
+        conn.commit()
+        conn.close()
+
+        scene_fingerprints = SceneFingerprintStore(sqlite_path, "config")
+
+        assert not scene_fingerprints.is_unchanged(1, "{}")
+
+        scene_fingerprints.update({1: "fingerprint"})
+        assert scene_fingerprints.is_unchanged(1, "fingerprint")
+
+
+class TestRenameUpdatedScene:
+    @pytest.fixture
+    def rename_scenes_mock(
+        self, mocker: MockerFixture, tmp_path: Path, stash_db_path: str
+    ):
+        config = (
+            ConfigBuilder()
+            .with_file_name_templates([{"TEMPLATE": "{title} - {studio}"}])
+            .with_stash_db(stash_db_path)
+            .build()
+        )
+        config.HOOK_CONFIG = {
+            "SKIP_UNCHANGED_SCENES": True,
+            "SCENE_FINGERPRINTS_PATH": str(tmp_path / "scene_fingerprints.db"),
+        }
+        mocker.patch("main.get_config", return_value=config)
+
+        # all the scenes are renamed
+        return mocker.patch(
+            "main.rename_scenes",
+            side_effect=lambda scene_ids, single_transaction: set(scene_ids),
+        )
+
+    def test_skips_fields_not_in_templates(self, rename_scenes_mock):
+        main.rename_updated_scene(1, ["id", "rating100"])
+
+        rename_scenes_mock.assert_not_called()
+
+    def test_skips_unchanged_values(self, rename_scenes_mock, stash_db_path: str):
+        main.rename_updated_scene(1, ["id", "title", "rating100"])
+        main.rename_updated_scene(1, ["id", "title", "rating100"])
+        assert rename_scenes_mock.call_count == 1
+
+        update_stash_db(stash_db_path, "UPDATE scenes SET title = 'New' WHERE id = 1")
+        main.rename_updated_scene(1, ["id", "title", "rating100"])
+        assert rename_scenes_mock.call_count == 2
+
+    def test_renames_scene_after_its_studio_was_renamed(
+        self, rename_scenes_mock, stash_db_path: str
+    ):
+        main.rename_updated_scene(1, ["id", "title"])
+
+        # renaming a studio does not update its scenes, the next update of the scene renames it
+        update_stash_db(stash_db_path, "UPDATE studios SET name = 'New' WHERE id = 2")
+        main.rename_updated_scene(1, ["id", "title"])
+
+        assert rename_scenes_mock.call_count == 2
+
+    def test_bulk_update(self, rename_scenes_mock):
+        main.rename_updated_scenes([1, 2], ["ids", "rating100"])
+        rename_scenes_mock.assert_not_called()
+
+        main.rename_updated_scenes([1, 2], ["ids", "title"])
+        rename_scenes_mock.assert_called_once_with([1, 2], False)
+
+        main.rename_updated_scene(2, ["id", "title"])
+        rename_scenes_mock.assert_called_once()
+
+    def test_renames_scene_again_after_a_failed_rename(
+        self, rename_scenes_mock, stash_db_path: str
+    ):
+        rename_scenes_mock.side_effect = [{1}, ValueError("Rename failed"), {1}]
+        main.rename_updated_scene(1, ["id", "title"])
+
+        update_stash_db(stash_db_path, "UPDATE scenes SET title = 'New' WHERE id = 1")
+        with pytest.raises(ValueError, match="Rename failed"):
+            main.rename_updated_scene(1, ["id", "title"])
+
+        update_stash_db(stash_db_path, "UPDATE scenes SET title = 'Title' WHERE id = 1")
+        main.rename_updated_scene(1, ["id", "title"])
+
+        assert rename_scenes_mock.call_count == 3
+
+    def test_renames_scene_again_after_a_file_failed_to_be_renamed(
+        self, rename_scenes_mock
+    ):
+        rename_scenes_mock.side_effect = lambda scene_ids, single_transaction: set()
+        main.rename_updated_scene(1, ["id", "title"])
+        main.rename_updated_scene(1, ["id", "title"])
+
+        assert rename_scenes_mock.call_count == 2
+
+    def test_applying_a_plan_clears_the_fingerprints(
+        self, mocker: MockerFixture, rename_scenes_mock
+    ):
+        apply_rename_plan_mock = mocker.patch(
+            "components.process_scenes.apply_rename_plan"
+        )
+        main.rename_updated_scene(1, ["id", "title"])
+
+        main.apply_plan()
+        main.rename_updated_scene(1, ["id", "title"])
+
+        apply_rename_plan_mock.assert_called_once()
+        assert rename_scenes_mock.call_count == 2
+
+    def test_renaming_all_scenes_clears_the_fingerprints(
+        self, mocker: MockerFixture, rename_scenes_mock
+    ):
+        mocker.patch("components.stash_graphql.StashGraphQL")
+        mocker.patch("components.studio_cache.get_studios", return_value=[])
+        process_scenes_mock = mocker.patch("components.process_scenes.process_scenes")
+        main.rename_updated_scene(1, ["id", "title"])
+
+        main.rename_all_scenes()
+        main.rename_updated_scene(1, ["id", "title"])
+
+        process_scenes_mock.assert_called_once()
+        assert rename_scenes_mock.call_count == 2
@@ -0,0 +1,369 @@
+import sqlite3
+from pathlib import Path
+
+import pytest
+from pytest_mock import MockerFixture
+
+from components.process_scenes import process_scenes
+from components.stash_db import StashDB, StashDBCommitError
+from models.studio import Studio
+from test_utils.config_builder import ConfigBuilder
+from test_utils.scene_builder import SceneBuilder
+from test_utils.scene_file_builder import SceneFileBuilder
+from test_utils.stash_db_builder import StashDBBuilder, get_stash_db_file_path
+
+
+class FailingCommitConnection:
+    "Wraps a sqlite connection whose commits always fail"
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def commit(self):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    def __getattr__(self, name: str):
+        return getattr(self.conn, name)
+
+
+def fail_stash_db_commits(mocker: MockerFixture):
+    connect = sqlite3.connect
+
+    mocker.patch(
+        "components.stash_db.sqlite3.connect",
+        side_effect=lambda *args, **kwargs: FailingCommitConnection(
+            connect(*args, **kwargs)
+        ),
+    )
+
+
+class TestStashDBCommits:
+    @pytest.fixture
+    def files_dir(self, tmp_path: Path):
+        return tmp_path / "files"
+
+    @pytest.fixture
+    def sqlite_path(self, tmp_path: Path, files_dir: Path):
+        stash_db_builder = StashDBBuilder(str(tmp_path / "stash.db")).with_folder(
+            str(tmp_path)
+        )
+
+        for file_id in range(1, 4):
+            stash_db_builder.with_file(file_id, str(files_dir / f"file{file_id}.mp4"))
+
+        return stash_db_builder.build()
+
+    def rename_files(self, stash_db: StashDB, files_dir: Path, file_ids: list[int]):
+        for file_id in file_ids:
+            file = (
+                SceneFileBuilder(str(file_id))
+                .with_file_path(str(files_dir / f"file{file_id}.mp4"))
+                .build()
+            )
+            stash_db.rename(file, str(files_dir / "renamed" / f"new{file_id}.mp4"))
+
+    def test_commits_every_batch(self, sqlite_path: str, files_dir: Path):
+        stash_db = StashDB(sqlite_path, dryrun_enabled=False, commit_batch_size=2)
+
+        self.rename_files(stash_db, files_dir, [1, 2, 3])
+
+        assert get_stash_db_file_path(sqlite_path, 2) == str(
+            files_dir / "renamed" / "new2.mp4"
+        )
+        # the 3rd rename is in the next, not yet committed, batch
+        assert get_stash_db_file_path(sqlite_path, 3) == str(files_dir / "file3.mp4")
+        assert len(stash_db.uncommitted_renames) == 1
+
+        stash_db.commit()
+        stash_db.close()
+
+        assert get_stash_db_file_path(sqlite_path, 3) == str(
+            files_dir / "renamed" / "new3.mp4"
+        )
+
+    def test_single_transaction(self, sqlite_path: str, files_dir: Path):
+        stash_db = StashDB(sqlite_path, dryrun_enabled=False, commit_batch_size=None)
+
+        self.rename_files(stash_db, files_dir, [1, 2, 3])
+
+        for file_id in [1, 2, 3]:
+            assert get_stash_db_file_path(sqlite_path, file_id) == str(
+                files_dir / f"file{file_id}.mp4"
+            )
+
+        stash_db.commit()
+        stash_db.close()
+
+        for file_id in [1, 2, 3]:
+            assert get_stash_db_file_path(sqlite_path, file_id) == str(
+                files_dir / "renamed" / f"new{file_id}.mp4"
+            )
+
+    def test_failed_commit_rolls_back_batch(
+        self, mocker: MockerFixture, sqlite_path: str, files_dir: Path
+    ):
+        fail_stash_db_commits(mocker)
+        stash_db = StashDB(sqlite_path, dryrun_enabled=False, commit_batch_size=2)
+
+        with pytest.raises(StashDBCommitError) as error:
+            self.rename_files(stash_db, files_dir, [1, 2])
+
+        assert [file.id for file, _ in error.value.renames] == ["1", "2"]
+        assert stash_db.uncommitted_renames == []
+
+        # the new folder and the file updates were rolled back
+        count = stash_db.cursor.execute(
+            "SELECT COUNT(*) FROM folders WHERE path = ?",
+            (str(files_dir / "renamed"),),
+        ).fetchone()[0]
+        assert count == 0
+        assert str(files_dir / "renamed") not in stash_db.folders_by_path
+
+        stash_db.close()
+
+
+class TestStashDBFolderCache:
+    @pytest.fixture
+    def files_dir(self, tmp_path: Path):
+        return tmp_path / "files"
+
+    @pytest.fixture
+    def sqlite_path(self, tmp_path: Path, files_dir: Path):
+        stash_db_builder = StashDBBuilder(str(tmp_path / "stash.db")).with_folder(
+            str(tmp_path)
+        )
+
+        for file_id in range(1, 4):
+            stash_db_builder.with_file(file_id, str(files_dir / f"file{file_id}.mp4"))
+
+        return stash_db_builder.build()
+
+    def trace_folder_queries(self, stash_db: StashDB) -> list[str]:
+        folder_queries = []
+
+        stash_db.conn.set_trace_callback(
+            lambda statement: (
+                folder_queries.append(statement)
+                if "FROM folders" in statement
+                else None
+            )
+        )
+
+        return folder_queries
+
+    def rename_files(self, stash_db: StashDB, files_dir: Path, dir_name: str):
+        for file_id in range(1, 4):
+            file = (
+                SceneFileBuilder(str(file_id))
+                .with_file_path(str(files_dir / f"file{file_id}.mp4"))
+                .build()
+            )
+            stash_db.rename(file, str(files_dir / dir_name / f"new{file_id}.mp4"))
+
+    def test_caches_looked_up_folders(self, sqlite_path: str, files_dir: Path):
+        stash_db = StashDB(sqlite_path, dryrun_enabled=False)
+        folder_queries = self.trace_folder_queries(stash_db)
+
+        self.rename_files(stash_db, files_dir, "")
+
+        assert len(folder_queries) == 1
+        assert stash_db.folders_by_path[str(files_dir)].id is not None
+
+        stash_db.close()
+
+    def test_caches_inserted_folders(self, sqlite_path: str, files_dir: Path):
+        stash_db = StashDB(sqlite_path, dryrun_enabled=False)
+        folder_queries = self.trace_folder_queries(stash_db)
+
+        self.rename_files(stash_db, files_dir, "renamed")
+
+        # the new folder and its parent are looked up once, the folder is inserted, then read from the cache
+        assert len(folder_queries) == 2
+
+        stash_db.close()
+
+        assert get_stash_db_file_path(sqlite_path, 3) == str(
+            files_dir / "renamed" / "new3.mp4"
+        )
+
+    def test_preload_folders(self, sqlite_path: str, files_dir: Path):
+        stash_db = StashDB(sqlite_path, dryrun_enabled=False, preload_folders=True)
+        folder_queries = self.trace_folder_queries(stash_db)
+
+        assert str(files_dir) in stash_db.folders_by_path
+
+        self.rename_files(stash_db, files_dir, "")
+
+        assert folder_queries == []
+
+        stash_db.close()
+
+
+class TestProcessScenesStashDB:
+    @pytest.fixture
+    def studio(self):
+        return Studio(**{"id": 1, "name": "Studio A"})
+
+    @pytest.fixture
+    def scenes(self, tmp_path: Path):
+        scenes = []
+
+        for scene_id in range(1, 4):
+            file_path = tmp_path / "files" / f"file{scene_id}.mp4"
+            file_path.parent.mkdir(exist_ok=True)
+            file_path.touch()
+
+            scenes.append(
+                SceneBuilder({"id": scene_id})
+                .with_title(f"Scene {scene_id}")
+                .with_files(
+                    [
+                        SceneFileBuilder(str(scene_id))
+                        .with_file_path(str(file_path))
+                        .build_dict()
+                    ]
+                )
+                .build()
+            )
+
+        return scenes
+
+    @pytest.fixture
+    def sqlite_path(self, tmp_path: Path, scenes):
+        stash_db_builder = StashDBBuilder(str(tmp_path / "stash.db")).with_folder(
+            str(tmp_path)
+        )
+
+        for scene in scenes:
+            stash_db_builder.with_file(int(scene.files[0].id), scene.files[0].path)
+
+        return stash_db_builder.build()
+
+    def create_config(
+        self, tmp_path: Path, sqlite_path: str, pipeline_enabled: bool = True
+    ):
+        return (
+            ConfigBuilder()
+            .with_dryrun_enabled(False)
+            .with_stash_db(sqlite_path, commit_batch_size=2)
+            .with_pipeline_enabled(pipeline_enabled)
+            .with_file_name_templates([{"TEMPLATE": "{title}"}])
+            .with_file_dir_templates([{"TEMPLATE": str(tmp_path / "renamed")}])
+            .build()
+        )
+
+    @pytest.mark.parametrize("pipeline_enabled", [True, False])
+    def test_commits_all_batches(
+        self,
+        mocker: MockerFixture,
+        tmp_path: Path,
+        sqlite_path: str,
+        scenes,
+        studio: Studio,
+        pipeline_enabled: bool,
+    ):
+        config = self.create_config(tmp_path, sqlite_path, pipeline_enabled)
+        mocker.patch("components.process_scenes.get_config", return_value=config)
+
+        assert process_scenes(scenes, [studio]) == {"1", "2", "3"}
+
+        for scene in scenes:
+            new_file_path = str(tmp_path / "renamed" / f"Scene {scene.id}.mp4")
+
+            assert Path(new_file_path).is_file()
+            assert get_stash_db_file_path(sqlite_path, scene.id) == new_file_path
+
+    @pytest.mark.parametrize("pipeline_enabled", [True, False])
+    def test_failed_batches_move_files_back(
+        self,
+        mocker: MockerFixture,
+        tmp_path: Path,
+        sqlite_path: str,
+        scenes,
+        studio: Studio,
+        pipeline_enabled: bool,
+    ):
+        config = self.create_config(tmp_path, sqlite_path, pipeline_enabled)
+        mocker.patch("components.process_scenes.get_config", return_value=config)
+        fail_stash_db_commits(mocker)
+
+        assert process_scenes(scenes, [studio]) == set()
+
+        for scene in scenes:
+            assert Path(scene.files[0].path).is_file()
+            assert get_stash_db_file_path(sqlite_path, scene.id) == scene.files[0].path
+
+        assert not list((tmp_path / "renamed").glob("*.mp4"))
+
+    @pytest.mark.parametrize("pipeline_enabled", [True, False])
+    def test_failed_file_update_rolls_back_batch(
+        self,
+        mocker: MockerFixture,
+        tmp_path: Path,
+        sqlite_path: str,
+        scenes,
+        studio: Studio,
+        pipeline_enabled: bool,
+    ):
+        config = self.create_config(tmp_path, sqlite_path, pipeline_enabled)
+        mocker.patch("components.process_scenes.get_config", return_value=config)
+
+        update_db_file_path = StashDB._update_db_file_path
+
+        def fail_second_file_update(stash_db: StashDB, file, *args):
+            if file.id == "2":
+                raise sqlite3.OperationalError("database or disk is full")
+
+            return update_db_file_path(stash_db, file, *args)
+
+        mocker.patch.object(
+            StashDB,
+            "_update_db_file_path",
+            autospec=True,
+            side_effect=fail_second_file_update,
+        )
+
+        assert process_scenes(scenes, [studio]) == {"3"}
+
+        # the first file was renamed in the same (rolled back) batch as the second one
+        for scene in scenes[:2]:
+            assert Path(scene.files[0].path).is_file()
+            assert get_stash_db_file_path(sqlite_path, scene.id) == scene.files[0].path
+
+        # the folder inserted by the rolled back batch is inserted again
+        new_file_path = str(tmp_path / "renamed" / "Scene 3.mp4")
+        assert Path(new_file_path).is_file()
+        assert get_stash_db_file_path(sqlite_path, 3) == new_file_path
+
+    def test_single_transaction_ignores_commit_batch_size(
+        self,
+        mocker: MockerFixture,
+        tmp_path: Path,
+        sqlite_path: str,
+        scenes,
+        studio: Studio,
+    ):
+        config = self.create_config(tmp_path, sqlite_path)
+        mocker.patch("components.process_scenes.get_config", return_value=config)
+
+        update_db_file_path = StashDB._update_db_file_path
+
+        def fail_last_file_update(stash_db: StashDB, file, *args):
+            if file.id == "3":
+                raise sqlite3.OperationalError("database or disk is full")
+
+            return update_db_file_path(stash_db, file, *args)
+
+        mocker.patch.object(
+            StashDB,
+            "_update_db_file_path",
+            autospec=True,
+            side_effect=fail_last_file_update,
+        )
+
+        assert process_scenes(scenes, [studio], single_transaction=True) == set()
+
+        # the files of the first batch of COMMIT_BATCH_SIZE were rolled back with the last one
+        for scene in scenes:
+            assert Path(scene.files[0].path).is_file()
+            assert get_stash_db_file_path(sqlite_path, scene.id) == scene.files[0].path
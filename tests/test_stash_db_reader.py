@@ -0,0 +1,194 @@
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from components.fill_template import fill_template
+from components.stash_db_reader import StashDBReader
+from components.studio_helpers import StudioRegistry
+from models.compact_scene import CompactScene
+from models.template_variables_config import TemplateVariablesConfig
+from test_utils.scene_builder import SceneBuilder
+from test_utils.scene_file_builder import SceneFileBuilder
+from test_utils.stash_db_builder import StashDBBuilder
+
+
+def build_scene_dicts(tmp_path: Path) -> list[dict]:
+    first_file = SceneFileBuilder("1").with_file_path(str(tmp_path / "a" / "1.mp4"))
+    second_file = SceneFileBuilder("2").with_file_path(str(tmp_path / "b" / "2.mkv"))
+    third_file = SceneFileBuilder("3").with_file_path(str(tmp_path / "a" / "3.mp4"))
+
+    first_file_dict = first_file.build_dict()
+    first_file_dict["fingerprints"] = [
+        {"type": "oshash", "value": "0123456789abcdef"},
+        # above 2^63, stored as a negative integer in the stash db
+        {"type": "phash", "value": "fedcba9876543210"},
+    ]
+
+    return [
+        SceneBuilder(
+            {
+                "id": "1",
+                "title": "First Scene",
+                "date": "2021-05-06",
+                "rating100": 80,
+                "code": "ABC-123",
+                "stash_ids": [{"endpoint": "https://stashdb.org", "stash_id": "s1"}],
+                "movies": [
+                    {
+                        "movie": {"id": "1", "name": "Movie", "date": "2021-01-01"},
+                        "scene_index": 2,
+                    }
+                ],
+            }
+        )
+        .with_studio(
+            {
+                "id": "2",
+                "name": "Sub Studio",
+                "parent_studio": {"id": "1", "name": "Parent Studio"},
+            }
+        )
+        .with_performers(
+            [
+                {
+                    "id": "1",
+                    "name": "Performer A",
+                    "gender": "FEMALE",
+                    "favorite": True,
+                    "rating100": 60,
+                    "stash_ids": [
+                        {"endpoint": "https://stashdb.org", "stash_id": "p1"}
+                    ],
+                },
+                {"id": "2", "name": "Performer B", "gender": "MALE"},
+            ]
+        )
+        .with_tags(["Tag A", "Tag B"])
+        .with_files([first_file_dict, second_file.build_dict()])
+        .organized()
+        .build_dict(),
+        SceneBuilder({"id": "2", "title": None, "date": None})
+        .with_studio(None)
+        .with_performers([{"id": "2", "name": "Performer B", "gender": "MALE"}])
+        .with_files([third_file.build_dict()])
+        .build_dict(),
+        SceneBuilder({"id": "5", "title": "Scene Without Files"})
+        .with_studio({"id": "1", "name": "Parent Studio"})
+        .with_files([])
+        .build_dict(),
+    ]
+
+
+def build_stash_db(tmp_path: Path, scene_dicts: list[dict]) -> str:
+    stash_db_builder = StashDBBuilder(str(tmp_path / "stash.db"))
+
+    for scene_dict in scene_dicts:
+        stash_db_builder.with_scene(scene_dict)
+
+    sqlite_path = stash_db_builder.build()
+
+    # the parent folder ids are assigned when building the stash db
+    conn = sqlite3.connect(sqlite_path)
+    for scene_dict in scene_dicts:
+        for file_dict in scene_dict["files"]:
+            file_dict["parent_folder_id"] = str(
+                conn.execute(
+                    "SELECT parent_folder_id FROM files WHERE id = ?",
+                    (int(file_dict["id"]),),
+                ).fetchone()[0]
+            )
+    conn.close()
+
+    return sqlite_path
+
+
+class TestStashDBReader:
+    def test_reads_the_same_scenes_as_the_graphql_api(self, tmp_path: Path):
+        scene_dicts = build_scene_dicts(tmp_path)
+        sqlite_path = build_stash_db(tmp_path, scene_dicts)
+
+        with StashDBReader(sqlite_path) as stash_db_reader:
+            scenes = list(stash_db_reader.iter_all_scenes(per_page=100))
+
+        assert scenes == [
+            CompactScene.from_dict(scene_dict) for scene_dict in scene_dicts
+        ]
+        assert scenes[0].files[0].phash == "fedcba9876543210"
+        assert scenes[0].studio_code == "ABC-123"
+
+    @pytest.mark.parametrize("per_page", [1, 2, 3])
+    def test_reads_every_page(self, tmp_path: Path, per_page: int):
+        scene_dicts = build_scene_dicts(tmp_path)
+        sqlite_path = build_stash_db(tmp_path, scene_dicts)
+
+        with StashDBReader(sqlite_path) as stash_db_reader:
+            assert stash_db_reader.get_scene_count() == 3
+            assert [
+                scene.id for scene in stash_db_reader.iter_all_scenes(per_page)
+            ] == ["1", "2", "5"]
+
+    def test_reads_movies_from_the_movies_tables(self, tmp_path: Path):
+        scene_dicts = build_scene_dicts(tmp_path)
+        sqlite_path = build_stash_db(tmp_path, scene_dicts)
+
+        # the movies tables of Stash versions before v0.27
+        conn = sqlite3.connect(sqlite_path)
+        conn.executescript("""
+            ALTER TABLE groups RENAME TO movies;
+            ALTER TABLE groups_scenes RENAME TO movies_scenes;
+            ALTER TABLE movies_scenes RENAME COLUMN group_id TO movie_id;
+            """)
+        conn.close()
+
+        with StashDBReader(sqlite_path) as stash_db_reader:
+            scenes = list(stash_db_reader.iter_all_scenes(per_page=100))
+
+        assert scenes[0].movie_name == "Movie"
+        assert scenes[0].movie_scene_number == 2
+
+    def test_fills_templates_like_the_graphql_api(self, tmp_path: Path):
+        scene_dict = (
+            SceneBuilder({"id": "1"})
+            .with_performers(
+                [
+                    {"id": "2", "name": "Performer B", "gender": "MALE"},
+                    {"id": "1", "name": "Performer A", "gender": "FEMALE"},
+                ]
+            )
+            .with_files([SceneFileBuilder("1").build_dict()])
+            .build_dict()
+        )
+        # the tags and performers of the GraphQL API are not in the order of their ids
+        scene_dict["tags"] = [
+            {"id": "2", "name": "Tag B"},
+            {"id": "1", "name": "Tag A"},
+        ]
+        sqlite_path = build_stash_db(tmp_path, [scene_dict])
+
+        with StashDBReader(sqlite_path) as stash_db_reader:
+            [db_scene] = stash_db_reader.iter_all_scenes(per_page=100)
+
+        file_names = [
+            fill_template(
+                "{tags} - {performers}",
+                scene,
+                StudioRegistry([]),
+                scene.files[0],
+                TemplateVariablesConfig(),
+            )
+            for scene in [CompactScene.from_dict(scene_dict), db_scene]
+        ]
+
+        assert file_names == ["Tag A, Tag B - Performer A, Performer B"] * 2
+
+    def test_opens_the_stash_db_read_only(self, tmp_path: Path):
+        sqlite_path = build_stash_db(tmp_path, build_scene_dicts(tmp_path))
+
+        with StashDBReader(sqlite_path) as stash_db_reader:
+            with pytest.raises(sqlite3.OperationalError):
+                stash_db_reader.conn.execute("DELETE FROM scenes")
+
+    def test_fails_to_open_a_missing_stash_db(self, tmp_path: Path):
+        with pytest.raises(ConnectionError):
+            StashDBReader(str(tmp_path / "missing.db"))
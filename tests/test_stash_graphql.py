@@ -0,0 +1,210 @@
+import gzip
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from pytest_mock import MockerFixture
+
+from components.stash_graphql import StashGraphQL
+from models.config import StashApiConfig
+from test_utils.scene_builder import SceneBuilder
+
+
+def create_stash_graphql(mocker: MockerFixture):
+    mocker.patch.object(StashGraphQL, "test_connection")
+    return StashGraphQL("https://stash.example.com/graphql")
+
+
+class TestIterAllScenes:
+    def test_yields_scenes_from_every_page(self, mocker: MockerFixture):
+        stash_graphql = create_stash_graphql(mocker)
+
+        pages = [
+            [
+                SceneBuilder({"id": "1"}).build_dict(),
+                SceneBuilder({"id": "2"}).build_dict(),
+            ],
+            [SceneBuilder({"id": "3"}).build_dict()],
+        ]
+
+        send_request_mock = mocker.patch.object(
+            stash_graphql,
+            "_send_request",
+            side_effect=[
+                {"findScenes": {"count": 3, "scenes": page}} for page in pages
+            ],
+        )
+
+        scenes = list(stash_graphql.iter_all_scenes(per_page=2))
+
+        assert [scene.id for scene in scenes] == ["1", "2", "3"]
+        assert send_request_mock.call_count == 2
+
+        requested_pages = [
+            call.args[1]["filter"]["page"] for call in send_request_mock.call_args_list
+        ]
+        assert requested_pages == [1, 2]
+
+    def test_requests_next_page_only_when_current_page_is_full(
+        self, mocker: MockerFixture
+    ):
+        stash_graphql = create_stash_graphql(mocker)
+
+        send_request_mock = mocker.patch.object(
+            stash_graphql,
+            "_send_request",
+            side_effect=[
+                {
+                    "findScenes": {
+                        "count": 2,
+                        "scenes": [
+                            SceneBuilder({"id": "1"}).build_dict(),
+                            SceneBuilder({"id": "2"}).build_dict(),
+                        ],
+                    }
+                },
+                {"findScenes": {"count": 2, "scenes": []}},
+            ],
+        )
+
+        scenes = list(stash_graphql.iter_all_scenes(per_page=2))
+
+        assert len(scenes) == 2
+        assert send_request_mock.call_count == 2
+
+    def test_pages_are_fetched_lazily(self, mocker: MockerFixture):
+        stash_graphql = create_stash_graphql(mocker)
+
+        send_request_mock = mocker.patch.object(
+            stash_graphql,
+            "_send_request",
+            return_value={
+                "findScenes": {
+                    "count": 10,
+                    "scenes": [SceneBuilder({"id": "1"}).build_dict()],
+                }
+            },
+        )
+
+        scenes = stash_graphql.iter_all_scenes(per_page=1)
+
+        assert send_request_mock.call_count == 0
+        next(scenes)
+        assert send_request_mock.call_count == 1
+
+
+class TestGetScenesWithIds:
+    def test_fetches_scenes_in_chunks(self, mocker: MockerFixture):
+        stash_graphql = create_stash_graphql(mocker)
+
+        def find_scenes(query, variables):
+            return {
+                "findScenes": {
+                    "scenes": [
+                        SceneBuilder({"id": str(scene_id)}).build_dict()
+                        for scene_id in variables["scene_ids"]
+                    ]
+                }
+            }
+
+        send_request_mock = mocker.patch.object(
+            stash_graphql, "_send_request", side_effect=find_scenes
+        )
+
+        scenes = list(stash_graphql.get_scenes_with_ids([1, 2, 3, 4, 5], chunk_size=2))
+
+        assert [scene.id for scene in scenes] == ["1", "2", "3", "4", "5"]
+
+        requested_chunks = [
+            call.args[1]["scene_ids"] for call in send_request_mock.call_args_list
+        ]
+        assert requested_chunks == [[1, 2], [3, 4], [5]]
+
+    def test_keeps_requested_order_and_skips_missing_scenes(
+        self, mocker: MockerFixture
+    ):
+        stash_graphql = create_stash_graphql(mocker)
+
+        mocker.patch.object(
+            stash_graphql,
+            "_send_request",
+            return_value={
+                "findScenes": {
+                    "scenes": [
+                        SceneBuilder({"id": "3"}).build_dict(),
+                        SceneBuilder({"id": "1"}).build_dict(),
+                    ]
+                }
+            },
+        )
+
+        scenes = list(stash_graphql.get_scenes_with_ids([1, 2, 3], chunk_size=10))
+
+        assert [scene.id for scene in scenes] == ["1", "3"]
+
+
+class RecordingGraphQLHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        raw_body = self.rfile.read(int(self.headers["Content-Length"]))
+
+        if self.headers.get("Content-Encoding") == "gzip":
+            raw_body = gzip.decompress(raw_body)
+
+        self.server.requests.append(
+            {
+                "client_port": self.client_address[1],
+                "content_encoding": self.headers.get("Content-Encoding"),
+                "body": json.loads(raw_body),
+            }
+        )
+
+        response = json.dumps({"data": {"version": {"version": "v0.0.0"}}}).encode()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestStashGraphQLSession:
+    @pytest.fixture
+    def graphql_server(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), RecordingGraphQLHandler)
+        server.requests = []
+
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+
+        yield server
+
+        server.shutdown()
+        server.server_close()
+
+    def test_reuses_connection_between_requests(self, graphql_server):
+        url = f"http://127.0.0.1:{graphql_server.server_port}/graphql"
+
+        with StashGraphQL(url) as stash_graphql:
+            stash_graphql.get_stash_version()
+            stash_graphql.get_stash_version()
+
+        # 1 request from test_connection + 2 requests
+        assert len(graphql_server.requests) == 3
+
+        client_ports = {request["client_port"] for request in graphql_server.requests}
+        assert len(client_ports) == 1
+
+    def test_gzip_requests(self, graphql_server):
+        url = f"http://127.0.0.1:{graphql_server.server_port}/graphql"
+
+        with StashGraphQL(url, StashApiConfig(GZIP_REQUESTS=True)) as stash_graphql:
+            assert stash_graphql.get_stash_version() == "v0.0.0"
+
+        assert graphql_server.requests[-1]["content_encoding"] == "gzip"
+        assert "StashVersion" in graphql_server.requests[-1]["body"]["query"]
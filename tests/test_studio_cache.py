@@ -0,0 +1,104 @@
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+from pytest_mock import MockerFixture
+
+from components.stash_graphql import StashGraphQL
+from components.studio_cache import get_studios, read_studio_cache
+from models.studio import Studio, StudiosVersion
+
+
+def create_stash_graphql_mock(studios: list[Studio], version: StudiosVersion):
+    stash_graphql = MagicMock(spec=StashGraphQL)
+    stash_graphql.get_all_studios.return_value = studios
+    stash_graphql.get_studios_version.return_value = version
+
+    return stash_graphql
+
+
+class TestStudioCache:
+    @pytest.fixture
+    def cache_path(self, tmp_path: Path):
+        return str(tmp_path / "studio_cache.json")
+
+    @pytest.fixture
+    def studios(self):
+        return [
+            Studio(**{"id": "1", "name": "Studio A"}),
+            Studio(
+                **{
+                    "id": "2",
+                    "name": "Studio B",
+                    "parent_studio": {"id": "1", "name": "Studio A"},
+                }
+            ),
+        ]
+
+    @pytest.fixture
+    def version(self):
+        return StudiosVersion(count=2, updated_at="2023-03-07T12:21:01-07:00")
+
+    def test_fetches_studios_once(self, cache_path: str, studios, version):
+        stash_graphql = create_stash_graphql_mock(studios, version)
+
+        assert get_studios(stash_graphql, cache_path) == studios
+        assert get_studios(stash_graphql, cache_path) == studios
+
+        assert stash_graphql.get_all_studios.call_count == 1
+        assert stash_graphql.get_studios_version.call_count == 2
+        assert read_studio_cache(cache_path).version == version
+
+    def test_fetches_changed_studios(self, cache_path: str, studios, version):
+        stash_graphql = create_stash_graphql_mock(studios, version)
+        get_studios(stash_graphql, cache_path)
+
+        stash_graphql.get_studios_version.return_value = StudiosVersion(
+            count=2, updated_at="2023-03-08T12:21:01-07:00"
+        )
+        get_studios(stash_graphql, cache_path)
+
+        assert stash_graphql.get_all_studios.call_count == 2
+
+    def test_refresh(self, cache_path: str, studios, version):
+        stash_graphql = create_stash_graphql_mock(studios, version)
+        get_studios(stash_graphql, cache_path)
+
+        get_studios(stash_graphql, cache_path, refresh=True)
+
+        assert stash_graphql.get_all_studios.call_count == 2
+
+    def test_invalid_cache(self, cache_path: str, studios, version):
+        Path(cache_path).write_text("not json")
+        stash_graphql = create_stash_graphql_mock(studios, version)
+
+        assert get_studios(stash_graphql, cache_path) == studios
+        assert read_studio_cache(cache_path) is not None
+
+    def test_cache_disabled(self, studios, version):
+        stash_graphql = create_stash_graphql_mock(studios, version)
+
+        assert get_studios(stash_graphql, None) == studios
+        stash_graphql.get_studios_version.assert_not_called()
+
+
+class TestGetStudiosVersion:
+    def test_version(self, mocker: MockerFixture):
+        mocker.patch.object(StashGraphQL, "test_connection")
+        stash_graphql = StashGraphQL("https://stash.example.com/graphql")
+
+        send_request_mock = mocker.patch.object(
+            stash_graphql,
+            "_send_request",
+            return_value={
+                "findStudios": {
+                    "count": 3,
+                    "studios": [{"updated_at": "2023-03-07T12:21:01-07:00"}],
+                }
+            },
+        )
+
+        assert stash_graphql.get_studios_version() == StudiosVersion(
+            count=3, updated_at="2023-03-07T12:21:01-07:00"
+        )
+        assert send_request_mock.call_args.args[1]["filter"]["per_page"] == 1
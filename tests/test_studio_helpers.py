@@ -1,4 +1,5 @@
 from components.studio_helpers import (
+    StudioRegistry,
     contains_studio,
     get_parent_studio,
     get_studio_family,
@@ -257,3 +258,55 @@ class TestStudioHierarchy:
 
         assert studio_hierarchy is not None
         assert studio_hierarchy == [studio_grandparent]
+
+
+class TestStudioRegistry:
+    def test_find_with_id_and_name(self) -> None:
+        parent_studio = Studio(id="1", name="Parent Studio")
+        child_studio = Studio(id="2", name="Child Studio", parent_studio=parent_studio)
+
+        registry = StudioRegistry([parent_studio, child_studio])
+
+        assert registry.find_with_id("2") is child_studio
+        assert registry.find_with_id("3") is None
+        assert registry.find_with_name("child studio") is child_studio
+        assert registry.find_with_name("PARENT STUDIO") is parent_studio
+        assert registry.find_with_name("Unknown Studio") is None
+
+    def test_first_studio_wins_on_duplicates(self) -> None:
+        first_studio = Studio(id="1", name="Studio")
+        second_studio = Studio(id="1", name="studio")
+
+        registry = StudioRegistry([first_studio, second_studio])
+
+        assert registry.find_with_id("1") is first_studio
+        assert registry.find_with_name("Studio") is first_studio
+
+    def test_helpers_accept_a_registry(self) -> None:
+        studio_grandparent = Studio(id="1", name="GrandParent Studio")
+        studio_parent = Studio(
+            id="2", name="Parent Studio", parent_studio=studio_grandparent
+        )
+        studio_child = Studio(id="3", name="Child Studio", parent_studio=studio_parent)
+
+        registry = StudioRegistry([studio_child, studio_parent, studio_grandparent])
+
+        assert get_parent_studio(studio_child, registry) is studio_parent
+        assert get_studio_family(studio_child, registry) is studio_grandparent
+        assert get_studio_hierarchy(studio_child, registry) == [
+            studio_grandparent,
+            studio_parent,
+            studio_child,
+        ]
+        assert contains_studio(studio_child, studio_grandparent, registry)
+        assert not contains_studio(studio_parent, studio_child, registry)
+
+    def test_returned_hierarchy_can_be_modified(self) -> None:
+        parent_studio = Studio(id="1", name="Parent Studio")
+        child_studio = Studio(id="2", name="Child Studio", parent_studio=parent_studio)
+
+        registry = StudioRegistry([parent_studio, child_studio])
+
+        registry.get_hierarchy(child_studio).clear()
+
+        assert registry.get_hierarchy(child_studio) == [parent_studio, child_studio]
@@ -0,0 +1,65 @@
+from pytest_mock import MockerFixture
+
+from components.template_parser import TemplateVariable, compile_template
+from test_utils.config_builder import ConfigBuilder
+from test_utils.helpers import run_renamer_with_mock
+from test_utils.scene_builder import SceneBuilder
+
+
+class TestCompileTemplate:
+    def test_literals_and_variables(self):
+        compiled_template = compile_template("[{studio}] {title} -- {performers}")
+
+        assert compiled_template.nodes == (
+            "[",
+            TemplateVariable("studio"),
+            "] ",
+            TemplateVariable("title"),
+            " -- ",
+            TemplateVariable("performers"),
+        )
+        assert compiled_template.variable_names == {"studio", "title", "performers"}
+
+    def test_format_specs(self):
+        compiled_template = compile_template(
+            "{date:%Y.%m.%d} {duration:%H.%M} {movie_date} {date}"
+        )
+
+        assert compiled_template.nodes == (
+            TemplateVariable("date", "%Y.%m.%d"),
+            " ",
+            TemplateVariable("duration", "%H.%M"),
+            " ",
+            TemplateVariable("movie_date"),
+            " ",
+            TemplateVariable("date"),
+        )
+
+    def test_unknown_variables_are_kept_as_literals(self):
+        compiled_template = compile_template("{random} {title:%Y} {title}")
+
+        assert compiled_template.nodes == (
+            "{random} {title:%Y} ",
+            TemplateVariable("title"),
+        )
+
+    def test_compiled_once_per_template(self):
+        assert compile_template("{title}") is compile_template("{title}")
+
+
+class TestFillCompiledTemplate:
+    def test_variable_values_are_not_filled_again(self, mocker: MockerFixture):
+        scene = SceneBuilder().with_title("Title with {studio} in it").build()
+        studios = [scene.studio] if scene.studio else []
+
+        config = (
+            ConfigBuilder()
+            .with_file_name_templates([{"TEMPLATE": "{title}"}])
+            .with_file_dir_templates([{"TEMPLATE": "/renamed"}])
+            .build()
+        )
+
+        renames = run_renamer_with_mock(mocker, config, [scene], studios)
+
+        assert len(renames) == 1
+        assert renames[0]["dst_file_name"] == "Title with {studio} in it"